@@ -7,127 +7,242 @@ Usage:
                     --tenant-mapping user \
                     --out k8s_events.yaml
 
-It scans `batch_instance.csv` (≈8 GB) in streaming mode using pandas chunks to
-emit Pod creation events with tenant label and SLO annotation (p99 ≤120 ms by
-default, configurable via --latency-slo).
+  # 按 --window 分片、gzip 压缩、8 进程：
+  python ali2k8s.py --trace ./data --shard --out pods.yaml.gz --workers 8
+
+It scans `batch_instance.csv` (≈8 GB) with the multi-process byte-range reader
+(tools/trace_io/ingest.py) and emits one Pod document per Terminated instance
+with tenant label and SLO annotation (p99 ≤120 ms by default, configurable via
+--latency-slo).
+
+Pods are rendered by filling a precompiled YAML template with vectorized
+string columns (no per-pod dict / yaml.safe_dump). Each worker renders and
+compresses its own block, so rendering and compression both scale with cores.
+
+Output:
+  --out x.yaml            单个文件（按 trace 文件顺序）
+  --out x.yaml.gz / .zst  gzip / zstd 压缩（也可用 --compress 指定；zstd 需要 pip install zstandard）
+  --shard                 按 start_time // --window 分片: x.w00022.yaml.gz, x.w00023.yaml.gz, ...
 """
 
 import argparse
-import csv
 import gzip
 import os
+import string
 import sys
-from datetime import datetime, timedelta
 from pathlib import Path
-import yaml
+
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
-import math  # at top file ensure import
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from tools.trace_io.ingest import iter_csv_blocks, ingest_workers  # noqa: E402
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，仅 --compress zstd 需要
+    zstandard = None
 
-COLS = [
-    "task_id",
-    "instance_id",
-    "job_id",
-    "user_id",
-    "status",
-    "start_time",
-    "end_time",
-    "cpu_req",
-    "mem_req",
-]
+
+# batch_instance.csv 中用到的列（无表头，与 tools/trace_io 的列号一致）
+COLS = {
+    0: "instance_id",
+    1: "task_id",
+    2: "job_id",      # 租户（--tenant-mapping user）
+    4: "status",
+    5: "start_time",
+    12: "cpu_req",
+    13: "mem_req",
+}
 
 API_VERSION = "v1"
 KIND = "Pod"
 
+# 预编译模板：与 yaml.safe_dump(pod) 的键顺序一致，字符串值统一单引号转义，
+# yaml.safe_load 得到的文档与旧的逐 pod dict 完全相同
+POD_TEMPLATE = (
+    f"apiVersion: {API_VERSION}\n"
+    f"kind: {KIND}\n"
+    "metadata:\n"
+    "  annotations:\n"
+    "    slo.p99ms: '{slo}'\n"
+    "  labels:\n"
+    "    tenant: '{tenant}'\n"
+    "  name: '{name}'\n"
+    "spec:\n"
+    "  containers:\n"
+    "  - image: alibaba/trace-workload:dummy\n"
+    "    name: work\n"
+    "    resources:\n"
+    "      requests:\n"
+    "        cpu: '{cpu}'\n"
+    "        memory: '{mem}Mi'\n"
+    "  restartPolicy: Never\n"
+    "---\n"
+)
+
+
 def parse_args():
     p = argparse.ArgumentParser(description="Alibaba 2018 trace → k8s events")
     p.add_argument("--trace", required=True, help="Path to cluster-trace-v2018 dir")
-    p.add_argument("--window", type=int, default=3600, help="Time window seconds")
+    p.add_argument("--window", type=int, default=3600, help="Time window seconds (shard size with --shard)")
     p.add_argument("--tenant-mapping", default="user", choices=["user"], help="Mapping field to tenant")
     p.add_argument("--latency-slo", type=int, default=120, help="p99 latency ms target")
-    p.add_argument("--out", required=True, help="Output YAML file")
+    p.add_argument("--out", required=True, help="Output YAML file (.gz / .zst suffix enables compression)")
     p.add_argument("--max-instances", type=int, default=0, help="Stop after N instances (0 = unlimited)")
+    p.add_argument("--shard", action="store_true", help="Write one file per --window of start_time")
+    p.add_argument("--compress", choices=["none", "gzip", "zstd"], default=None,
+                   help="Output compression (default: inferred from --out suffix)")
+    p.add_argument("--workers", type=int, default=None,
+                   help="Parallel processes (default: TRACE_INGEST_WORKERS or all cores)")
     return p.parse_args()
 
 
-def iter_instances(trace_dir):
-    inst_file = Path(trace_dir) / "batch_instance.csv"
-    if not inst_file.exists():
-        sys.exit("batch_instance.csv not found in trace dir")
-    # The csv has no header per dataset doc; supply names
-    chunks = pd.read_csv(inst_file, names=COLS, iterator=True, chunksize=1_000_000)
-    for chunk in chunks:
-        for row in chunk.itertuples(index=False):
-            yield row
-
-
-def _sanitize(val, default):
-    if val is None:
-        return default
-    if isinstance(val, float) and math.isnan(val):
-        return default
-    return val
-
-
-def make_pod_yaml(row, latency_slo):
-    cpu_req = _sanitize(row.cpu_req, 1)
-    mem_req = _sanitize(row.mem_req, 1024)
-
-    metadata = {
-        "name": f"job-{row.job_id}-task{row.task_id}-ins{row.instance_id}",
-        "labels": {"tenant": str(row.user_id)},
-        "annotations": {
-            "slo.p99ms": str(latency_slo),
-        },
-    }
-
-    spec = {
-        "containers": [
-            {
-                "name": "work",
-                "image": "alibaba/trace-workload:dummy",
-                "resources": {
-                    "requests": {
-                        "cpu": str(max(1, int(cpu_req))),
-                        "memory": f"{int(mem_req)}Mi",
-                    }
-                },
-            }
-        ],
-        "restartPolicy": "Never",
-    }
-
-    return {"apiVersion": API_VERSION, "kind": KIND, "metadata": metadata, "spec": spec}
+def _quote(values: pd.Series) -> pd.Series:
+    """YAML 单引号字符串转义"""
+    return values.astype(str).str.replace("'", "''", regex=False)
+
+
+def prepare_block(chunk: pd.DataFrame, window: int) -> pd.DataFrame:
+    """过滤 Terminated 实例并生成模板所需的字符串列（全部向量化）"""
+    rows = chunk[chunk[4] == "Terminated"]
+    cpu = pd.to_numeric(rows[12], errors="coerce").fillna(1)
+    mem = pd.to_numeric(rows[13], errors="coerce").fillna(1024)
+    start = pd.to_numeric(rows[5], errors="coerce").fillna(0).astype(np.int64)
+    name = "job-" + rows[2].astype(str) + "-task" + rows[1].astype(str) + "-ins" + rows[0].astype(str)
+    return pd.DataFrame({
+        "window": (start // window).to_numpy(),
+        "tenant": _quote(rows[2]).to_numpy(),
+        "name": _quote(name).to_numpy(),
+        "cpu": np.maximum(1, cpu.astype(np.int64)).astype(str).to_numpy(),
+        "mem": mem.astype(np.int64).astype(str).to_numpy(),
+    })
+
+
+# 模板预先拆成 (字面量, 字段名) 序列，渲染时只做列拼接
+_TEMPLATE_PARTS = [(literal, field) for literal, field, _, _ in string.Formatter().parse(POD_TEMPLATE)]
+
+
+def _render(frame: pd.DataFrame, latency_slo: int) -> str:
+    if len(frame) == 0:
+        return ""
+    values = {"slo": str(latency_slo)}
+    docs = pd.Series("", index=frame.index)
+    for literal, field in _TEMPLATE_PARTS:
+        if field is None:
+            docs = docs + literal
+        elif field in values:
+            docs = docs + (literal + values[field])
+        else:
+            docs = docs + literal + frame[field]
+    return "".join(docs.tolist())
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    """gzip 成员 / zstd 帧可以直接拼接，所以每个块可以独立压缩"""
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return data
+
+
+def render_block(frame: pd.DataFrame, latency_slo: int, shard: bool, codec: str) -> dict:
+    """渲染并压缩一个块，返回 {window 或 None: bytes}（块内保持文件顺序）"""
+    if not shard:
+        return {None: compress(_render(frame, latency_slo).encode("utf-8"), codec)}
+    out = {}
+    for window, group in frame.groupby("window", sort=True):
+        out[int(window)] = compress(_render(group, latency_slo).encode("utf-8"), codec)
+    return out
+
+
+def convert_block(chunk: pd.DataFrame, window: int, latency_slo: int, shard: bool, codec: str):
+    """ingest worker 内执行：返回 (pod 数, {window: bytes})"""
+    frame = prepare_block(chunk, window)
+    return len(frame), render_block(frame, latency_slo, shard, codec)
+
+
+def _codec(args) -> str:
+    if args.compress:
+        codec = args.compress
+    elif args.out.endswith(".gz"):
+        codec = "gzip"
+    elif args.out.endswith(".zst"):
+        codec = "zstd"
+    else:
+        codec = "none"
+    if codec == "zstd" and zstandard is None:
+        sys.exit("--compress zstd 需要 zstandard: pip install zstandard")
+    return codec
+
+
+class ShardWriter:
+    """按 window 打开输出文件（追加写入已压缩的字节）"""
+
+    def __init__(self, out: str, shard: bool):
+        self.out = Path(out)
+        self.shard = shard
+        self.files = {}
+        if not shard:
+            # 单文件模式即使没有任何 pod 也生成（空）输出文件
+            self.files[None] = open(self.out, "wb")
+
+    def path(self, window) -> Path:
+        if not self.shard:
+            return self.out
+        name = self.out.name
+        stem, dot, suffix = name.partition(".")
+        return self.out.with_name(f"{stem}.w{window:05d}{dot}{suffix}")
+
+    def write(self, payloads: dict):
+        for window, data in payloads.items():
+            if not data:
+                continue
+            f = self.files.get(window)
+            if f is None:
+                f = self.files[window] = open(self.path(window), "wb")
+            f.write(data)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
 
 
 def main():
     args = parse_args()
-    start_ts = None
-    window_delta = timedelta(seconds=args.window)
-
-    with open(args.out, "w") as fout:
-        writer = yaml.safe_dump_all([], stream=fout)  # placeholder, will not use
-
-    # reopen to append manually
-    with open(args.out, "w") as fout:
-        count = 0
-        for row in tqdm(iter_instances(args.trace), desc="instances"):
-            if start_ts is None:
-                start_ts = row.start_time
-                current_window = start_ts // args.window
-            # filter by status, only running instances (status=4 per doc)
-            if row.status != 4:
-                continue
-            pod = make_pod_yaml(row, args.latency_slo)
-            yaml.safe_dump(pod, fout)
-            fout.write("---\n")
-
-            count += 1
-            if args.max_instances and count >= args.max_instances:
-                break
-
-    print(f"Written Kubernetes events to {args.out}")
+    inst_file = Path(args.trace) / "batch_instance.csv"
+    if not inst_file.exists():
+        sys.exit("batch_instance.csv not found in trace dir")
+    codec = _codec(args)
+    workers = ingest_workers() if args.workers is None else args.workers
+
+    writer = ShardWriter(args.out, args.shard)
+    count = 0
+    try:
+        if args.max_instances:
+            # 需要精确截断：worker 只做过滤与列准备，主进程截断后渲染
+            blocks = iter_csv_blocks(str(inst_file), prepare_block, args=(args.window,),
+                                     workers=workers, usecols=list(COLS))
+            for frame in tqdm(blocks, desc="blocks"):
+                frame = frame.head(args.max_instances - count)
+                writer.write(render_block(frame, args.latency_slo, args.shard, codec))
+                count += len(frame)
+                if count >= args.max_instances:
+                    break
+        else:
+            blocks = iter_csv_blocks(str(inst_file), convert_block,
+                                     args=(args.window, args.latency_slo, args.shard, codec),
+                                     workers=workers, usecols=list(COLS))
+            for n, payloads in tqdm(blocks, desc="blocks"):
+                writer.write(payloads)
+                count += n
+    finally:
+        writer.close()
+
+    target = f"{len(writer.files)} shard files" if args.shard else args.out
+    print(f"Written {count} Kubernetes pod events to {target}")
 
 
 if __name__ == "__main__":
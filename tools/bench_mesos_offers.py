@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Mesos allocator 每个分配周期的耗时：逐任务 allocate() 与 offer 周期 allocate_offers() 对比。
+不依赖外部数据集（任务来自 trace_io 的参数化合成分布）。
+
+用法: python tools/bench_mesos_offers.py [agent 数=10000] [每周期任务数=2000] [周期数=20]
+环境变量 MESOS_OFFER_BATCH 同 run_complete_comparison（每个 offer 最多接受的任务数，0 不限）。
+每个周期先分配新到达的任务，再回收上一周期放置的任务，模拟稳态。
+"""
+from __future__ import annotations
+import contextlib
+import io
+import os
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+# 确保可以通过包方式导入
+TOOLS_DIR = Path(__file__).parent
+if str(TOOLS_DIR) not in sys.path:
+    sys.path.insert(0, str(TOOLS_DIR))
+
+from scheduler_frameworks.mesos_drf_allocator import HierarchicalAllocator, Agent, Task
+from trace_io.synth import TraceProfile, synth_tasks
+
+
+def run_cycles(num_agents: int, batches, offer_batch: int, offer_cycles: bool):
+    agents = [Agent(id=i, cpu_total=11.0, mem_total=11.0, cpu_available=11.0, mem_available=11.0)
+              for i in range(num_agents)]
+    allocator = HierarchicalAllocator(agents)
+    latencies = []
+    placed = 0
+    previous = []
+    for batch in batches:
+        tasks_by_fw = defaultdict(list)
+        for task in batch:
+            tasks_by_fw[task.tenant].append(task)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if offer_cycles:
+                placements = allocator.allocate_offers(tasks_by_fw, batch_size=offer_batch)
+            else:
+                placements = allocator.allocate(tasks_by_fw)
+        latencies.append(time.perf_counter() - start)
+        placed += len(placements)
+
+        # 回收上一周期的任务
+        if previous:
+            allocator.recover_resources_batch([t.tenant for t, _ in previous], [a for _, a in previous],
+                                              [t.cpu for t, _ in previous], [t.mem for t, _ in previous])
+        by_id = {t.id: t for t in batch}
+        previous = [(by_id[task_id], agent_id) for task_id, agent_id in placements]
+    return np.array(latencies) * 1000, placed
+
+
+def main() -> int:
+    num_agents = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    per_cycle = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    cycles = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    offer_batch = int(os.getenv("MESOS_OFFER_BATCH", "0"))
+
+    table = synth_tasks(TraceProfile.default(), per_cycle * cycles, seed=0)
+    tasks = [Task(id=i, cpu=float(t.cpu), mem=float(t.mem), tenant=t.tenant, arrival=int(t.arrival))
+             for i, t in enumerate(table[j] for j in range(len(table)))]
+    batches = [tasks[k:k + per_cycle] for k in range(0, len(tasks), per_cycle)]
+
+    print(f"agents={num_agents}, 每周期任务={per_cycle}, 周期数={cycles}, offer batch={offer_batch or '不限'}")
+    for name, offer_cycles in (("allocate()", False), ("allocate_offers()", True)):
+        lat, placed = run_cycles(num_agents, batches, offer_batch, offer_cycles)
+        print(f"  {name:<18} 放置 {placed:>7}  每周期耗时 均值={lat.mean():8.2f}ms "
+              f"p50={np.percentile(lat, 50):8.2f}ms p99={np.percentile(lat, 99):8.2f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,23 +1,12 @@
 #!/usr/bin/env python3
 """计算合理的集群规模"""
-import pandas as pd
 import numpy as np
 import sys
 
-chunks = []
-for chunk in pd.read_csv(f"{sys.argv[1]}/batch_instance.csv", 
-                         chunksize=1000000, header=None):
-    terminated = chunk[chunk[4] == 'Terminated']
-    if len(terminated) > 0:
-        chunks.append(terminated)
-    if sum(len(c) for c in chunks) >= 20000:
-        break
-
-df = pd.concat(chunks).head(20000)
-df['cpu'] = pd.to_numeric(df[12], errors='coerce')
-df['mem'] = pd.to_numeric(df[13], errors='coerce')
-valid = df['cpu'].notna() & df['mem'].notna() & (df['cpu'] > 0) & (df['mem'] > 0)
-df = df[valid].head(10000)
+from trace_io import load_instances
+
+# 编译缓存优先（已过滤 Terminated + 有效 cpu/mem），缺失时回退 CSV
+df = load_instances(sys.argv[1], 10000)
 
 print("━━━ 资源需求分析 ━━━")
 total_cpu = df['cpu'].sum()
@@ -48,14 +48,15 @@ for nid, node in graph.nodes.items():
     print(f"  {nid}: {node.type.name}")
 
 print("\n边:")
-for arc in graph.arcs:
+for arc in graph.arcs.values():
     print(f"  {arc.src.id}→{arc.dst.id}: cost={arc.cost}, cap=[{arc.cap_lower},{arc.cap_upper}]")
 
 print("\n求解...")
 solver = MinCostFlowSolver()
 result = solver.solve(graph)
 
-print(f"结果: {len(result)} 条流")
-for arc, flow in result.items():
-    print(f"  {arc.src.id}→{arc.dst.id}: flow={flow}")
+print(f"结果: {int((result > 0).sum())} 条流")
+for arc in graph.arcs.values():
+    if result[arc.id] > 0:
+        print(f"  {arc.src.id}→{arc.dst.id}: flow={result[arc.id]}")
 
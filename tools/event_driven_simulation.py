@@ -6,45 +6,57 @@
 - baselines/firmament/src/sim/simulator.cc::ReplaySimulation()
 - baselines/firmament/src/sim/event_manager.cc
 - baselines/firmament/src/sim/simulator_bridge.cc
+
+事件队列核心与 run_with_events 共用（tools/event_queue.py）：
+到达事件由有序游标拉取，其余事件进小根堆，事件类型为整数编码。
 """
 from __future__ import annotations
-import heapq
 from dataclasses import dataclass
-from typing import List, Dict, Tuple, Callable, Any
+from typing import List, Dict, Tuple, Callable, Any, Iterable
 from collections import defaultdict
 
+from tools.event_queue import EventQueue, EVENT_NAMES, TASK_SUBMIT, TASK_END_RUNTIME, event_code
+
 
 @dataclass
 class SimulationEvent:
     """模拟器事件（对应 EventDescriptor）"""
     timestamp: int  # 微秒
-    event_type: str  # TASK_SUBMIT, TASK_END_RUNTIME, ADD_MACHINE, etc.
+    event_type: int  # TASK_SUBMIT, TASK_END_RUNTIME, ADD_MACHINE, ...（tools/event_queue 的整数编码）
     data: Any
 
+    @property
+    def name(self) -> str:
+        return EVENT_NAMES.get(self.event_type, str(self.event_type))
+
 
 class EventManager:
     """事件管理器（对应 firmament/src/sim/event_manager.cc）"""
     def __init__(self):
-        self.events = []  # 优先队列 (timestamp, event)
+        self.queue = EventQueue()
         self.num_events_processed = 0
     
-    def add_event(self, timestamp: int, event_type: str, data: Any):
-        """添加事件到队列"""
-        heapq.heappush(self.events, (timestamp, SimulationEvent(timestamp, event_type, data)))
+    def load_arrivals(self, tasks: Iterable):
+        """任务提交事件：按 arrival 有序的游标（不逐个压堆）"""
+        self.queue.set_arrivals(tasks)
+    
+    def add_event(self, timestamp: int, event_type, data: Any):
+        """添加事件到队列（event_type 为整数编码，兼容旧的字符串名）"""
+        self.queue.push(timestamp, event_code(event_type), data)
     
     def get_next_event(self) -> Tuple[int, SimulationEvent]:
         """获取下一个事件"""
-        if not self.events:
+        event = self.queue.pop()
+        if event is None:
             return (float('inf'), None)
-        timestamp, event = heapq.heappop(self.events)
         self.num_events_processed += 1
-        return (timestamp, event)
+        timestamp, code, data = event
+        return (timestamp, SimulationEvent(timestamp, code, data))
     
     def get_time_of_next_event(self) -> int:
         """获取下一个事件的时间"""
-        if not self.events:
-            return float('inf')
-        return self.events[0][0]
+        t = self.queue.next_time()
+        return float('inf') if t is None else t
     
     def has_simulation_completed(self, num_scheduling_rounds: int, 
                                  max_rounds: int, max_runtime: int) -> bool:
@@ -53,7 +65,7 @@ class EventManager:
             return True
         if self.get_time_of_next_event() >= max_runtime:
             return True
-        return len(self.events) == 0
+        return self.queue.empty()
 
 
 class SimulatorBridge:
@@ -78,16 +90,11 @@ class SimulatorBridge:
     def load_trace_data(self, tasks: List):
         """
         加载 trace 数据（对应 LoadTraceData）
-        - 添加任务提交事件
+        - 添加任务提交事件（有序游标，不逐个压堆）
         - 记录任务运行时长
         """
+        self.event_manager.load_arrivals(tasks)
         for task in tasks:
-            # 添加任务提交事件
-            self.event_manager.add_event(
-                task.arrival, 
-                'TASK_SUBMIT', 
-                task
-            )
             # 记录任务运行时长（对应 LoadTasksRunningTime）
             if task.duration > 0:
                 self.task_runtime[task.id] = task.duration
@@ -103,11 +110,11 @@ class SimulatorBridge:
             if event is None:
                 break
             
-            if event.event_type == 'TASK_END_RUNTIME':
+            if event.event_type == TASK_END_RUNTIME:
                 # ⭐ 任务完成 -> 释放资源
                 self.task_completed(event.data)
             
-            elif event.event_type == 'TASK_SUBMIT':
+            elif event.event_type == TASK_SUBMIT:
                 # 任务提交暂存，等待调度器运行
                 pass
     
@@ -146,7 +153,7 @@ class SimulatorBridge:
         # ⭐ 添加任务结束事件（如果有运行时长）
         if task_id in self.task_runtime:
             end_time = current_time + self.task_runtime[task_id]
-            self.event_manager.add_event(end_time, 'TASK_END_RUNTIME', task_id)
+            self.event_manager.add_event(end_time, TASK_END_RUNTIME, task_id)
     
     def schedule_jobs(self, pending_tasks: List, current_time: int):
         """
@@ -218,7 +225,7 @@ def run_event_driven_simulation(
         # ⭐ 4.2 收集到达的任务（在 run_scheduler_at 时刻）
         while event_manager.get_time_of_next_event() == run_scheduler_at:
             timestamp, event = event_manager.get_next_event()
-            if event and event.event_type == 'TASK_SUBMIT':
+            if event and event.event_type == TASK_SUBMIT:
                 pending_tasks.append(event.data)
         
         # ⭐ 4.3 运行调度器（对应 ScheduleJobsHelper）
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+事件队列核心（run_with_events.enable_event_driven_simulation 与
+event_driven_simulation.EventManager 共用）
+
+两路事件流归并:
+  - 到达（TASK_SUBMIT）: trace 本身按 arrival 有序，用游标按顺序拉取，不进堆
+  - 其余事件（TASK_END_RUNTIME 等）: 小根堆，元素为 (timestamp, seq, code, data)，
+    seq 保证同一时间戳按插入顺序弹出，且不会比较到 data
+事件类型用整数编码（比较整数而不是字符串）；EVENT_NAMES 用于打印。
+同一时间戳上到达事件先于堆中事件（与旧实现先压入全部 TASK_SUBMIT 的顺序一致）。
+"""
+from __future__ import annotations
+
+import heapq
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# 整数事件编码（对应 firmament EventDescriptor::EventType）
+TASK_SUBMIT = 0
+TASK_END_RUNTIME = 1
+ADD_MACHINE = 2
+REMOVE_MACHINE = 3
+
+EVENT_NAMES = {
+    TASK_SUBMIT: "TASK_SUBMIT",
+    TASK_END_RUNTIME: "TASK_END_RUNTIME",
+    ADD_MACHINE: "ADD_MACHINE",
+    REMOVE_MACHINE: "REMOVE_MACHINE",
+}
+EVENT_CODES = {name: code for code, name in EVENT_NAMES.items()}
+
+
+def event_code(event_type) -> int:
+    """兼容旧的字符串事件类型"""
+    return EVENT_CODES[event_type] if isinstance(event_type, str) else int(event_type)
+
+
+class ArrivalCursor:
+    """
+    按 arrival 顺序逐个拉取任务（到达事件不再全部预先压入堆）
+
+    列表等序列输入先做稳定排序（与原先 (arrival, counter) 堆的弹出顺序一致）；
+    TaskTable 直接对 arrival 列做稳定 argsort，行视图在拉取时才创建；
+    生成器等迭代器输入按原样惰性消费，要求 arrival 非递减。
+    """
+
+    def __init__(self, tasks: Iterable[Any]):
+        self.streaming = not hasattr(tasks, "__len__")
+        arrival = getattr(tasks, "arrival", None)
+        if isinstance(arrival, np.ndarray):
+            order = np.argsort(arrival, kind="stable")
+            self.total = len(order)
+            self.last_arrival = arrival.item(order[-1]) if len(order) else None
+            self._it = (tasks[i] for i in order.tolist())
+        elif self.streaming:
+            self._it: Iterator[Any] = iter(tasks)
+            self.total: Optional[int] = None
+            self.last_arrival = None
+        else:
+            ordered = sorted(tasks, key=lambda t: t.arrival)
+            self.total = len(ordered)
+            self.last_arrival = ordered[-1].arrival if ordered else None
+            self._it = iter(ordered)
+        self.pulled = 0
+        self.head: Any = None
+        self.next_time = None
+        self._advance()
+
+    def _advance(self):
+        prev = self.next_time
+        self.head = head = next(self._it, None)
+        if head is None:
+            self.next_time = None
+            return
+        self.next_time = head.arrival
+        if prev is not None and self.next_time < prev:
+            raise ValueError(f"流式任务源必须按 arrival 非递减排序: "
+                             f"到达时间 {prev} 之后是 {head.id}@{self.next_time}")
+        self.pulled += 1
+
+    def pop(self) -> Any:
+        task = self.head
+        self._advance()
+        return task
+
+    def pop_until(self, current_time, out: List[Any]) -> int:
+        """把 arrival <= current_time 的任务追加到 out，返回个数"""
+        n = 0
+        while self.next_time is not None and self.next_time <= current_time:
+            out.append(self.head)
+            self._advance()
+            n += 1
+        return n
+
+
+class EventQueue:
+    """到达游标 + 事件小根堆"""
+
+    def __init__(self, tasks: Iterable[Any] = ()):
+        self.arrivals = ArrivalCursor(tasks)
+        self.heap: List[Tuple] = []
+        self._seq = 0
+
+    def set_arrivals(self, tasks: Iterable[Any]):
+        """替换到达流（堆中已有事件保留）"""
+        self.arrivals = ArrivalCursor(tasks)
+
+    def push(self, timestamp, code: int, data: Any = None):
+        heapq.heappush(self.heap, (timestamp, self._seq, code, data))
+        self._seq += 1
+
+    def __len__(self) -> int:
+        """堆中事件数（不含尚未拉取的到达）"""
+        return len(self.heap)
+
+    def empty(self) -> bool:
+        return not self.heap and self.arrivals.head is None
+
+    def next_time(self):
+        """下一个事件（到达或堆顶）的时间，没有事件时为 None"""
+        t = self.arrivals.next_time
+        if not self.heap:
+            return t
+        h = self.heap[0][0]
+        return h if t is None or h < t else t
+
+    def pop_arrivals(self, current_time, out: List[Any]) -> int:
+        return self.arrivals.pop_until(current_time, out)
+
+    def pop_due(self, current_time) -> List[Tuple[Any, int, Any]]:
+        """弹出堆中所有 timestamp <= current_time 的事件 [(timestamp, code, data)]（按时间顺序）"""
+        heap = self.heap
+        due = []
+        while heap and heap[0][0] <= current_time:
+            timestamp, _, code, data = heapq.heappop(heap)
+            due.append((timestamp, code, data))
+        return due
+
+    def pop(self) -> Optional[Tuple[Any, int, Any]]:
+        """按时间顺序弹出下一个事件 (timestamp, code, data)；同一时间戳到达优先"""
+        t = self.arrivals.next_time
+        if self.heap and (t is None or self.heap[0][0] < t):
+            timestamp, _, code, data = heapq.heappop(self.heap)
+            return timestamp, code, data
+        if t is None:
+            return None
+        return t, TASK_SUBMIT, self.arrivals.pop()
@@ -5,15 +5,20 @@ Usage:
   python tools/extract_avg_usage.py <trace_dir> [max_rows] [output_csv]
 
 If max_rows is given, only the first N rows are scanned (fast sampling).
-Outputs CSV with columns: instance_id,cpu_used,mem_used
+Otherwise the whole file is scanned in parallel (TRACE_INGEST_WORKERS processes,
+default: all cores).
+Outputs:
+  usage_agg.npz  per-instance sum/count/max/histogram (read by load_alibaba_trace)
+  CSV with columns: instance_id,cpu_used,mem_used,cpu_max,mem_max,cpu_p95,mem_p95
 """
 import os
 import sys
-import pandas as pd
 from pathlib import Path
 
-USE_COLS = [2, 3, 4]  # instance_id, cpu_used, mem_used
-CHUNK = 1_000_000
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from tools.trace_io import aggregate_usage  # noqa: E402
+from tools.trace_io.usage import USAGE_AGG_FILE  # noqa: E402
+
 
 def main():
     if len(sys.argv) < 2:
@@ -30,31 +35,16 @@ def main():
         sys.exit(1)
 
     print("⏳ scanning", src)
-    rows_read = 0
-    agg_dfs = []
-    for chunk in pd.read_csv(src, header=None, usecols=USE_COLS,
-                             chunksize=CHUNK):
-        if max_rows and rows_read >= max_rows:
-            break
-        if max_rows and rows_read + len(chunk) > max_rows:
-            chunk = chunk.head(max_rows - rows_read)
-        rows_read += len(chunk)
-
-        grp = chunk.groupby(2).agg({3: "mean", 4: "mean"}).reset_index()
-        grp.columns = ["instance_id", "cpu_used", "mem_used"]
-        agg_dfs.append(grp)
-        print(f"  processed rows: {rows_read:,}", end="\r")
-
-        if max_rows and rows_read >= max_rows:
-            break
-
-    if not agg_dfs:
+    agg = aggregate_usage(str(trace_dir), max_rows=max_rows)
+    if agg.size == 0:
         print("No data extracted.")
         sys.exit(1)
 
-    df_out = pd.concat(agg_dfs).groupby("instance_id").mean()
+    agg_path = out_path.parent / USAGE_AGG_FILE
+    agg.save(str(agg_path))
+    df_out = agg.result()
     df_out.to_csv(out_path)
-    print(f"\n✓ saved {len(df_out)} rows to {out_path}")
+    print(f"✓ saved {len(df_out)} rows to {out_path} (+ {agg_path})")
 
 
 if __name__ == "__main__":
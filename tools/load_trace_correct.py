@@ -3,10 +3,11 @@
 修正后的 Alibaba trace 加载器
 使用正确的列映射
 """
-import pandas as pd
 import numpy as np
 from dataclasses import dataclass
 
+from trace_io import load_instances
+
 @dataclass
 class Task:
     id: int
@@ -35,39 +36,20 @@ def load_alibaba_trace_correct(trace_dir: str, max_inst: int = 10000):
     """
     print(f"━━━ 加载 Alibaba 2018 Trace (修正版) ━━━\n")
     
-    # 不指定列名，直接用索引
-    chunks = []
-    for chunk in pd.read_csv(f"{trace_dir}/batch_instance.csv", 
-                             chunksize=1000000,
-                             header=None):
-        # 过滤 Running 状态（列 4）
-        running = chunk[chunk[4] == 'Running']
-        if len(running) > 0:
-            chunks.append(running)
-        if sum(len(c) for c in chunks) >= max_inst:
-            break
-    
-    df = pd.concat(chunks).head(max_inst)
-    
-    # 提取真实资源数据（列 12, 13）
-    df['cpu_real'] = pd.to_numeric(df[12], errors='coerce')
-    df['mem_real'] = pd.to_numeric(df[13], errors='coerce')
-    
-    # 统计
-    has_resource = df['cpu_real'].notna()
-    print(f"✓ 加载 {len(df)} 实例")
-    print(f"  有资源数据: {has_resource.sum()} ({has_resource.sum()/len(df)*100:.1f}%)")
-    print(f"  无资源数据: {(~has_resource).sum()} ({(~has_resource).sum()/len(df)*100:.1f}%)\n")
-    
-    # 只保留有资源数据的行
-    df = df[has_resource].copy()
+    # 编译缓存 / CSV 回退统一走 load_instances（Terminated + 列 12/13 有效）
+    # 注：早期这里过滤的是 Running 状态，但 Running 实例没有资源数据，
+    #     与 load_trace_final.py 保持一致改为 Terminated
+    df = load_instances(trace_dir, max_inst)
+    df['cpu_real'] = df['cpu']
+    df['mem_real'] = df['mem']
+    print(f"✓ 加载 {len(df)} 实例\n")
     
     print(f"━━━ 资源统计（{len(df)} 条有效记录）━━━")
     print(f"CPU 范围: {df['cpu_real'].min():.3f} - {df['cpu_real'].max():.3f}")
     print(f"CPU 均值: {df['cpu_real'].mean():.3f}")
     print(f"MEM 范围: {df['mem_real'].min():.3f} - {df['mem_real'].max():.3f}")
     print(f"MEM 均值: {df['mem_real'].mean():.3f}")
-    print(f"租户数: {df[2].nunique()}\n")
+    print(f"租户数: {df['tenant'].nunique()}\n")
     
     # 转换为 Task 对象
     tasks = [
@@ -75,10 +57,10 @@ def load_alibaba_trace_correct(trace_dir: str, max_inst: int = 10000):
             id=idx,
             cpu=row['cpu_real'],  # 真实 CPU
             mem=row['mem_real'],  # 真实 MEM
-            tenant=str(row[2]),   # job_id
-            arrival=int(row[5])   # start_time
+            tenant=str(row['tenant']),   # job_id
+            arrival=int(row['start_time'])
         )
-        for idx, row in df.sort_values(5).iterrows()
+        for idx, row in df.sort_values('start_time').iterrows()
     ]
     
     return tasks
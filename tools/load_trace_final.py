@@ -2,10 +2,11 @@
 """
 最终修正版：使用 Terminated 状态的任务（有真实资源数据）
 """
-import pandas as pd
 import numpy as np
 from dataclasses import dataclass
 
+from trace_io import load_instances
+
 @dataclass
 class Task:
     id: int
@@ -24,29 +25,11 @@ def load_alibaba_trace_final(trace_dir: str, max_inst: int = 10000):
     """
     print(f"━━━ 加载 Alibaba 2018 Trace (使用 Terminated 状态) ━━━\n")
     
-    chunks = []
-    for chunk in pd.read_csv(f"{trace_dir}/batch_instance.csv", 
-                             chunksize=1000000,
-                             header=None):
-        # 使用 Terminated 状态（有真实资源数据）
-        terminated = chunk[chunk[4] == 'Terminated']
-        if len(terminated) > 0:
-            chunks.append(terminated)
-        if sum(len(c) for c in chunks) >= max_inst:
-            break
-    
-    df = pd.concat(chunks).head(max_inst)
-    
-    # 提取资源数据
-    df['cpu'] = pd.to_numeric(df[12], errors='coerce')
-    df['mem'] = pd.to_numeric(df[13], errors='coerce')
-    
-    # 过滤有效数据
-    valid = df['cpu'].notna() & df['mem'].notna()
-    df = df[valid].copy()
-    
+    # 编译缓存（python -m tools.trace_io compile）已做 Terminated + 有效资源过滤
+    df = load_instances(trace_dir, max_inst)
+
     print(f"✓ 加载 {len(df)} 条有效记录")
-    print(f"  租户数: {df[2].nunique()}")
+    print(f"  租户数: {df['tenant'].nunique()}")
     print(f"  CPU 范围: {df['cpu'].min():.3f} - {df['cpu'].max():.3f}")
     print(f"  MEM 范围: {df['mem'].min():.3f} - {df['mem'].max():.3f}")
     print(f"  CPU 变异系数: {df['cpu'].std()/df['cpu'].mean():.2f}")
@@ -58,10 +41,10 @@ def load_alibaba_trace_final(trace_dir: str, max_inst: int = 10000):
             id=idx,
             cpu=row['cpu'],
             mem=row['mem'],
-            tenant=str(row[2]),
-            arrival=int(row[5])
+            tenant=str(row['tenant']),
+            arrival=int(row['start_time'])
         )
-        for idx, row in df.sort_values(5).iterrows()
+        for idx, row in df.sort_values('start_time').iterrows()
     ]
     
     return tasks
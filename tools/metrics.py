@@ -5,15 +5,29 @@ Metrics implemented:
 * cpu_mem_util(machines) -> (avg, max, std)
 * fragmentation(machines) -> float  (how much capacity left after dominant share)
 * imbalance(machines) -> float       (std-dev of per-node dominant util)
+* ClusterAccumulator(machines)       incrementally maintained cluster sums
+  (avg cpu / mem / dominant util, busy nodes, peak util, running real CPU);
+  refresh(i) after node i changes is O(1), reading the aggregates is O(1).
+* UtilizationIntegrator(machines)    ClusterAccumulator that also integrates
+  util x dt between state changes: exact time-weighted average / peak /
+  per-node utilization, independent of the scheduling step.
 * net_bandwidth(trace_dir, sample_rows=2_000_000) -> (avg_recv_MBps, avg_send_MBps)
   Uses machine_usage.csv if available. The result is coarse-grained but good
-  enough for comparative simulation studies.
+  enough for comparative simulation studies. sample_rows=None scans the whole
+  file with the multi-process reader in tools.trace_io.ingest.
+* net_bandwidth_series(trace_dir, bucket_seconds=3600) -> DataFrame
+  Same statistics bucketed by timestamp.
+
+machine_usage.csv is scanned at most once per (file size, mtime, sample_rows):
+the statistics are memoized in-process and persisted next to the trace as
+machine_usage.netstats.<full|N>.npz.
 """
 from __future__ import annotations
 import os
 import math
+import numpy as np
 import pandas as pd
-from typing import Sequence, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 
 class _MachineProxy:
     """Duck-typed view of Machine used in simulation files."""
@@ -55,22 +69,386 @@ def imbalance(machines: Sequence[_MachineProxy]) -> float:
     return std / avg if avg > 1e-9 else 0.0
 
 
-def net_bandwidth(trace_dir: str, sample_rows: int = 2_000_000) -> Tuple[float, float]:
-    """Return average recv / send MBps across all samples in machine_usage.csv.
-    If file not found, returns (0,0).
+class ClusterAccumulator:
+    """Cluster-wide utilization sums kept up to date on every place / release.
+
+    The event engine used to rebuild per-node util lists and re-sum the real
+    CPU of every running task after each round (O(machines + running)).
+    Here the caller mutates a node's cpu_used / mem_used as before and then
+    calls refresh(i); only that node's contribution is swapped in the sums.
+    peak is the running maximum of any node's dominant util: utils only rise
+    at placements, so it equals the max over per-round snapshots.
     """
-    path = os.path.join(trace_dir, "machine_usage.csv")
-    if not os.path.exists(path):
-        return 0.0, 0.0
-    cols = [0, 1, 15, 16]  # machine_id, ts, net_recv, net_send
+
+    def __init__(self, machines: Sequence[_MachineProxy]):
+        self.machines = machines
+        n = len(machines)
+        self.cpu_util = [0.0] * n
+        self.mem_util = [0.0] * n
+        self.dom_util = [0.0] * n
+        self.busy_flags = [False] * n
+        self.sum_cpu = 0.0
+        self.sum_mem = 0.0
+        self.sum_dom = 0.0
+        self.busy = 0          # cpu_used > 0 或 mem_used > 0 的节点数
+        self.peak = 0.0
+        self.real_cpu = 0.0    # 运行中任务的真实 CPU 之和
+        self.running = 0       # 运行中任务数
+        for i in range(n):
+            self.refresh(i)
+
+    def refresh(self, i: int):
+        """节点 i 的 cpu_used / mem_used 变化后调用（O(1)）"""
+        m = self.machines[i]
+        self.update(i, m.cpu_used, m.mem_used)
+
+    def update(self, i: int, cpu_used: float, mem_used: float):
+        """按给定用量更新节点 i 的贡献（refresh 读取节点当前值后调用）"""
+        m = self.machines[i]
+        cpu = cpu_used / m.cpu if m.cpu > 0 else 0
+        mem = mem_used / m.mem if m.mem > 0 else 0
+        dom = max(cpu, mem)
+        self.sum_cpu += cpu - self.cpu_util[i]
+        self.sum_mem += mem - self.mem_util[i]
+        self.sum_dom += dom - self.dom_util[i]
+        self.cpu_util[i] = cpu
+        self.mem_util[i] = mem
+        self.dom_util[i] = dom
+        busy = cpu_used > 0 or mem_used > 0
+        if busy != self.busy_flags[i]:
+            self.busy_flags[i] = busy
+            self.busy += 1 if busy else -1
+        if dom > self.peak:
+            self.peak = dom
+
+    def add_running(self, real_cpu: float):
+        self.real_cpu += real_cpu
+        self.running += 1
+
+    def remove_running(self, real_cpu: float):
+        self.real_cpu -= real_cpu
+        self.running -= 1
+
+    def averages(self) -> Tuple[float, float, float]:
+        """(avg dominant util, avg cpu util, avg mem util) across nodes"""
+        n = len(self.machines)
+        if n == 0:
+            return 0.0, 0.0, 0.0
+        return self.sum_dom / n, self.sum_cpu / n, self.sum_mem / n
+
+
+class UtilizationIntegrator(ClusterAccumulator):
+    """Time-weighted cluster utilization (exact for a piecewise-constant state).
+
+    Call advance(t) before applying the changes that happen at time t (place,
+    release, ...), then refresh(i) / add_running / remove_running as with
+    ClusterAccumulator. Between two calls the state is constant, so the areas
+    sum(util) x dt are exact and averages no longer depend on how often the
+    engine happens to look at the cluster. Only time with busy nodes or running
+    tasks is integrated (idle gaps between trace bursts do not dilute the
+    averages, as with the old "sample only while busy" rule). Per-node areas
+    are integrated lazily on refresh, so updates stay O(1).
+    """
+
+    def __init__(self, machines: Sequence[_MachineProxy], start: Optional[float] = None):
+        n = len(machines)
+        self.now = start
+        self.active_time = 0.0    # 有节点占用或有任务运行的累计时长
+        self.area_cpu = 0.0
+        self.area_mem = 0.0
+        self.area_dom = 0.0
+        self.area_real = 0.0
+        self.node_area = [0.0] * n
+        self.node_mark = [0.0] * n  # 节点上次 refresh 时的 active_time
+        super().__init__(machines)
+
+    def advance(self, t: float):
+        """积分到时间 t（t 不得早于上一次 advance；早于时忽略）"""
+        if self.now is None:
+            self.now = t
+            return
+        dt = t - self.now
+        if dt <= 0:
+            return
+        if self.busy > 0 or self.running > 0:
+            self.active_time += dt
+            self.area_cpu += self.sum_cpu * dt
+            self.area_mem += self.sum_mem * dt
+            self.area_dom += self.sum_dom * dt
+            self.area_real += self.real_cpu * dt
+        self.now = t
+
+    def update(self, i: int, cpu_used: float, mem_used: float):
+        if self.node_mark[i] != self.active_time:
+            self.node_area[i] += self.dom_util[i] * (self.active_time - self.node_mark[i])
+            self.node_mark[i] = self.active_time
+        super().update(i, cpu_used, mem_used)
+
+    def integrate_releases(self, times, nodes, cpu, mem, real_cpu):
+        """
+        Batch version of "advance(t); release; refresh(i)" for k end events
+        (times non-decreasing). Integrates every segment between consecutive
+        ends with NumPy (per-node running totals via grouped cumsum), moves
+        now to times[-1] and drops the released tasks' real CPU. The caller
+        then applies the releases to the nodes and calls refresh(i) on the
+        touched ones, which swaps in their exact final utils.
+        """
+        k = len(times)
+        if k == 0:
+            return
+        times = np.asarray(times, dtype=np.float64)
+        nodes = np.asarray(nodes, dtype=np.int64)
+        cpu = np.asarray(cpu, dtype=np.float64)
+        mem = np.asarray(mem, dtype=np.float64)
+        real_cpu = np.asarray(real_cpu, dtype=np.float64)
+        if self.now is None:
+            self.now = float(times[0])
+
+        # 按节点分组（组内保持时间顺序），组内累计释放量 → 每个事件之后该节点的用量
+        order = np.argsort(nodes, kind="stable")
+        g_nodes = nodes[order]
+        first = np.ones(k, dtype=bool)
+        first[1:] = g_nodes[1:] != g_nodes[:-1]
+        starts = np.flatnonzero(first)
+        group = np.cumsum(first) - 1
+        touched = g_nodes[starts].tolist()
+        ms = [self.machines[i] for i in touched]
+        used_cpu = np.array([m.cpu_used for m in ms], dtype=np.float64)
+        used_mem = np.array([m.mem_used for m in ms], dtype=np.float64)
+        cap_cpu = np.array([m.cpu for m in ms], dtype=np.float64)
+        cap_mem = np.array([m.mem for m in ms], dtype=np.float64)
+
+        def grouped_cumsum(x):
+            c = np.cumsum(x)
+            return c - (c[starts] - x[starts])[group]
+
+        after_cpu = np.maximum(used_cpu[group] - grouped_cumsum(cpu[order]), 0)
+        after_mem = np.maximum(used_mem[group] - grouped_cumsum(mem[order]), 0)
+        cpu_r = np.divide(after_cpu, cap_cpu[group], out=np.zeros(k), where=cap_cpu[group] > 0)
+        mem_r = np.divide(after_mem, cap_mem[group], out=np.zeros(k), where=cap_mem[group] > 0)
+        dom_r = np.maximum(cpu_r, mem_r)
+        busy_r = (after_cpu > 0) | (after_mem > 0)
+
+        def before(after, stored):
+            prev = np.empty_like(after)
+            prev[1:] = after[:-1]
+            prev[starts] = [stored[i] for i in touched]
+            return prev
+
+        dom_b = before(dom_r, self.dom_util)
+        # 各事件对全局和的增量，换回时间顺序
+        deltas = np.empty((4, k))
+        deltas[0, order] = cpu_r - before(cpu_r, self.cpu_util)
+        deltas[1, order] = mem_r - before(mem_r, self.mem_util)
+        deltas[2, order] = dom_r - dom_b
+        deltas[3, order] = busy_r.astype(np.float64) - before(busy_r.astype(np.float64), self.busy_flags)
+
+        # 第 j 段 [t_{j-1}, t_j) 的状态 = 前 j 个事件之后的状态（t_{-1} = now）
+        sums_before = np.empty((4, k))
+        sums_before[:, 0] = (self.sum_cpu, self.sum_mem, self.sum_dom, self.busy)
+        sums_before[:, 1:] = sums_before[:, :1] + np.cumsum(deltas[:, :-1], axis=1)
+        real_before = self.real_cpu - np.concatenate(([0.0], np.cumsum(real_cpu[:-1])))
+        running_before = self.running - np.arange(k)
+        dt = np.diff(np.concatenate(([self.now], times)))
+        np.maximum(dt, 0, out=dt)
+        wdt = np.where((sums_before[3] > 0) | (running_before > 0), dt, 0.0)
+
+        self.area_cpu += float(sums_before[0] @ wdt)
+        self.area_mem += float(sums_before[1] @ wdt)
+        self.area_dom += float(sums_before[2] @ wdt)
+        self.area_real += float(real_before @ wdt)
+        active_at = self.active_time + np.cumsum(wdt)   # 每个事件时刻的累计 active_time
+
+        # 节点面积：组内相邻事件之间（首个事件与上次 refresh 之间）按事件前的 dom 积分
+        g_active = active_at[order]
+        prev_active = np.empty(k)
+        prev_active[1:] = g_active[:-1]
+        prev_active[starts] = [self.node_mark[i] for i in touched]
+        contrib = dom_b * (g_active - prev_active)
+        node_area = np.add.reduceat(contrib, starts)
+        ends = np.append(starts[1:], k) - 1
+        for i, area, mark in zip(touched, node_area.tolist(), g_active[ends].tolist()):
+            self.node_area[i] += area
+            self.node_mark[i] = mark
+
+        self.active_time = float(active_at[-1])
+        self.now = float(times[-1])
+        self.real_cpu = float(real_before[-1] - real_cpu[-1])
+        self.running -= k
+
+    def drain(self, ends):
+        """
+        模拟结束时仍在运行的任务：按结束时间依次积分到全部完成（不修改节点对象）
+        ends: [(end_time, node_index, cpu, mem, real_cpu)]
+        """
+        used = {}
+        for end_time, i, cpu, mem, real_cpu in sorted(ends, key=lambda e: e[0]):
+            self.advance(end_time)
+            m = self.machines[i]
+            cpu_used, mem_used = used.get(i, (m.cpu_used, m.mem_used))
+            used[i] = (max(0, cpu_used - cpu), max(0, mem_used - mem))
+            self.update(i, *used[i])
+            self.remove_running(real_cpu)
+
+    def time_averages(self) -> Tuple[float, float, float]:
+        """(avg dominant util, avg cpu util, avg mem util) weighted by time;
+        the instantaneous values if no busy time has elapsed yet."""
+        n = len(self.machines)
+        if n == 0:
+            return 0.0, 0.0, 0.0
+        if self.active_time <= 0:
+            return self.averages()
+        scale = self.active_time * n
+        return self.area_dom / scale, self.area_cpu / scale, self.area_mem / scale
+
+    def avg_real_cpu(self) -> float:
+        """Time-weighted real CPU of running tasks (absolute, not normalized)"""
+        if self.active_time <= 0:
+            return self.real_cpu
+        return self.area_real / self.active_time
+
+    def node_utils(self) -> List[float]:
+        """Time-weighted dominant util per node"""
+        if self.active_time <= 0:
+            return list(self.dom_util)
+        return [(area + dom * (self.active_time - mark)) / self.active_time
+                for area, dom, mark in zip(self.node_area, self.dom_util, self.node_mark)]
+
+
+NET_BUCKET_SECONDS = 300  # 时间序列的基础粒度（与 machine_usage 的字节计数周期一致）
+_NET_STATS_CACHE: Dict[tuple, Optional[dict]] = {}
+
+
+def _net_stats_path(trace_dir: str, sample_rows: Optional[int]) -> str:
+    tag = "full" if sample_rows is None else str(sample_rows)
+    return os.path.join(trace_dir, f"machine_usage.netstats.{tag}.npz")
+
+
+def _net_block_stats(chunk: pd.DataFrame) -> dict:
+    """单个分块的网络字节数之和（全局 + 按 NET_BUCKET_SECONDS 分桶）"""
+    recv = pd.to_numeric(chunk[15], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+    send = pd.to_numeric(chunk[16], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+    ts = pd.to_numeric(chunk[1], errors="coerce").to_numpy(dtype=np.float64)
+    ok = ~np.isnan(ts)
+    bucket = (ts[ok] // NET_BUCKET_SECONDS).astype(np.int64) * NET_BUCKET_SECONDS
+    keys, inv = np.unique(bucket, return_inverse=True)
+    return {
+        "rows": len(chunk),
+        "recv_sum": float(recv.sum()),
+        "send_sum": float(send.sum()),
+        "bucket": keys,
+        "bucket_recv": np.bincount(inv, weights=recv[ok], minlength=len(keys)),
+        "bucket_send": np.bincount(inv, weights=send[ok], minlength=len(keys)),
+        "bucket_rows": np.bincount(inv, minlength=len(keys)).astype(np.int64),
+    }
+
+
+def _merge_net_stats(parts) -> dict:
+    parts = list(parts)
+    bucket = np.concatenate([p["bucket"] for p in parts]) if parts else np.zeros(0, dtype=np.int64)
+    keys, inv = np.unique(bucket, return_inverse=True)
+    merged = {
+        "rows": sum(p["rows"] for p in parts),
+        "recv_sum": sum(p["recv_sum"] for p in parts),
+        "send_sum": sum(p["send_sum"] for p in parts),
+        "bucket": keys,
+    }
+    for name in ("bucket_recv", "bucket_send", "bucket_rows"):
+        values = np.concatenate([p[name] for p in parts]) if parts else np.zeros(0)
+        merged[name] = np.bincount(inv, weights=values, minlength=len(keys))
+    merged["bucket_rows"] = merged["bucket_rows"].astype(np.int64)
+    return merged
+
+
+def _scan_net_stats(path: str, sample_rows: Optional[int]) -> Optional[dict]:
+    cols = [1, 15, 16]  # ts, net_recv, net_send
     try:
+        if sample_rows is None:
+            from tools.trace_io.ingest import iter_csv_blocks
+            return _merge_net_stats(iter_csv_blocks(path, _net_block_stats, usecols=cols))
         df = pd.read_csv(path, usecols=cols, nrows=sample_rows, header=None)
     except ValueError:
-        # 部分数据集缺少网络列，直接返回 0
+        # 部分数据集缺少网络列
+        return None
+    return _net_block_stats(df)
+
+
+def _read_net_stats(cache_path: str, st: os.stat_result) -> Tuple[bool, Optional[dict]]:
+    """返回 (命中, 统计)；缓存不存在或源文件 size / mtime 变化时未命中"""
+    if not os.path.exists(cache_path):
+        return False, None
+    with np.load(cache_path) as z:
+        if int(z["size"]) != st.st_size or int(z["mtime_ns"]) != st.st_mtime_ns:
+            return False, None
+        if int(z["missing"]):
+            return True, None
+        stats = {name: z[name] for name in z.files if name not in ("size", "mtime_ns", "missing")}
+    for name in ("rows", "recv_sum", "send_sum"):
+        stats[name] = stats[name].item()
+    return True, stats
+
+
+def _write_net_stats(cache_path: str, st: os.stat_result, stats: Optional[dict]):
+    try:
+        np.savez(cache_path, size=st.st_size, mtime_ns=st.st_mtime_ns,
+                 missing=int(stats is None), **(stats or {}))
+    except OSError:
+        # trace 目录只读时只保留进程内缓存
+        pass
+
+
+def _net_stats(trace_dir: str, sample_rows: Optional[int]) -> Optional[dict]:
+    """machine_usage.csv 的网络统计；进程内缓存 + 磁盘缓存（按文件 size / mtime 校验）"""
+    path = os.path.join(trace_dir, "machine_usage.csv")
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    key = (os.path.abspath(path), sample_rows, st.st_size, st.st_mtime_ns)
+    if key in _NET_STATS_CACHE:
+        return _NET_STATS_CACHE[key]
+
+    cache_path = _net_stats_path(trace_dir, sample_rows)
+    hit, stats = _read_net_stats(cache_path, st)
+    if not hit:
+        stats = _scan_net_stats(path, sample_rows)
+        _write_net_stats(cache_path, st, stats)
+    _NET_STATS_CACHE[key] = stats
+    return stats
+
+
+def net_bandwidth(trace_dir: str, sample_rows: Optional[int] = 2_000_000) -> Tuple[float, float]:
+    """Return average recv / send MBps across all samples in machine_usage.csv.
+    If file not found, returns (0,0).
+    """
+    stats = _net_stats(trace_dir, sample_rows)
+    if stats is None or stats["rows"] == 0:
         return 0.0, 0.0
-    recv = pd.to_numeric(df[15], errors="coerce").fillna(0)
-    send = pd.to_numeric(df[16], errors="coerce").fillna(0)
     # 单位 bytes / 300s, 转 MB/s
-    recv_mbps = recv.mean() / 300 / 1024 / 1024
-    send_mbps = send.mean() / 300 / 1024 / 1024
+    recv_mbps = stats["recv_sum"] / stats["rows"] / 300 / 1024 / 1024
+    send_mbps = stats["send_sum"] / stats["rows"] / 300 / 1024 / 1024
     return float(recv_mbps), float(send_mbps)
+
+
+def net_bandwidth_series(trace_dir: str, bucket_seconds: int = 3600,
+                         sample_rows: Optional[int] = 2_000_000) -> pd.DataFrame:
+    """Average recv / send MBps per time bucket (columns: time, recv_mbps, send_mbps, samples).
+    bucket_seconds must be a multiple of NET_BUCKET_SECONDS. Empty if no data.
+    """
+    if bucket_seconds % NET_BUCKET_SECONDS != 0:
+        raise ValueError(f"bucket_seconds 必须是 {NET_BUCKET_SECONDS} 的整数倍")
+    stats = _net_stats(trace_dir, sample_rows)
+    if stats is None or len(stats["bucket"]) == 0:
+        return pd.DataFrame(columns=["time", "recv_mbps", "send_mbps", "samples"])
+    grouped = pd.DataFrame({
+        "time": stats["bucket"] // bucket_seconds * bucket_seconds,
+        "recv": stats["bucket_recv"],
+        "send": stats["bucket_send"],
+        "samples": stats["bucket_rows"],
+    }).groupby("time", as_index=False).sum()
+    scale = grouped["samples"] * 300 * 1024 * 1024
+    return pd.DataFrame({
+        "time": grouped["time"],
+        "recv_mbps": grouped["recv"] / scale,
+        "send_mbps": grouped["send"] / scale,
+        "samples": grouped["samples"],
+    })
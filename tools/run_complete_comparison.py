@@ -15,12 +15,13 @@ from __future__ import annotations
 
 import sys
 import os
-import pandas as pd
 import numpy as np
 from typing import List, Tuple, Dict, Any, Optional
 from dataclasses import dataclass
 import math
 import random
+import heapq
+import itertools
 
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if ROOT_DIR not in sys.path:
@@ -28,9 +29,11 @@ if ROOT_DIR not in sys.path:
 
 from scheduler_frameworks.firmament_scheduler import FirmamentScheduler, Machine as FirmMachine, Task as FirmTask
 from scheduler_frameworks.mesos_drf_allocator import HierarchicalAllocator, Agent, Client, Task as MesosTask
+from scheduler_frameworks.cluster_state import ClusterState, MachineView, RESOURCE_DIMS, demand_vector
 from collections import defaultdict
 
-from tools.metrics import cpu_mem_util, fragmentation, imbalance, net_bandwidth
+from tools.metrics import cpu_mem_util, fragmentation, imbalance, net_bandwidth, UtilizationIntegrator
+from tools.trace_io import load_instances, load_usage, TaskTable
 from tools.scheduler_nextgen import (
     TenantSelector,
     score_node,
@@ -96,8 +99,12 @@ class Task:
     disk_io: float = 0.0  # 磁盘 IO 需求
 
 
+# Machine.add_task 的全局加入序号（到期任务按加入顺序释放）
+_ACTIVE_TASK_SEQ = itertools.count()
+
+
 @dataclass
-class Machine:
+class Machine(MachineView):
     id: int
     cpu: float = 11.0  # ← 修正：调整为 11.0（基于实际需求计算）
     mem: float = 11.0  # ← 修正：调整为 11.0
@@ -115,7 +122,8 @@ class Machine:
     disk_io_cap: float = 100.0  # 磁盘IO容量
     failure_domain: str = ""  # 故障域（机架/集群）
     # 活跃任务跟踪（用于动态资源释放）
-    active_tasks: list = None  # 存储 (tid, tenant, sched_time, end_time, resources)
+    active_tasks: dict = None  # 加入序号 → task_info (tid, tenant, sched_time, end_time, resources)
+    end_heap: list = None  # (end_time, 加入序号) 小根堆，堆顶即本机下一次完成时间
 
     def __post_init__(self):
         if self.tasks is None:
@@ -125,15 +133,17 @@ class Machine:
         if self.opportunity_records is None:
             self.opportunity_records = []
         if self.active_tasks is None:
-            self.active_tasks = []
+            self.active_tasks = {}
+        if self.end_heap is None:
+            self.end_heap = []
 
     def utilization(self):
         """节点利用率：取 CPU 与 MEM 维度的最大值（保持与基线算法兼容）"""
         return max(self.cpu_used / self.cpu, self.mem_used / self.mem)
 
     def add_task(self, tid: str, tenant: str, sched_time: int, duration: int,
-                 cpu: float, mem: float, **extra_resources):
-        """添加任务并占用资源（带时间跟踪）"""
+                 cpu: float, mem: float, **extra_resources) -> int:
+        """添加任务并占用资源（带时间跟踪），返回结束时间"""
         end_time = sched_time + duration
         self.cpu_used += cpu
         self.mem_used += mem
@@ -149,23 +159,38 @@ class Machine:
         }
         task_info.update(extra_resources)  # mem_bandwidth, net_bandwidth, disk_io
 
-        self.active_tasks.append(task_info)
+        seq = next(_ACTIVE_TASK_SEQ)
+        self.active_tasks[seq] = task_info
+        heapq.heappush(self.end_heap, (end_time, seq))
         self.tasks.append((tid, tenant))  # 保持兼容性
 
         # 更新额外资源
         for key, value in extra_resources.items():
             if hasattr(self, key):
                 setattr(self, key, getattr(self, key) + value)
+        return end_time
 
-    def release_completed_tasks(self, current_time: int) -> int:
-        """释放已完成任务的资源，返回释放的任务数"""
-        completed = []
-        for task_info in self.active_tasks:
-            if task_info['end_time'] <= current_time:
-                completed.append(task_info)
+    def next_end_time(self) -> float:
+        """本机最早的任务结束时间（没有活跃任务时为 inf）"""
+        return self.end_heap[0][0] if self.end_heap else float('inf')
+
+    def release_completed_tasks(self, current_time: int, on_release=None) -> int:
+        """
+        释放已完成任务的资源，返回释放的任务数（on_release(task_info) 对每个释放的任务回调）
 
-        for task_info in completed:
-            self.active_tasks.remove(task_info)
+        没有到期任务时只看堆顶 O(1)；k 个到期任务 O(k log n)。
+        到期任务按加入顺序释放（与原先顺序扫描列表时的扣减顺序相同）
+        """
+        heap = self.end_heap
+        if not heap or heap[0][0] > current_time:
+            return 0
+        due = []
+        while heap and heap[0][0] <= current_time:
+            due.append(heapq.heappop(heap)[1])
+        due.sort()
+
+        for seq in due:
+            task_info = self.active_tasks.pop(seq)
             # 释放资源
             self.cpu_used = max(0, self.cpu_used - task_info['cpu'])
             self.mem_used = max(0, self.mem_used - task_info['mem'])
@@ -177,8 +202,10 @@ class Machine:
                 self.net_bandwidth = max(0, self.net_bandwidth - task_info['net_bandwidth'])
             if 'disk_io' in task_info:
                 self.disk_io = max(0, self.disk_io - task_info['disk_io'])
+            if on_release is not None:
+                on_release(task_info)
 
-        return len(completed)
+        return len(due)
 
 
 class ResidualController:
@@ -342,12 +369,18 @@ class OnlineBanditTuner:
         self.values[i] += (reward - self.values[i]) / n
 
 
-def load_alibaba_trace(trace_dir: str, max_inst: int = None) -> List['Task']:
+def load_alibaba_trace(trace_dir: str, max_inst: int = None,
+                       t_start: int = None, t_end: int = None,
+                       sample: str = "head", seed: int = 0) -> TaskTable:
     """
     加载 Alibaba 2018 trace（修正版 + 内存优化）
     使用 Terminated 状态 + 真实资源数据（列 12, 13）
 
     max_inst: None = 默认 100000（防止内存溢出）
+    t_start / t_end: 只加载 start_time 落在 [t_start, t_end) 内的实例（单位秒，trace 时间轴）；
+                     有编译缓存时通过时间索引直接定位，不再从头扫描
+    sample / seed: 如何选出 max_inst 条（head = 文件前 N 条；reservoir / tenant / priority / time
+                   为全 trace 上的均匀或分层抽样，见 tools/trace_io/sample.py）
     """
     # 默认限制 10 万条（防止 OOM）
     if max_inst is None:
@@ -356,135 +389,39 @@ def load_alibaba_trace(trace_dir: str, max_inst: int = None) -> List['Task']:
         print("提示：如需更多，可指定参数：python ... ./data 500000\n")
     else:
         print(f"━━━ 加载 Alibaba 2018 Cluster Trace（{max_inst} 条）━━━\n")
-
-    # 读取任务表（包含任务类型 / 优先级等）
-    task_path = os.path.join(trace_dir, "batch_task.csv")
-    if not os.path.exists(task_path):
-        raise FileNotFoundError(f"缺少 batch_task.csv: {task_path}")
-
-    task_df = pd.read_csv(task_path, header=None, usecols=[0, 3, 4])
-    task_df = task_df.rename(columns={0: "task_id", 3: "task_type", 4: "task_priority"})
-    task_df["task_id"] = task_df["task_id"].astype(str).str.strip()
-    task_df["task_type"] = pd.to_numeric(task_df["task_type"], errors="coerce").fillna(0).astype("Int8")
-    task_df["task_priority"] = pd.to_numeric(task_df["task_priority"], errors="coerce").fillna(0).astype("Int8")
-    task_df = task_df.drop_duplicates(subset="task_id", keep="last")
-    task_type_map = task_df.set_index("task_id")["task_type"]
-    task_pri_map = task_df.set_index("task_id")["task_priority"]
+    if t_start is not None or t_end is not None:
+        print(f"  时间窗口: [{t_start}, {t_end})\n")
+    if sample != "head":
+        print(f"  抽样模式: {sample}（seed={seed}）\n")
 
     # ---------- merge real usage ----------
-    usage_path = os.path.join(trace_dir, "usage_avg.csv")
-    if os.path.exists(usage_path):
-        usage_df = pd.read_csv(usage_path)
-        usage_map = usage_df.set_index("instance_id")[["cpu_used", "mem_used"]].to_dict("index")
-        print(f"✓ merged real usage rows: {len(usage_map):,}")
+    # usage_agg.npz（tools/extract_avg_usage.py 生成）优先，兼容旧的 usage_avg.csv
+    usage = load_usage(trace_dir)
+    if usage is not None:
+        print(f"✓ merged real usage rows: {len(usage):,}")
     else:
-        usage_map = {}
-        print("⚠ usage_avg.csv not found, using 50% estimation")
-
-    all_valid_rows = []
-    total_scanned = 0
-
-    for chunk_idx, chunk in enumerate(pd.read_csv(f"{trace_dir}/batch_instance.csv",
-                                                  chunksize=1000000,
-                                                  header=None)):
-        total_scanned += len(chunk)
-
-        # Terminated 状态才有资源数据
-        terminated = chunk[chunk[4] == 'Terminated'].copy()
-
-        if len(terminated) > 0:
-            # 提取所有相关字段
-            terminated['cpu'] = pd.to_numeric(terminated[12], errors='coerce')  # plan_cpu
-            terminated['mem'] = pd.to_numeric(terminated[13], errors='coerce')  # plan_mem
-            terminated['start_time'] = pd.to_numeric(terminated[5], errors='coerce').fillna(0).astype(int)
-            terminated['end_time'] = pd.to_numeric(terminated[6], errors='coerce').fillna(0).astype(int)
-            terminated['cpu_avg'] = pd.to_numeric(terminated[10], errors='coerce').fillna(0)
-            terminated['cpu_max'] = pd.to_numeric(terminated[11], errors='coerce').fillna(0)
-            terminated['machine_id'] = terminated[7].astype(str).str.strip()
-
-            # 只保留有效数据
-            valid = terminated['cpu'].notna() & terminated['mem'].notna() & \
-                    (terminated['cpu'] > 0) & (terminated['mem'] > 0)
-            valid_rows = terminated[valid]
-            valid_rows = valid_rows.rename(columns={1: "task_id"})
-            valid_rows["task_id"] = valid_rows["task_id"].astype(str).str.strip()
-            valid_rows["task_type"] = valid_rows["task_id"].map(task_type_map).fillna(0).astype("Int8")
-            valid_rows["task_priority"] = valid_rows["task_id"].map(task_pri_map).fillna(0).astype("Int8")
-
-            if len(valid_rows) > 0:
-                all_valid_rows.append(valid_rows)
-
-        # 进度显示
-        collected = sum(len(v) for v in all_valid_rows)
-        if chunk_idx % 10 == 0:
-            print(f"  已扫描 {total_scanned / 1e6:.1f}M 行，收集 {collected} 条有效记录...", end='\r')
-
-        # 达到上限即停止（节省内存和时间）
-        if collected >= max_inst:
-            print(f"  已扫描 {total_scanned / 1e6:.1f}M 行，收集 {collected} 条有效记录...")
-            break
+        print("⚠ usage_agg.npz / usage_avg.csv not found, using 50% estimation")
 
-    print()
-
-    if not all_valid_rows:
-        raise ValueError("未找到有效数据")
-
-    df = pd.concat(all_valid_rows, ignore_index=True).head(max_inst)
-
-    # 填充缺失的任务类型/优先级
-    df["task_type"].fillna(0, inplace=True)
-    df["task_priority"].fillna(0, inplace=True)
+    # 编译缓存优先（python -m tools.trace_io compile），缺失/过期时回退 CSV 扫描
+    df = load_instances(trace_dir, max_inst, t_start=t_start, t_end=t_end, sample=sample, seed=seed)
 
-    print(f"✓ {len(df)} 条有效记录（扫描了 {total_scanned / 1e6:.1f}M 行）")
-    print(f"  租户数: {df[2].nunique()}")
+    print(f"✓ {len(df)} 条有效记录")
+    print(f"  租户数: {df['tenant'].nunique()}")
     print(f"  CPU: {df['cpu'].mean():.3f} (std={df['cpu'].std():.3f})")
     print(f"  MEM: {df['mem'].mean():.3f} (std={df['mem'].std():.3f})\n")
 
-    tasks = []
-    for idx, row in df.sort_values(5).iterrows():
-        slo_sensitive = 'high' if int(row['task_type']) == 1 else 'low'
-        inst_id = str(row[0])  # instance_id
-        cpu_req = row['cpu']
-        mem_req = row['mem']
-
-        # 从usage_map获取真实使用量
-        real = usage_map.get(inst_id, {})
-        cpu_real = real.get("cpu_used", cpu_req * 0.5)
-        mem_real = real.get("mem_used", mem_req * 0.5)
-
-        # 计算任务运行时长
-        start = int(row['start_time'])
-        end = int(row['end_time'])
-        duration = max(end - start, 0) if end > start else 0
-
-        task = Task(
-            id=inst_id,
-            cpu=cpu_req,
-            mem=mem_req,
-            tenant=str(row[2]),
-            arrival=int(row[5]),
-            slo_sensitive=slo_sensitive,
-            priority=int(row['task_priority']),
-            # 新增字段
-            start_time=start,
-            end_time=end,
-            duration=duration,
-            cpu_avg=float(row['cpu_avg']),
-            cpu_max=float(row['cpu_max']),
-            machine_id=str(row['machine_id']),
-            real_cpu=cpu_real,
-            real_mem=mem_real,
-        )
-        tasks.append(task)
+    # 列式任务表（向量化构建），按 start_time 排序；行视图兼容 Task 属性访问
+    tasks = TaskTable.from_frame(df, usage=usage)
 
-    durations = [t.duration for t in tasks if t.duration > 0]
-    arrivals = [t.arrival for t in tasks]
+    durations = tasks.duration[tasks.duration > 0]
+    arrivals = tasks.arrival
 
-    print(f"  任务时长统计: 平均={np.mean(durations):.0f}秒, "
-          f"中位数={np.median(durations):.0f}秒, "
-          f"P90={np.percentile(durations, 90):.0f}秒")
-    print(f"  到达时间跨度: {min(arrivals):.0f} ~ {max(arrivals):.0f} (共{max(arrivals) - min(arrivals):.0f}秒)")
-    print(f"  推荐调度间隔: {min(int(np.median(durations)), 60)}秒 (中位时长的一半或60秒)\n")
+    if len(durations):
+        print(f"  任务时长统计: 平均={np.mean(durations):.0f}秒, "
+              f"中位数={np.median(durations):.0f}秒, "
+              f"P90={np.percentile(durations, 90):.0f}秒")
+        print(f"  到达时间跨度: {arrivals.min():.0f} ~ {arrivals.max():.0f} (共{arrivals.max() - arrivals.min():.0f}秒)")
+        print(f"  推荐调度间隔: {min(int(np.median(durations)), 60)}秒 (中位时长的一半或60秒)\n")
 
     return tasks
 
@@ -577,6 +514,8 @@ def run_mesos_drf(tasks: List[Task], num_machines: int = 114) -> dict:
             tasks_by_fw[task.tenant].append(mesos_task)
 
         # 调用 allocator
+        if offer_cycles:
+            return allocator.allocate_offers(tasks_by_fw, batch_size=offer_batch)
         return allocator.allocate(tasks_by_fw)
 
     # ⭐ 启用事件驱动模拟（自动资源释放）
@@ -586,6 +525,15 @@ def run_mesos_drf(tasks: List[Task], num_machines: int = 114) -> dict:
     recommended_step = max(1, min(median_duration // 2, 60))
     batch_step = int(os.getenv("BATCH_STEP_SECONDS", str(recommended_step)))
 
+    # ⭐ offer 周期模式（默认关闭）：每个调度轮次是一次 generateOffers 分配周期，
+    # 周期间隔对应 mesos master 的 --allocation_interval，batch 为每个 offer 最多接受的任务数
+    offer_cycles = os.getenv("MESOS_OFFER_CYCLES", "0") == "1"
+    offer_batch = int(os.getenv("MESOS_OFFER_BATCH", "0"))
+    if offer_cycles:
+        batch_step = int(os.getenv("MESOS_ALLOCATION_INTERVAL", str(batch_step)))
+        print(f"  [offer 周期] 分配间隔={batch_step}秒, 每个 offer 最多接受 "
+              f"{offer_batch if offer_batch > 0 else '不限'} 个任务")
+
     print(f"  [事件驱动] 调度间隔={batch_step}秒 (任务中位时长={median_duration}秒)")
 
     result = enable_event_driven_simulation(
@@ -596,6 +544,14 @@ def run_mesos_drf(tasks: List[Task], num_machines: int = 114) -> dict:
         allocator_obj=allocator,  # ⭐ 传入 allocator 以调用 recover_resources()
     )
 
+    if allocator.cycle_latencies:
+        lat = np.array(allocator.cycle_latencies) * 1000
+        result["allocator_cycle_ms"] = {"cycles": len(lat), "mean": float(lat.mean()),
+                                        "p50": float(np.percentile(lat, 50)),
+                                        "p99": float(np.percentile(lat, 99)), "max": float(lat.max())}
+        print(f"  [offer 周期] {len(lat)} 个周期, 分配耗时 均值={lat.mean():.2f}ms "
+              f"p50={np.percentile(lat, 50):.2f}ms p99={np.percentile(lat, 99):.2f}ms")
+
     result["name"] = "Mesos DRF (NSDI'11 源码)"
     return result
 
@@ -609,7 +565,15 @@ def run_tetris(tasks: List[Task], num_machines: int = 114) -> dict:
     random.seed(789)
 
     machines = [Machine(id=i, cpu=11.0, mem=11.0) for i in range(num_machines)]
+    state = ClusterState(machines)
     k = 2  # Tetris 评分参数
+    # 参与对齐打分的资源维度（默认 cpu,mem；可加 mem_bandwidth / net_bandwidth / disk_io）
+    dims = tuple(os.getenv("TETRIS_DIMS", "cpu,mem").split(","))
+    unknown = [d for d in dims if d not in RESOURCE_DIMS]
+    if unknown or dims[:2] != ("cpu", "mem"):
+        raise ValueError(f"TETRIS_DIMS 必须以 cpu,mem 开头且取自 {RESOURCE_DIMS}: {dims}")
+    # 批内放置是否计入用量（默认否：整批按本轮开始时的用量打分，放置由事件引擎在批后统一生效）
+    commit_in_batch = os.getenv("TETRIS_BATCH_COMMIT", "0") == "1"
 
     # 定义批量调度函数
     def tetris_schedule_batch(batch_tasks, current_machines):
@@ -633,29 +597,14 @@ def run_tetris(tasks: List[Task], num_machines: int = 114) -> dict:
                 queue.append(low_queue[low_idx])
                 low_idx += 1
 
-        for task in queue:
-            best_machine = None
-            best_score = float('-inf')
-
-            for machine in current_machines:
-                if (machine.cpu_used + task.cpu > machine.cpu or
-                        machine.mem_used + task.mem > machine.mem):
-                    continue
-
-                cpu_norm_before = machine.cpu_used / machine.cpu
-                mem_norm_before = machine.mem_used / machine.mem
-                cpu_norm_after = (machine.cpu_used + task.cpu) / machine.cpu
-                mem_norm_after = (machine.mem_used + task.mem) / machine.mem
-
-                score = ((cpu_norm_after ** k + mem_norm_after ** k) -
-                         (cpu_norm_before ** k + mem_norm_before ** k))
-
-                if score > best_score:
-                    best_score = score
-                    best_machine = machine
-
-            if best_machine:
-                placements.append((task.id, best_machine.id))
+        # 可行性掩码与对齐分数 (cpu_after^k + mem_after^k) - (cpu_before^k + mem_before^k)
+        # 对所有机器向量化算出，取 argmax（并列取先出现的机器，与逐台比较的 > 相同）；
+        # 相同需求的任务只打分一次
+        rows = state.best_alignment_batch([demand_vector(task, dims) for task in queue], dims, k,
+                                          commit=commit_in_batch)
+        for task, row in zip(queue, rows):
+            if row is not None:
+                placements.append((task.id, state.machines[row].id))
 
         return placements
 
@@ -672,6 +621,7 @@ def run_tetris(tasks: List[Task], num_machines: int = 114) -> dict:
         tasks=tasks,
         machines=machines,
         batch_step_seconds=batch_step,
+        extra_dims=dims[2:],  # 额外维度的占用 / 释放由事件引擎记账
     )
 
     result["name"] = "Tetris (SIGCOMM'14 公式)"
@@ -741,6 +691,7 @@ def run_slo_driven(tasks: List[Task], num_machines: int = 114) -> dict:
     print("\n━━━ [4/4] SLO-Driven (本研究) ━━━")
 
     machines = [Machine(id=i, cpu=11.0, mem=11.0) for i in range(num_machines)]
+    state = ClusterState(machines)
     tenant_credits = defaultdict(lambda: 1.0)
     risk_model = RiskModel()  # 使用统一的风险模型
 
@@ -922,9 +873,7 @@ def run_slo_driven(tasks: List[Task], num_machines: int = 114) -> dict:
             print(f"  SLO-Driven {idx}/{len(tasks)}...", end='\r')
 
         # 直接从所有机器中选择可容纳的候选，避免小任务受 0.90 阈值限制
-        candidates = [m for m in machines
-                      if m.cpu_used + task.cpu <= m.cpu and
-                      m.mem_used + task.mem <= m.mem]
+        candidates = state.fitting(task.cpu, task.mem)
 
         if not candidates:
             # 无直接可容纳节点时，尝试救援放置或回退到最低违约节点
@@ -935,9 +884,7 @@ def run_slo_driven(tasks: List[Task], num_machines: int = 114) -> dict:
             else:
                 # 选取容量可行且违约最小的节点作为兜底
                 fallback = []
-                for m in machines:
-                    if m.cpu_used + task.cpu > m.cpu or m.mem_used + task.mem > m.mem:
-                        continue
+                for m in state.fitting(task.cpu, task.mem):
                     ua = util_with_task(m, task)
                     viol = predict_violation_risk(ua)
                     fallback.append((viol, ua, m))
@@ -951,6 +898,7 @@ def run_slo_driven(tasks: List[Task], num_machines: int = 114) -> dict:
                     if failed > 0.05 * len(tasks) and len(machines) < num_machines + 20:
                         new_machine = Machine(id=len(machines))
                         machines.append(new_machine)
+                        state.attach(new_machine)
                     continue
 
         if cluster_state["top_k"] > 0 and len(candidates) > cluster_state["top_k"]:
@@ -1103,8 +1051,8 @@ def run_slo_driven(tasks: List[Task], num_machines: int = 114) -> dict:
                 pool = "slo_spill"
             else:
                 alt_candidates = []
-                for m in machines:
-                    if m == machine or m.cpu_used + task.cpu > m.cpu or m.mem_used + task.mem > m.mem:
+                for m in state.fitting(task.cpu, task.mem):
+                    if m == machine:
                         continue
                     ua = util_with_task(m, task)
                     if predict_violation_risk(ua) <= risk_threshold and ua <= calc_node_limit(m.id):
@@ -1290,6 +1238,7 @@ def run_nextgen_scheduler(tasks: List[Task], num_machines: int = 114) -> dict:
     print("\n━━━ [5/5] NextGen Scheduler (Layered) ━━━")
 
     machines = [Machine(id=i, cpu=11.0, mem=11.0) for i in range(num_machines)]
+    state = ClusterState(machines)
 
     cpu_total = sum(m.cpu for m in machines)
     mem_total = sum(m.mem for m in machines)
@@ -1316,6 +1265,11 @@ def run_nextgen_scheduler(tasks: List[Task], num_machines: int = 114) -> dict:
 
     attempts = defaultdict(int)
 
+    # id → 任务（保留首次出现，与原先 next(...) 线性查找的语义一致）
+    task_by_id = {}
+    for t in tasks:
+        task_by_id.setdefault(t.id, t)
+
     current_time = sorted_tasks[0].arrival
     for task in sorted_tasks:
         selector.add_task((task.id, task.cpu, task.mem, task.tenant, task.arrival), now_ms=task.arrival)
@@ -1334,20 +1288,32 @@ def run_nextgen_scheduler(tasks: List[Task], num_machines: int = 114) -> dict:
     use_dynamic_release = os.getenv("NEXTGEN_DYNAMIC_RELEASE", "1") == "1"
     total_released = 0
 
-    # ⭐ 过程采样（与事件驱动模式保持一致）
-    util_samples = []
-    cpu_util_samples = []
-    mem_util_samples = []
-    real_cpu_samples = []
-    max_util_seen = 0.0
-    sample_interval = 100  # 每100个任务采样一次
+    # ⭐ 过程利用率：放置 / 释放时对 利用率 × dt 精确积分（与事件驱动模式一致，tools/metrics.py）
+    cluster = UtilizationIntegrator(machines, start=current_time)
+
+    def real_cpu_of(tid, cpu):
+        task_obj = task_by_id.get(tid)
+        return getattr(task_obj, 'real_cpu', cpu * 0.5) if task_obj else 0.0
+
+    def on_release(task_info):
+        cluster.remove_running(real_cpu_of(task_info['tid'], task_info['cpu']))
+
+    # 全局"下一次完成"水位：(end_time, machine_id) 小根堆，每个任务一项
+    completions = []
 
     while scheduled + failed < total_tasks:
-        # ⭐ 每次迭代开始时释放已完成任务的资源
+        # ⭐ 每次迭代开始时释放已完成任务的资源（只处理有任务到期的机器，按机器顺序）
         if use_dynamic_release:
-            released_count = sum(m.release_completed_tasks(current_time) for m in machines)
-            if released_count > 0:
-                total_released += released_count
+            cluster.advance(current_time)
+            if completions and completions[0][0] <= current_time:
+                due_machines = set()
+                while completions and completions[0][0] <= current_time:
+                    due_machines.add(heapq.heappop(completions)[1])
+                for machine_id in sorted(due_machines):
+                    released_count = machines[machine_id].release_completed_tasks(current_time, on_release)
+                    if released_count > 0:
+                        total_released += released_count
+                        cluster.refresh(machine_id)
 
         while True:
             ready = retry_q.pop_ready(current_time)
@@ -1407,12 +1373,10 @@ def run_nextgen_scheduler(tasks: List[Task], num_machines: int = 114) -> dict:
         best_score = float("inf")
 
         # 获取当前任务的完整信息（包含 machine_id 等）
-        task_obj = next((t for t in tasks if t.id == tid), None)
+        task_obj = task_by_id.get(tid)
         use_affinity = os.getenv("NEXTGEN_USE_AFFINITY", "1") == "1"
 
-        for machine in machines:
-            if machine.cpu_used + cpu > machine.cpu or machine.mem_used + mem > machine.mem:
-                continue
+        for machine in state.fitting(cpu, mem):
             penalty = guard.penalty(machine)
             if penalty >= guard.high_penalty:
                 continue
@@ -1450,6 +1414,7 @@ def run_nextgen_scheduler(tasks: List[Task], num_machines: int = 114) -> dict:
                 candidate = machine
 
         if candidate:
+            cluster.advance(current_time)
             # ⭐ 使用动态资源管理方法添加任务
             if use_dynamic_release and task_obj and task_obj.duration > 0:
                 # 准备额外资源字典
@@ -1461,8 +1426,10 @@ def run_nextgen_scheduler(tasks: List[Task], num_machines: int = 114) -> dict:
                 if hasattr(task_obj, 'disk_io') and task_obj.disk_io > 0:
                     extra_res['disk_io'] = task_obj.disk_io
 
-                candidate.add_task(tid, tenant, current_time, task_obj.duration,
-                                   cpu, mem, **extra_res)
+                end_time = candidate.add_task(tid, tenant, current_time, task_obj.duration,
+                                              cpu, mem, **extra_res)
+                heapq.heappush(completions, (end_time, candidate.id))
+                cluster.add_running(real_cpu_of(tid, cpu))
             else:
                 # 回退到静态模式（兼容无duration数据的情况）
                 candidate.cpu_used += cpu
@@ -1476,6 +1443,7 @@ def run_nextgen_scheduler(tasks: List[Task], num_machines: int = 114) -> dict:
                         candidate.net_bandwidth += (task_obj.net_in + task_obj.net_out)
                     if hasattr(task_obj, 'disk_io'):
                         candidate.disk_io += task_obj.disk_io
+            cluster.refresh(candidate.id)
 
             selector.update_usage(tenant, cpu, mem)
             scheduled += 1
@@ -1499,37 +1467,17 @@ def run_nextgen_scheduler(tasks: List[Task], num_machines: int = 114) -> dict:
             "imbalance": imb,
         })
 
-        # ⭐ 过程采样（每隔一定任务数采样一次）
-        if (scheduled + failed) % sample_interval == 0:
-            current_utils = [m.utilization() for m in machines]
-            cpu_utils = [m.cpu_used / m.cpu if m.cpu > 0 else 0 for m in machines]
-            mem_utils = [m.mem_used / m.mem if m.mem > 0 else 0 for m in machines]
-
-            if current_utils:
-                util_samples.append(sum(current_utils) / len(current_utils))
-                cpu_util_samples.append(sum(cpu_utils) / len(cpu_utils))
-                mem_util_samples.append(sum(mem_utils) / len(mem_utils))
-                max_util_seen = max(max_util_seen, max(current_utils))
-
-                # 采样真实CPU使用
-                if use_dynamic_release:
-                    real_cpu_now = 0.0
-                    for m in machines:
-                        for task_info in m.active_tasks:
-                            tid = task_info['tid']
-                            task_obj = next((t for t in sorted_tasks if t.id == tid), None)
-                            if task_obj:
-                                real_cpu_now += getattr(task_obj, 'real_cpu', task_info['cpu'] * 0.5)
-                    real_cpu_samples.append(real_cpu_now)
-
-    # 计算过程平均指标（与事件驱动模式一致）
-    avg_util_over_time = sum(util_samples) / len(util_samples) if util_samples else 0.0
-    avg_cpu_util = sum(cpu_util_samples) / len(cpu_util_samples) if cpu_util_samples else 0.0
-    avg_mem_util = sum(mem_util_samples) / len(mem_util_samples) if mem_util_samples else 0.0
+    # 仍在运行的任务积分到各自结束（事件驱动模式同样回放到全部任务完成），节点对象保持最终快照
+    if use_dynamic_release:
+        cluster.drain([(info['end_time'], m.id, info['cpu'], info['mem'], real_cpu_of(info['tid'], info['cpu']))
+                       for m in machines for info in m.active_tasks.values()])
+
+    # 计算过程平均指标（时间加权，与事件驱动模式一致）
+    avg_util_over_time, avg_cpu_util, avg_mem_util = cluster.time_averages()
+    max_util_seen = cluster.peak
 
     capacity_total = sum(m.cpu for m in machines)
-    avg_real_cpu = sum(real_cpu_samples) / len(real_cpu_samples) if real_cpu_samples else 0.0
-    effective_util_over_time = avg_real_cpu / capacity_total if capacity_total > 0 else 0.0
+    effective_util_over_time = cluster.avg_real_cpu() / capacity_total if capacity_total > 0 else 0.0
 
     # 输出动态资源管理统计
     if use_dynamic_release:
@@ -1539,7 +1487,7 @@ def run_nextgen_scheduler(tasks: List[Task], num_machines: int = 114) -> dict:
         print(f"    已完成释放: {total_released}")
         print(f"    仍在运行: {active_task_count}")
         print(f"    资源释放率: {total_released / max(scheduled, 1) * 100:.1f}%")
-        print(f"    采样次数: {len(util_samples)}")
+        print(f"    积分时长: {cluster.active_time:.0f}秒")
         print(f"    过程平均利用率: {avg_util_over_time * 100:.1f}%")
         print(f"    过程平均真实利用率: {effective_util_over_time * 100:.1f}%")
 
@@ -1551,9 +1499,10 @@ def run_nextgen_scheduler(tasks: List[Task], num_machines: int = 114) -> dict:
         "state": global_stats,
         "total_released": total_released if use_dynamic_release else 0,
         "active_tasks": sum(len(m.active_tasks) for m in machines) if use_dynamic_release else 0,
-        # ⭐ 添加过程采样数据（与事件驱动保持一致）
+        # ⭐ 过程利用率（时间加权，与事件驱动保持一致）
         "avg_util_over_time": avg_util_over_time,
         "max_util_seen": max_util_seen,
+        "per_machine_util": cluster.node_utils(),
         "avg_cpu_util": avg_cpu_util,
         "avg_mem_util": avg_mem_util,
         "effective_util_over_time": effective_util_over_time,
@@ -1575,9 +1524,10 @@ def analyze_result(result: dict, trace_dir: str, tasks: List[Task]) -> dict:
 
     # ⭐ 对于事件驱动模式，直接使用时间加权的真实利用率
     if 'effective_util_over_time' in result:
-        # 事件驱动模式：使用过程中采样计算的平均真实利用率
+        # 事件驱动模式：使用过程中时间加权的平均真实利用率
         effective_util = result['effective_util_over_time']
         waste_rate = 1.0 - effective_util
+        real_used = effective_util * sum(m.cpu for m in machines)  # 时间平均的真实 CPU 用量
     else:
         # 静态模式：基于最终快照计算
         real_used = 0.0
@@ -1591,16 +1541,21 @@ def analyze_result(result: dict, trace_dir: str, tasks: List[Task]) -> dict:
 
     # ⭐ 使用事件驱动模拟过程中的利用率（而不是最终快照）
     if 'avg_util_over_time' in result and 'max_util_seen' in result:
-        # 事件驱动模式：使用过程中采样的利用率
+        # 事件驱动模式：使用过程中时间加权的利用率
         avg_util = result['avg_util_over_time']
         max_util = result['max_util_seen']
         cpu_util = result.get('avg_cpu_util', 0.0)
         mem_util = result.get('avg_mem_util', 0.0)
         # 碎片率基于平均利用率
         frag = 1.0 - avg_util
-        # 失配率设为0（事件驱动下最终快照不准确，无法计算有意义的 std）
-        imb = 0.0
-        std_util = 0.0
+        # 失配率基于各节点时间加权的利用率（最终快照不准确）
+        node_utils = result.get('per_machine_util')
+        if node_utils:
+            std_util = float(np.std(node_utils))
+            imb = std_util / avg_util if avg_util > 1e-9 else 0.0
+        else:
+            imb = 0.0
+            std_util = 0.0
     else:
         # 静态模式：使用最终快照
         avg_util, max_util, std_util = cpu_mem_util(machines)
@@ -1620,8 +1575,6 @@ def analyze_result(result: dict, trace_dir: str, tasks: List[Task]) -> dict:
     total = result["scheduled"] + result["failed"]
 
     # ----- DEBUG: per-algorithm request size and usage summary -----
-    import numpy as np
-
     # ⭐ 对于事件驱动模式，使用所有已调度任务
     if 'all_scheduled_task_ids' in result:
         req_cpu = [task_dict[tid].cpu for tid in result['all_scheduled_task_ids'] if tid in task_dict]
@@ -1715,12 +1668,21 @@ def main():
         print("\n示例:")
         print("  python run_complete_comparison.py ./data        # 加载全部")
         print("  python run_complete_comparison.py ./data 10000  # 只加载 10000 条")
+        print("  TRACE_T_START=72000 TRACE_T_END=75600 python run_complete_comparison.py ./data  # 只加载第 20 小时")
+        print("  TRACE_SAMPLE=tenant TRACE_SAMPLE_SEED=1 python run_complete_comparison.py ./data 10000  # 按租户分层抽样")
         print("\n需要安装: pip install ortools")
         sys.exit(1)
 
     # 加载数据：None = 全部数据
     max_instances = None if len(sys.argv) < 3 else int(sys.argv[2])
-    tasks = load_alibaba_trace(sys.argv[1], max_instances)
+    # ⭐ 时间窗口（例如只看峰值时段）：TRACE_T_START / TRACE_T_END，单位秒
+    t_start = int(os.environ["TRACE_T_START"]) if os.getenv("TRACE_T_START") else None
+    t_end = int(os.environ["TRACE_T_END"]) if os.getenv("TRACE_T_END") else None
+    # ⭐ 抽样模式：TRACE_SAMPLE=head|reservoir|tenant|priority|time，TRACE_SAMPLE_SEED 固定随机性
+    sample = os.getenv("TRACE_SAMPLE", "head")
+    seed = int(os.getenv("TRACE_SAMPLE_SEED", "0"))
+    tasks = load_alibaba_trace(sys.argv[1], max_instances, t_start=t_start, t_end=t_end,
+                               sample=sample, seed=seed)
 
     # 根据任务数动态调整节点数，或用户 CLI 指定
     if len(sys.argv) >= 4:
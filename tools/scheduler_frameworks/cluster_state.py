@@ -0,0 +1,616 @@
+#!/usr/bin/env python3
+"""
+集群资源状态（NumPy 数组）—— 各调度器共享
+
+容量 / 已用量按资源维度存成 (维度, 机器) 的二维数组，维度顺序见 RESOURCE_DIMS:
+    cpu, mem, mem_bandwidth, net_bandwidth, disk_io
+
+机器对象（run_complete_comparison.Machine）继承 MachineView，
+attach 之后仍是原来的 dataclass：读属性是普通属性读取（标量循环不变慢），
+只有资源字段带写入钩子，赋值时同步写入数组。因此调度器可以直接对数组做向量化的可行性判断 / 打分，
+旧的按属性访问的代码无需改动。
+
+约定: 资源字段只通过机器对象赋值（或 ClusterState 的方法）修改，数组不单独写。
+
+CapacityIndex 是按剩余 (cpu, mem) 分桶的二维机器索引，回答 "哪些机器可行"（fits）、
+"最空闲的可行机器"（worst-fit）和 "最紧的可行机器"（best-fit）：整桶可行 / 不可行的桶不逐台检查，
+只扫描需求所在的边界桶。ClusterState 维护一份（放置 / 释放时同步），fit_indices / fitting 和
+Tetris 对齐打分先用它筛出可行列，再在这些列上做精确的浮点比较。
+"""
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+RESOURCE_DIMS = ("cpu", "mem", "mem_bandwidth", "net_bandwidth", "disk_io")
+
+# 机器对象字段 → 数组行（已用量 / 容量）
+_USED_FIELDS = {
+    "cpu_used": 0,
+    "mem_used": 1,
+    "mem_bandwidth": 2,
+    "net_bandwidth": 3,
+    "disk_io": 4,
+}
+_CAPACITY_FIELDS = {
+    "cpu": 0,
+    "mem": 1,
+    "mem_bandwidth_cap": 2,
+    "net_bandwidth_cap": 3,
+    "disk_io_cap": 4,
+}
+# 机器类型没有的维度使用的默认容量（与 run_complete_comparison.Machine 的默认值一致）
+_DEFAULT_CAPACITY = (11.0, 11.0, 100.0, 1000.0, 100.0)
+
+# 用 CapacityIndex 取候选列时需求放宽的相对量（远大于浮点舍入，远小于任何实际需求）
+_FIT_SLACK = 1e-9
+# 索引给出的候选机器超过 1/_DENSE_FRACTION 时改用整列掩码
+_DENSE_FRACTION = 4
+
+# 批量打分时一次广播计算的 (任务形状 × 维度 × 机器) 元素上限
+ALIGNMENT_BLOCK_ELEMS = 1 << 16
+
+# 任务在各维度上的需求（与 NextGen add_task 的 extra_res 取法一致）
+TASK_DEMAND = {
+    "cpu": lambda t: t.cpu,
+    "mem": lambda t: t.mem,
+    "mem_bandwidth": lambda t: getattr(t, "mem_bandwidth", 0.0),
+    "net_bandwidth": lambda t: getattr(t, "net_in", 0.0) + getattr(t, "net_out", 0.0),
+    "disk_io": lambda t: getattr(t, "disk_io", 0.0),
+}
+
+
+def demand_vector(task: Any, dims: Sequence[str] = ("cpu", "mem")) -> List[float]:
+    """任务在 dims 各维度上的需求"""
+    return [TASK_DEMAND[d](task) for d in dims]
+
+
+class _ResourceField:
+    """
+    资源字段的写入钩子（只定义 __set__）
+
+    没有 __get__ 的数据描述符不拦截读取：读属性仍直接取实例 __dict__，与普通属性一样快；
+    赋值时写入实例 __dict__，机器已 attach 时再同步到 state 的数组
+    """
+    __slots__ = ("name", "dim", "used")
+
+    def __init__(self, name: str, dim: int, used: bool):
+        self.name = name
+        self.dim = dim
+        self.used = used
+
+    def __set__(self, machine, value):
+        machine.__dict__[self.name] = value
+        state = machine._cluster_state
+        if state is None:
+            return
+        row = machine._cluster_row
+        if self.used:
+            state.used[self.dim, row] = value
+        else:
+            state.capacity[self.dim, row] = value
+        if self.dim < 2 and state._index is not None:
+            state._dirty.add(row)
+
+
+def _install_resource_fields(cls: type):
+    """
+    在机器类上为 _USED_FIELDS / _CAPACITY_FIELDS 中该类已有的字段装上 _ResourceField（每个类一次）
+
+    dataclass 把字段默认值存成类属性，描述符若写在类体里会被当成默认值，
+    因此在第一次 attach 时再装（__init__ 的默认值在装饰时已经取走，不受影响）
+    """
+    if cls.__dict__.get("_resource_fields_installed"):
+        return
+    declared = getattr(cls, "__dataclass_fields__", {})
+    for fields, used in ((_USED_FIELDS, True), (_CAPACITY_FIELDS, False)):
+        for name, dim in fields.items():
+            if name in declared or hasattr(cls, name):
+                setattr(cls, name, _ResourceField(name, dim, used))
+    cls._resource_fields_installed = True
+
+
+class MachineView:
+    """
+    机器对象的数组视图混入类
+
+    未 attach 时行为与普通对象相同；attach 到 ClusterState 后，
+    对 _USED_FIELDS / _CAPACITY_FIELDS 中字段的赋值同时写入 state 的数组。
+    只有这些资源字段带写入钩子，其它字段（任务列表、堆等）的读写不受影响
+    """
+    _cluster_state = None
+    _cluster_row = -1
+
+
+class ClusterState:
+    """
+    集群资源数组 + 机器视图
+
+    capacity / used: shape (len(RESOURCE_DIMS), 机器数)，第 j 列对应 machines[j]
+    """
+
+    def __init__(self, machines: Iterable[MachineView] = ()):
+        self.machines: List[Any] = []
+        self._capacity = np.zeros((len(RESOURCE_DIMS), 0), dtype=np.float64)
+        self._used = np.zeros((len(RESOURCE_DIMS), 0), dtype=np.float64)
+        self.capacity = self._capacity
+        self.used = self._used
+        # 剩余 (cpu, mem) 的二维索引，第一次查询时建立，之后随赋值同步
+        self._index: Optional[CapacityIndex] = None
+        self._slack = 0.0
+        # cpu / mem 有变化、尚未写入索引的列（查询前统一同步，一次放置改两个字段只更新一次）
+        self._dirty: set = set()
+        for machine in machines:
+            self.attach(machine)
+
+    def __len__(self) -> int:
+        return len(self.machines)
+
+    def attach(self, machine: MachineView) -> int:
+        """把机器对象接入数组（当前字段值写入新列），返回列号"""
+        if machine._cluster_state is not None:
+            raise ValueError(f"机器 {getattr(machine, 'id', machine)} 已属于另一个 ClusterState")
+        row = len(self.machines)
+        if row == self._capacity.shape[1]:
+            # 按倍数扩容，动态加机器时摊销 O(1)
+            size = max(16, 2 * row)
+            capacity = np.zeros((len(RESOURCE_DIMS), size), dtype=np.float64)
+            used = np.zeros((len(RESOURCE_DIMS), size), dtype=np.float64)
+            capacity[:, :row] = self._capacity[:, :row]
+            used[:, :row] = self._used[:, :row]
+            self._capacity, self._used = capacity, used
+        self.machines.append(machine)
+        self.capacity = self._capacity[:, :row + 1]
+        self.used = self._used[:, :row + 1]
+        for name, dim in _CAPACITY_FIELDS.items():
+            self.capacity[dim, row] = getattr(machine, name, _DEFAULT_CAPACITY[dim])
+        for name, dim in _USED_FIELDS.items():
+            self.used[dim, row] = getattr(machine, name, 0.0)
+        _install_resource_fields(type(machine))
+        machine._cluster_state = self
+        machine._cluster_row = row
+        if self._index is not None:
+            self._index.add(*self._free_cpu_mem(row))
+            self._slack = max(self._slack, _FIT_SLACK * float(self.capacity[:2, row].max()))
+        return row
+
+    def _free_cpu_mem(self, row: int) -> Tuple[float, float]:
+        return (float(self.capacity[0, row] - self.used[0, row]),
+                float(self.capacity[1, row] - self.used[1, row]))
+
+    @property
+    def index(self) -> "CapacityIndex":
+        """剩余 (cpu, mem) 的 CapacityIndex（行号即列号，返回前同步所有变化过的列）"""
+        if self._dirty:
+            rows = list(self._dirty)
+            self._dirty.clear()
+            free = self.capacity[:2, rows] - self.used[:2, rows]
+            for row, cpu_free, mem_free in zip(rows, free[0].tolist(), free[1].tolist()):
+                self._index.update(row, cpu_free, mem_free)
+        elif self._index is None:
+            free = self.capacity[:2] - self.used[:2]
+            span = self.capacity[:2].max(axis=1).tolist() if self.machines else [None, None]
+            self._index = CapacityIndex(free[0].tolist(), free[1].tolist(), cpu_span=span[0], mem_span=span[1])
+            self._slack = _FIT_SLACK * max([1.0] + [v for v in span if v])
+        return self._index
+
+    def free(self) -> np.ndarray:
+        """剩余资源 (维度, 机器)"""
+        return self.capacity - self.used
+
+    def fits(self, cpu: float, mem: float, **extra: float) -> np.ndarray:
+        """
+        可行性掩码：used + 需求 <= capacity（与标量代码 m.cpu_used + cpu <= m.cpu 的浮点比较相同）
+
+        extra: 其它维度的需求，键为 RESOURCE_DIMS 中的名字，例如 fits(cpu, mem, net_bandwidth=5.0)
+        """
+        used, capacity = self.used, self.capacity
+        mask = (used[0] + cpu <= capacity[0]) & (used[1] + mem <= capacity[1])
+        for name, demand in extra.items():
+            if demand:
+                dim = RESOURCE_DIMS.index(name)
+                mask &= used[dim] + demand <= capacity[dim]
+        return mask
+
+    def fit_indices(self, cpu: float, mem: float, **extra: float) -> List[int]:
+        """可容纳该需求的机器列号（升序，即原先遍历机器列表的顺序）"""
+        return self._fit_cols(cpu, mem, **extra).tolist()
+
+    def _fit_cols(self, cpu: float, mem: float, **extra: float) -> np.ndarray:
+        """
+        fit_indices 的数组版本
+
+        先用 CapacityIndex 按剩余量取候选列（需求放宽 _slack，候选是可行列的超集，
+        剩余量 capacity - used 与 used + 需求 <= capacity 的舍入差异不会漏掉机器），
+        再只在候选列上做与 fits 相同的浮点比较
+        """
+        index = self.index
+        cpu_bound, mem_bound = cpu - self._slack, mem - self._slack
+        if index.candidates(cpu_bound, mem_bound) * _DENSE_FRACTION > len(self.machines):
+            # 大部分机器都可能可行：输出本身就是 O(M)，整列向量化比较比逐桶取行更快
+            return np.flatnonzero(self.fits(cpu, mem, **extra))
+        rows = index.fits(cpu_bound, mem_bound)
+        if not rows:
+            return np.zeros(0, dtype=np.int64)
+        cols = np.asarray(rows, dtype=np.int64)
+        used, capacity = self.used, self.capacity
+        mask = (used[0, cols] + cpu <= capacity[0, cols]) & (used[1, cols] + mem <= capacity[1, cols])
+        for name, demand in extra.items():
+            if demand:
+                dim = RESOURCE_DIMS.index(name)
+                mask &= used[dim, cols] + demand <= capacity[dim, cols]
+        return cols[mask]
+
+    def fitting(self, cpu: float, mem: float, **extra: float) -> List[Any]:
+        """可容纳该需求的机器对象（保持原列表顺序）"""
+        machines = self.machines
+        return [machines[i] for i in self.fit_indices(cpu, mem, **extra)]
+
+    def _dim_rows(self, dims: Sequence[str]):
+        """dims 对应的数组行：前缀 (cpu, mem, ...) 用切片（视图，不复制）"""
+        rows = [RESOURCE_DIMS.index(d) for d in dims]
+        if rows == list(range(len(rows))):
+            return slice(0, len(rows))
+        return rows
+
+    def alignment_scores(self, demand: Sequence[float], dims: Sequence[str] = ("cpu", "mem"),
+                         k: int = 2) -> np.ndarray:
+        """
+        Tetris 对齐分数（SIGCOMM'14 Eq.1）向量，不可行的机器为 -inf：
+            sum_d ((used_d + demand_d) / cap_d) ** k - sum_d (used_d / cap_d) ** k
+        逐元素的运算顺序与标量循环相同，分数逐位一致
+        """
+        rows = self._dim_rows(dims)
+        used = self.used[rows]
+        capacity = self.capacity[rows]
+        after = used + np.asarray(demand, dtype=np.float64)[:, None]
+        feasible = (after <= capacity).all(axis=0)
+        score = ((after / capacity) ** k).sum(axis=0) - ((used / capacity) ** k).sum(axis=0)
+        return np.where(feasible, score, -np.inf)
+
+    def best_alignment(self, demand: Sequence[float], dims: Sequence[str] = ("cpu", "mem"),
+                       k: int = 2) -> Optional[int]:
+        """对齐分数最高的可行机器列号（并列取列号最小，与标量循环的严格 > 相同）；没有可行机器返回 None"""
+        if not self.machines:
+            return None
+        cols = self._candidate_cols(np.asarray([demand], dtype=np.float64), dims)
+        if cols is None:
+            score = self.alignment_scores(demand, dims, k)
+            row = int(np.argmax(score))
+            return row if score[row] > -np.inf else None
+        if not cols.size:
+            return None
+        rows = self._dim_rows(dims)
+        # np.take 沿列取出的是 C 连续数组（used[:, cols] 会得到按列存放的数组，逐列求和慢很多）
+        used = np.take(self.used[rows], cols, axis=1)
+        capacity = np.take(self.capacity[rows], cols, axis=1)
+        after = used + np.asarray(demand, dtype=np.float64)[:, None]
+        score = np.where((after <= capacity).all(axis=0),
+                         ((after / capacity) ** k).sum(axis=0) - ((used / capacity) ** k).sum(axis=0),
+                         -np.inf)
+        j = int(np.argmax(score))
+        return int(cols[j]) if score[j] > -np.inf else None
+
+    def _candidate_cols(self, demand: np.ndarray, dims: Sequence[str]) -> Optional[np.ndarray]:
+        """
+        对齐打分的候选列：能容纳 cpu / mem 最小需求的机器（来自 CapacityIndex，升序）。
+        其余列对每个需求都不可行（分数 -inf），去掉后 argmax 及并列取列号最小的结果不变；
+        dims 不含 cpu 和 mem，或大部分机器都是候选（取列比直接整列打分更慢）时返回 None（不筛选）
+        """
+        dims = list(dims)
+        if "cpu" not in dims or "mem" not in dims:
+            return None
+        cpu = float(demand[:, dims.index("cpu")].min())
+        mem = float(demand[:, dims.index("mem")].min())
+        if self.index.candidates(cpu - self._slack, mem - self._slack) * _DENSE_FRACTION > len(self.machines):
+            return None
+        return self._fit_cols(cpu, mem)
+
+    def best_alignment_batch(self, demands: Sequence[Sequence[float]], dims: Sequence[str] = ("cpu", "mem"),
+                             k: int = 2, commit: bool = False) -> List[Optional[int]]:
+        """
+        一批任务依次做 best_alignment，返回每个任务选中的列号（None 表示无可行机器）
+
+        相同需求的任务（形状）只打分一次，一批的代价是 形状数 × 机器数 而不是 任务数 × 机器数：
+          commit=False: 全部任务按同一份用量快照打分（批内放置不改变用量，与逐个调用 best_alignment 相同）
+          commit=True:  批内每次放置都计入（局部副本，不写回机器）。保存 形状 × 机器 分数矩阵和每个形状的最优列，
+                        放置后只重算被放置机器那一列；某形状的最优列分数下降时才对该形状整行重新 argmax。
+                        结果与 "每个任务对当前用量做 best_alignment 再扣减" 的贪心逐位一致
+        """
+        n = len(demands)
+        if n == 0:
+            return []
+        if not self.machines:
+            return [None] * n
+        if n == 1:
+            return [self.best_alignment(demands[0], dims, k)]
+        rows = self._dim_rows(dims)
+        used = self.used[rows]
+        capacity = self.capacity[rows]
+        demand = np.asarray(demands, dtype=np.float64).reshape(n, len(dims))
+        # 只对候选列打分，结果的列号再映射回全体机器
+        cols = self._candidate_cols(demand, dims)
+        if cols is not None:
+            if not cols.size:
+                return [None] * n
+            used = np.take(used, cols, axis=1)
+            capacity = np.take(capacity, cols, axis=1)
+
+        def lift(picked: List[Optional[int]]) -> List[Optional[int]]:
+            if cols is None:
+                return picked
+            return [None if j is None else int(cols[j]) for j in picked]
+
+        shape_ids = {}
+        shape_of = [shape_ids.setdefault(tuple(d), len(shape_ids)) for d in demands]
+        shapes = np.asarray(list(shape_ids), dtype=np.float64).reshape(-1, len(dims))
+        num_shapes, num_machines = len(shapes), used.shape[1]
+        if commit and num_shapes * num_machines * len(dims) > ALIGNMENT_BLOCK_ELEMS * 4:
+            # 分数矩阵过大：退回逐任务打分（同样的贪心，仍是向量化的单任务打分）
+            return lift(self._alignment_greedy(demand, used.copy(), capacity, k))
+
+        score = np.empty((num_shapes, num_machines), dtype=np.float64)
+        base = ((used / capacity) ** k).sum(axis=0)
+        block = max(1, ALIGNMENT_BLOCK_ELEMS // (num_machines * len(dims)))
+        for lo in range(0, num_shapes, block):
+            after = used[None, :, :] + shapes[lo:lo + block, :, None]
+            feasible = (after <= capacity).all(axis=1)
+            score[lo:lo + block] = np.where(feasible, ((after / capacity) ** k).sum(axis=1) - base, -np.inf)
+        best_row = score.argmax(axis=1)
+        best_score = score[np.arange(num_shapes), best_row]
+
+        if not commit:
+            best = [row if value > -np.inf else None
+                    for row, value in zip(best_row.tolist(), best_score.tolist())]
+            return lift([best[s] for s in shape_of])
+
+        used = used.copy()
+        remaining = np.bincount(shape_of, minlength=num_shapes)
+        out: List[Optional[int]] = []
+        for i, s in enumerate(shape_of):
+            remaining[s] -= 1
+            if best_score[s] == -np.inf:
+                out.append(None)
+                continue
+            j = int(best_row[s])
+            out.append(j)
+            used[:, j] += demand[i]
+            # 只有列 j 的分数变化
+            after = used[:, j] + shapes
+            column = np.where((after <= capacity[:, j]).all(axis=1),
+                              ((after / capacity[:, j]) ** k).sum(axis=1) - ((used[:, j] / capacity[:, j]) ** k).sum(),
+                              -np.inf)
+            score[:, j] = column
+            was_best = best_row == j
+            # 后面没有任务的形状不再维护最优列
+            dropped = was_best & (column < best_score) & (remaining > 0)
+            raised = ~was_best & ((column > best_score) | ((column == best_score) & (j < best_row)))
+            keep = was_best & ~dropped
+            best_score[keep] = column[keep]
+            best_row[raised] = j
+            best_score[raised] = column[raised]
+            if dropped.any():
+                redo = np.flatnonzero(dropped)
+                r = score[redo].argmax(axis=1)
+                best_row[redo] = r
+                best_score[redo] = score[redo, r]
+        return lift(out)
+
+    @staticmethod
+    def _alignment_greedy(demand: np.ndarray, used: np.ndarray, capacity: np.ndarray, k: int) -> List[Optional[int]]:
+        out: List[Optional[int]] = []
+        for d in demand:
+            after = used + d[:, None]
+            score = np.where((after <= capacity).all(axis=0),
+                             ((after / capacity) ** k).sum(axis=0) - ((used / capacity) ** k).sum(axis=0),
+                             -np.inf)
+            row = int(np.argmax(score))
+            if score[row] == -np.inf:
+                out.append(None)
+                continue
+            out.append(row)
+            used[:, row] += d
+        return out
+
+    def utilization(self) -> np.ndarray:
+        """各机器利用率 max(cpu_used / cpu, mem_used / mem)（Machine.utilization 的向量版）"""
+        return np.maximum(self.used[0] / self.capacity[0], self.used[1] / self.capacity[1])
+
+
+def _remove_sorted(items: list, key: tuple):
+    j = bisect_left(items, key)
+    assert items[j] == key, (items[j], key)
+    del items[j]
+
+
+class CapacityIndex:
+    """
+    按剩余 (cpu, mem) 分桶的二维机器索引
+
+    cpu_free / mem_free 保存调用方给出的剩余量原值（不做减法换算，比较结果与调用方的标量代码一致）。
+    两个维度各切成 grid 段（段宽 = span / grid，超出 span 的落在最后一段，负数落在第一段），
+    每台机器落在一个 (cpu 段, mem 段) 桶里；桶内按 (-(cpu_free + mem_free), row) 有序。
+    查询时按桶的上下界分三类:
+      整桶不可行  上界 < 需求 → 跳过，不看桶内机器
+      整桶可行    下界 >= 需求 → fits 整桶收下；most_free / tightest_fit 直接取桶内表头 / 表尾
+      边界桶      需求落在桶的区间内 → 逐台检查（只有需求所在的那一行 / 一列桶，最多 2·grid - 1 个）
+    一次查询的工作量为 O(grid² + 边界桶内机器数 + 输出)，与整桶可行 / 不可行桶里的机器数无关；
+    worst-fit / best-fit 还按桶的总剩余量上 / 下界剪枝。
+    另外 _by_cpu / _by_mem 两个有序表给出各维最大剩余量（largest，O(1) 快速拒绝）。
+    更新为 O(log M) 查找 + 列表内存移动（C 层 memmove，万台机器量级可忽略）。
+    """
+
+    def __init__(self, cpu_free: Sequence[float] = (), mem_free: Sequence[float] = (),
+                 cpu_span: Optional[float] = None, mem_span: Optional[float] = None, grid: int = 16):
+        self.cpu_free: List[float] = list(cpu_free)
+        self.mem_free: List[float] = list(mem_free)
+        self.grid = grid
+        self._cpu_width = (cpu_span or max(self.cpu_free, default=0.0) or 1.0) / grid
+        self._mem_width = (mem_span or max(self.mem_free, default=0.0) or 1.0) / grid
+        self._cpu_lo, self._cpu_hi = self._bounds(self._cpu_width, grid)
+        self._mem_lo, self._mem_hi = self._bounds(self._mem_width, grid)
+        # (cpu 段, mem 段) → [(-(cpu_free + mem_free), row)]，只保存非空桶；_counts 为各桶机器数
+        self._buckets: Dict[Tuple[int, int], list] = {}
+        self._counts = np.zeros((grid, grid), dtype=np.int64)
+        self._bucket_of: List[Tuple[int, int]] = []
+        for row in range(len(self.cpu_free)):
+            self._bucket_of.append(self._insert(row))
+        rows = range(len(self.cpu_free))
+        self._by_cpu = sorted((self.cpu_free[i], i) for i in rows)
+        self._by_mem = sorted((self.mem_free[i], i) for i in rows)
+
+    @staticmethod
+    def _bounds(width: float, grid: int) -> Tuple[List[float], List[float]]:
+        # 桶 b 内的值满足 b <= v / width < b + 1；上下界各放宽一点，抵消除法的舍入
+        margin = width * 1e-9
+        inf = float("inf")
+        lo = [-inf] + [b * width - margin for b in range(1, grid)]
+        hi = [(b + 1) * width + margin for b in range(grid - 1)] + [inf]
+        return lo, hi
+
+    def _key(self, cpu_free: float, mem_free: float) -> Tuple[int, int]:
+        last = self.grid - 1
+        bc = min(int(cpu_free / self._cpu_width), last) if cpu_free > 0 else 0
+        bm = min(int(mem_free / self._mem_width), last) if mem_free > 0 else 0
+        return bc, bm
+
+    def _insert(self, row: int) -> Tuple[int, int]:
+        cpu_free, mem_free = self.cpu_free[row], self.mem_free[row]
+        key = self._key(cpu_free, mem_free)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._buckets[key] = [(-(cpu_free + mem_free), row)]
+        else:
+            insort(bucket, (-(cpu_free + mem_free), row))
+        self._counts[key] += 1
+        return key
+
+    def __len__(self) -> int:
+        return len(self.cpu_free)
+
+    def add(self, cpu_free: float, mem_free: float) -> int:
+        """新增一台机器，返回行号"""
+        row = len(self.cpu_free)
+        self.cpu_free.append(cpu_free)
+        self.mem_free.append(mem_free)
+        self._bucket_of.append(self._insert(row))
+        insort(self._by_cpu, (cpu_free, row))
+        insort(self._by_mem, (mem_free, row))
+        return row
+
+    def update(self, row: int, cpu_free: float, mem_free: float):
+        """机器 row 的剩余量变化（放置 / 释放后调用）"""
+        old_cpu, old_mem = self.cpu_free[row], self.mem_free[row]
+        if old_cpu == cpu_free and old_mem == mem_free:
+            return
+        key = self._bucket_of[row]
+        bucket = self._buckets[key]
+        _remove_sorted(bucket, (-(old_cpu + old_mem), row))
+        self._counts[key] -= 1
+        if not bucket:
+            del self._buckets[key]
+        self.cpu_free[row] = cpu_free
+        self.mem_free[row] = mem_free
+        self._bucket_of[row] = self._insert(row)
+        if old_cpu != cpu_free:
+            _remove_sorted(self._by_cpu, (old_cpu, row))
+            insort(self._by_cpu, (cpu_free, row))
+        if old_mem != mem_free:
+            _remove_sorted(self._by_mem, (old_mem, row))
+            insort(self._by_mem, (mem_free, row))
+
+    def largest(self) -> Tuple[float, float]:
+        """(最大剩余 cpu, 最大剩余 mem)，可能来自不同机器；任一维超过即无机器可行"""
+        if not self.cpu_free:
+            return 0.0, 0.0
+        return self._by_cpu[-1][0], self._by_mem[-1][0]
+
+    def _rejects(self, cpu: float, mem: float) -> bool:
+        max_cpu, max_mem = self.largest()
+        return not self.cpu_free or cpu > max_cpu or mem > max_mem
+
+    def _corner(self, cpu: float, mem: float) -> Tuple[int, int]:
+        """上界 >= 需求的第一个 cpu 段 / mem 段：此前的桶整桶不可行"""
+        return bisect_left(self._cpu_hi, cpu), bisect_left(self._mem_hi, mem)
+
+    def _candidate_buckets(self, cpu: float, mem: float):
+        """(桶, 是否整桶可行, 桶内总剩余量下界, 上界)，只取右上角区域内的非空桶"""
+        cpu_lo, cpu_hi, mem_lo, mem_hi = self._cpu_lo, self._cpu_hi, self._mem_lo, self._mem_hi
+        bc0, bm0 = self._corner(cpu, mem)
+        for i, j in np.argwhere(self._counts[bc0:, bm0:]).tolist():
+            bc, bm = bc0 + i, bm0 + j
+            yield (self._buckets[bc, bm], cpu_lo[bc] >= cpu and mem_lo[bm] >= mem,
+                   cpu_lo[bc] + mem_lo[bm], cpu_hi[bc] + mem_hi[bm])
+
+    def candidates(self, cpu: float, mem: float) -> int:
+        """可行机器数的上界（不是整桶不可行的桶里的机器数），O(grid²) 的数组求和"""
+        if self._rejects(cpu, mem):
+            return 0
+        bc0, bm0 = self._corner(cpu, mem)
+        return int(self._counts[bc0:, bm0:].sum())
+
+    def fits(self, cpu: float, mem: float) -> List[int]:
+        """cpu_free >= cpu 且 mem_free >= mem 的机器行号（升序）"""
+        if self._rejects(cpu, mem):
+            return []
+        cpu_free, mem_free = self.cpu_free, self.mem_free
+        rows: List[int] = []
+        for bucket, whole, _, _ in self._candidate_buckets(cpu, mem):
+            if whole:
+                rows.extend(map(itemgetter(1), bucket))
+            else:
+                rows.extend(row for _, row in bucket if cpu_free[row] >= cpu and mem_free[row] >= mem)
+        rows.sort()
+        return rows
+
+    def most_free(self, cpu: float, mem: float) -> Optional[int]:
+        """可行机器中 cpu_free + mem_free 最大的（worst-fit），并列取行号最小；没有可行机器返回 None"""
+        if self._rejects(cpu, mem):
+            return None
+        cpu_free, mem_free = self.cpu_free, self.mem_free
+        best = None  # (-(cpu_free + mem_free), row)，越小越好
+        for bucket, whole, _, upper in self._candidate_buckets(cpu, mem):
+            if best is not None and -upper > best[0]:
+                continue
+            if whole:
+                found = bucket[0]
+            else:
+                found = None
+                for entry in bucket:
+                    if best is not None and entry[0] > best[0]:
+                        break
+                    row = entry[1]
+                    if cpu_free[row] >= cpu and mem_free[row] >= mem:
+                        found = entry
+                        break
+                if found is None:
+                    continue
+            if best is None or found < best:
+                best = found
+        return None if best is None else best[1]
+
+    def tightest_fit(self, cpu: float, mem: float) -> Optional[int]:
+        """可行机器中 cpu_free + mem_free 最小的（best-fit），并列取行号最小；没有可行机器返回 None"""
+        if self._rejects(cpu, mem):
+            return None
+        cpu_free, mem_free = self.cpu_free, self.mem_free
+        best = None  # (cpu_free + mem_free, row)，越小越好
+        for bucket, whole, lower, _ in self._candidate_buckets(cpu, mem):
+            if best is not None and lower > best[0]:
+                continue
+            # 桶内从总剩余量最小的一端（表尾）往前扫；同一总量内行号是倒序的，扫完这一总量再定
+            found = None
+            for neg_total, row in reversed(bucket):
+                total = -neg_total
+                if found is not None and total != found[0]:
+                    break
+                if best is not None and total > best[0]:
+                    break
+                if whole or (cpu_free[row] >= cpu and mem_free[row] >= mem):
+                    found = (total, row)
+            if found is not None and (best is None or found < best):
+                best = found
+        return None if best is None else best[1]
@@ -12,9 +12,13 @@ Firmament Flow Scheduler 完整实现
 
 from typing import List, Tuple, Dict
 from dataclasses import dataclass
+
+import numpy as np
+
 from .flow_graph import FlowGraph, FlowGraphNode, NodeType, FlowGraphArc
 from .octopus_cost_model import OctopusCostModel
 from .min_cost_flow_solver import MinCostFlowSolver
+from .cluster_state import CapacityIndex
 
 @dataclass
 class Task:
@@ -51,10 +55,19 @@ class FirmamentScheduler:
         self.cost_model = OctopusCostModel()
         self.graph = FlowGraph()
         self.task_nodes: Dict[int, FlowGraphNode] = {}
+        self.unscheduled_nodes: Dict[int, FlowGraphNode] = {}  # task_id → 该任务的 UNSCHEDULED_AGG
         self.resource_nodes: Dict[int, FlowGraphNode] = {}
         self.pu_nodes: Dict[Tuple[int, int], FlowGraphNode] = {}  # (machine_id, pu_id) → node
+        self.pu_index: Dict[int, Tuple[int, int]] = {}  # PU 节点 id → (machine_id, pu_id)
+        self.task_ec_arcs: Dict[int, FlowGraphArc] = {}  # task_id → Task → Cluster AGG 的边
+        # 资源拓扑的边（常驻图中，运行任务数变化时原地改成本 / 容量）
+        self.machine_arcs: Dict[int, FlowGraphArc] = {}  # machine_id → Cluster AGG → Machine
+        self.pu_arcs: Dict[Tuple[int, int], Tuple[FlowGraphArc, FlowGraphArc]] = {}  # → (Machine → PU, PU → Sink)
+        self.running: Dict[int, Tuple[int, int]] = {}  # task_id → (machine_id, pu_id)
         
         self._build_resource_topology()
+        # 所有 Machine → PU 边的 id，按 (machine, pu) 顺序（拓扑边常驻，id 不变）
+        self.pu_arc_ids = np.array([self.pu_arcs[key][0].id for key in self.pu_nodes], dtype=np.int64)
     
     def _build_resource_topology(self):
         """
@@ -91,13 +104,14 @@ class FirmamentScheduler:
                 machine.id,
                 machine_node.num_running_tasks
             )
-            self.graph.add_arc(self.cluster_agg, machine_node, cost, cap_lower, machine.num_pus)
+            self.machine_arcs[machine.id] = self.graph.add_arc(self.cluster_agg, machine_node, cost, cap_lower, machine.num_pus)
             
             # 为每个 PU 创建节点
             for pu_id in range(machine.num_pus):
                 pu_node = self.graph.add_node(NodeType.RESOURCE_PU)
                 pu_node.resource_id = pu_id
                 self.pu_nodes[(machine.id, pu_id)] = pu_node
+                self.pu_index[pu_node.id] = (machine.id, pu_id)
                 
                 # Machine → PU 的边（octopus_cost_model.cc L64-80）
                 pu_cost, pu_cap_lower, pu_cap_upper = self.cost_model.resource_node_to_resource_node(
@@ -105,11 +119,12 @@ class FirmamentScheduler:
                     pu_node.num_running_tasks,
                     pu_id  # core_id
                 )
-                self.graph.add_arc(machine_node, pu_node, pu_cost, pu_cap_lower, 1)
+                pu_arc = self.graph.add_arc(machine_node, pu_node, pu_cost, pu_cap_lower, 1)
                 
                 # PU → Sink 的边（octopus_cost_model.cc L82-85）
                 sink_cost, sink_cap_lower, sink_cap_upper = self.cost_model.leaf_resource_to_sink(pu_id)
-                self.graph.add_arc(pu_node, self.sink, sink_cost, sink_cap_lower, 1)
+                sink_arc = self.graph.add_arc(pu_node, self.sink, sink_cost, sink_cap_lower, 1)
+                self.pu_arcs[(machine.id, pu_id)] = (pu_arc, sink_arc)
     
     def add_task(self, task: Task) -> FlowGraphNode:
         """
@@ -123,6 +138,7 @@ class FirmamentScheduler:
         
         # Task → Unscheduled Agg 的边
         unscheduled_node = self.graph.add_node(NodeType.UNSCHEDULED_AGG)
+        self.unscheduled_nodes[task.id] = unscheduled_node
         cost, cap_lower, cap_upper = self.cost_model.task_to_unscheduled_agg(task.id)
         self.graph.add_arc(task_node, unscheduled_node, cost, cap_lower, cap_upper)
         
@@ -130,20 +146,73 @@ class FirmamentScheduler:
         self.graph.add_arc(unscheduled_node, self.sink, 0, 0, 1)
         
         # Task → Cluster Agg (EC) (单位容量)
-        self.graph.add_arc(task_node, self.cluster_agg, 0, 0, 1)
+        self.task_ec_arcs[task.id] = self.graph.add_arc(task_node, self.cluster_agg, 0, 0, 1)
         
         return task_node
     
+    def remove_task(self, task_id: int):
+        """
+        从图中物理删除任务节点及其 UNSCHEDULED_AGG（连同所有边）
+        源码: flow_graph_manager.cc:RemoveTaskNode()
+        """
+        task_node = self.task_nodes.pop(task_id, None)
+        if task_node is not None:
+            self.graph.delete_node(task_node)
+            self.graph.delete_node(self.unscheduled_nodes.pop(task_id))
+            del self.task_ec_arcs[task_id]
+    
+    def _update_resource_arcs(self, machine_id: int, pu_id: int):
+        """
+        运行任务数变化后原地更新 Cluster AGG → Machine / Machine → PU 的成本和 PU → Sink 的剩余容量
+        源码: flow_graph_manager.cc:UpdateResourceTopology()（只改受影响的边，不重建）
+        """
+        machine_node = self.resource_nodes[machine_id]
+        pu_node = self.pu_nodes[(machine_id, pu_id)]
+        machine_arc = self.machine_arcs[machine_id]
+        cost, _, _ = self.cost_model.equiv_class_to_resource(
+            self.cluster_agg.equiv_class, machine_id, machine_node.num_running_tasks)
+        self.graph.change_arc(machine_arc, machine_arc.cap_lower, machine_arc.cap_upper, cost)
+        
+        pu_arc, sink_arc = self.pu_arcs[(machine_id, pu_id)]
+        pu_cost, _, _ = self.cost_model.resource_node_to_resource_node(
+            machine_node.num_running_tasks, pu_node.num_running_tasks, pu_id)
+        self.graph.change_arc(pu_arc, pu_arc.cap_lower, pu_arc.cap_upper, pu_cost)
+        
+        # 每个 PU 同时只运行 1 个任务：已占用的 PU 不再接受流量
+        _, sink_cap_lower, sink_cap_upper = self.cost_model.leaf_resource_to_sink(pu_id)
+        self.graph.change_arc(sink_arc, sink_cap_lower,
+                              max(0, sink_cap_upper - pu_node.num_running_tasks), sink_arc.cost)
+    
+    def _bind(self, task_id: int, machine_id: int, pu_id: int):
+        """任务开始运行：计入机器 / PU 的运行任务数（源码: TaskScheduled → UpdateRunningTaskNode）"""
+        self.running[task_id] = (machine_id, pu_id)
+        self.resource_nodes[machine_id].num_running_tasks += 1
+        self.pu_nodes[(machine_id, pu_id)].num_running_tasks += 1
+        self._update_resource_arcs(machine_id, pu_id)
+    
+    def _unbind(self, task_id: int):
+        binding = self.running.pop(task_id, None)
+        if binding is None:
+            return
+        machine_id, pu_id = binding
+        self.resource_nodes[machine_id].num_running_tasks -= 1
+        self.pu_nodes[(machine_id, pu_id)].num_running_tasks -= 1
+        self._update_resource_arcs(machine_id, pu_id)
+    
     def schedule(self, tasks: List[Task]) -> List[Tuple[int, int]]:
         """
         运行完整调度流程
         源码: flow_scheduler.cc:RunSchedulingIteration() L471-530
         
+        图是持久的：资源拓扑只建一次，运行中的任务体现在资源边的成本 / 容量上，
+        每轮只加入本轮待调度任务，求解后全部删除（放置成功的转为 running，其余由事件引擎记为失败），
+        因此每轮的图规模只与待调度任务数和集群规模有关。
+        
         返回: [(task_id, machine_id), ...]
         """
         print(f"  构建 Flow Graph ({len(tasks)} 任务, {len(self.machines)} 机器)...")
         
-        # 1. 添加所有 Task 节点
+        # 1. 添加本轮 Task 节点
         for task in tasks:
             self.add_task(task)
         
@@ -152,34 +221,52 @@ class FirmamentScheduler:
         # 2. 调用 Min-Cost Max-Flow Solver
         print(f"  求解 Min-Cost Max-Flow...")
         solver = MinCostFlowSolver()
-        flow_result = solver.solve(self.graph)
+        flows = solver.solve(self.graph)
         
-        # 3. 提取调度决策
-        # 查找 Task → Resource 路径上有流的边
-        placements = []
+        # 3. 提取调度决策：直接读流量数组
+        # Task → Cluster AGG 有流的任务被调度；Cluster AGG 由所有任务共享，流量只说明调度了哪些任务、
+        # 用了哪些 Machine → PU 槽位（按 machine、pu 顺序），不说明谁配谁。
+        # 确定性配对：任务按 cpu + mem 从大到小，每个任务放到仍有槽位、放得下的机器中剩余 cpu + mem 最大的一台
+        # （CapacityIndex.most_free，并列取槽位顺序靠前的机器），用该机器下一个有流的 PU；
+        # 没有机器放得下的任务才丢弃。剩余量按返回顺序累加，与事件引擎放置时的二次确认一致
+        ec_arc_ids = np.fromiter((self.task_ec_arcs[task.id].id for task in tasks), dtype=np.int64, count=len(tasks))
+        scheduled = np.flatnonzero(flows[ec_arc_ids] > 0).tolist()
+        slot_arcs = self.pu_arc_ids[flows[self.pu_arc_ids] > 0]
         
-        for arc, flow_val in flow_result.items():
-            if flow_val == 0:
+        slots: Dict[int, List[Tuple[int, int]]] = {}  # machine_id → 有流的 (machine_id, pu_id)
+        for pu_node_id in self.graph.arc_dst[slot_arcs].tolist():
+            pu_key = self.pu_index[pu_node_id]
+            slots.setdefault(pu_key[0], []).append(pu_key)
+        slot_machines = [self.machines[machine_id] for machine_id in slots]
+        index = CapacityIndex([m.cpu - m.cpu_used for m in slot_machines],
+                              [m.mem - m.mem_used for m in slot_machines])
+        used = [(m.cpu_used, m.mem_used) for m in slot_machines]
+        
+        placements = []
+        bindings = []
+        scheduled.sort(key=lambda i: (-(tasks[i].cpu + tasks[i].mem), i))
+        for i in scheduled:
+            task = tasks[i]
+            row = index.most_free(task.cpu, task.mem)
+            if row is None:
                 continue
-            
-            # 如果是 Task → ... → PU 的路径，提取 task 和 machine
-            if arc.src.type == NodeType.TASK:
-                # 回溯找到最终的 PU/Machine
-                current = arc.dst
-                while current.type != NodeType.SINK:
-                    # 找 outgoing arc 有流的
-                    next_arc = next((a for a in current.outgoing_arcs if a in flow_result and flow_result[a] > 0), None)
-                    if not next_arc:
-                        break
-                    current = next_arc.dst
-                    
-                    if current.type == NodeType.RESOURCE_PU:
-                        # 找到 PU → 反推 machine
-                        for (machine_id, pu_id), pu_node in self.pu_nodes.items():
-                            if pu_node == current:
-                                placements.append((arc.src.task_id, machine_id))
-                                break
-                        break
+            machine = slot_machines[row]
+            cpu_used, mem_used = used[row][0] + task.cpu, used[row][1] + task.mem
+            used[row] = (cpu_used, mem_used)
+            machine_slots = slots[machine.id]
+            pu_key = machine_slots.pop(0)
+            if machine_slots:
+                index.update(row, machine.cpu - cpu_used, machine.mem - mem_used)
+            else:
+                index.update(row, -np.inf, -np.inf)  # 槽位用完
+            placements.append((task.id, machine.id))
+            bindings.append((task.id,) + pu_key)
+        
+        # 4. 本轮任务节点全部删除，放置成功的转为运行中（更新资源边）
+        for task in tasks:
+            self.remove_task(task.id)
+        for task_id, machine_id, pu_id in bindings:
+            self._bind(task_id, machine_id, pu_id)
         
         return placements
     
@@ -197,10 +284,11 @@ class FirmamentScheduler:
             uint64_t task_node_id = flow_graph_manager_->TaskCompleted(td_ptr->uid());
             RemoveTaskNode(task_node_id);
         """
-        # 从 task_nodes 字典中移除
-        if task_id in self.task_nodes:
-            task_node = self.task_nodes.pop(task_id)
-            # 注意：在真实 Firmament 中，这会从 flow graph 中物理删除节点
-            # 但由于我们每次调度都重建 graph，这里只需要清理引用即可
-            # 下次 schedule() 调用时会重建新的 graph
-
+        # 运行中的任务已不在图中，只需释放其 PU 并原地更新资源边的成本 / 容量
+        self.remove_task(task_id)
+        self._unbind(task_id)
+    
+    def tasks_completed(self, task_ids: List[int], machine_ids: List[int]):
+        """批量 TaskCompleted（事件引擎一轮内完成的全部任务），与逐个调用 task_completed 相同"""
+        for task_id in task_ids:
+            self.task_completed(task_id)
@@ -5,12 +5,19 @@ Firmament Flow Graph 完整实现
 
 Flow Graph 结构:
   Task Node → Equiv Class → Resource Node → PU Node → Sink
+
+边的 (src, dst, capacity, cost) 与节点类型同时保存在 NumPy 数组中（按 id 索引），
+求解器与放置提取直接批量读取；节点 / 边对象只作为调度器修改成本 / 删除时的句柄。
+节点 / 边 id 删除后回收（最小 id 优先，对应 flow_graph.cc 的 unused_ids_），数组保持紧凑。
 """
 
+import heapq
 from dataclasses import dataclass, field
 from typing import Dict, List, Set, Optional
 from enum import Enum
 
+import numpy as np
+
 class NodeType(Enum):
     """节点类型（flow_graph_node.h）"""
     TASK = 0
@@ -31,27 +38,26 @@ class FlowGraphNode:
     task_id: Optional[int] = None
     resource_id: Optional[int] = None
     equiv_class: Optional[int] = None
-    outgoing_arcs: List['FlowGraphArc'] = field(default_factory=list)
-    incoming_arcs: List['FlowGraphArc'] = field(default_factory=list)
+    outgoing_arcs: Dict[int, 'FlowGraphArc'] = field(default_factory=dict)  # arc id → arc
+    incoming_arcs: Dict[int, 'FlowGraphArc'] = field(default_factory=dict)
     # 资源节点特有
     num_running_tasks: int = 0
     num_slots: int = 0
 
-@dataclass(eq=True, frozen=False)
+@dataclass(eq=False)
 class FlowGraphArc:
     """
     Flow Graph 边
     源码: baselines/firmament/src/scheduling/flow/flow_graph_arc.{h,cc}
+    
+    按对象身份比较 / 哈希（成本和容量会被 change_arc 原地修改）
     """
     src: FlowGraphNode
     dst: FlowGraphNode
     cost: int  # 成本
     cap_lower: int  # 容量下界
     cap_upper: int  # 容量上界
-    flow: int = 0  # 当前流量
-    
-    def __hash__(self):
-        return hash((id(self.src), id(self.dst), self.cost))
+    id: int = -1
 
 class FlowGraph:
     """
@@ -61,16 +67,42 @@ class FlowGraph:
     
     def __init__(self):
         self.nodes: Dict[int, FlowGraphNode] = {}
-        self.arcs: List[FlowGraphArc] = []  # 改用 List 而非 Set
-        self.current_id = 0
+        self.arcs: Dict[int, FlowGraphArc] = {}  # arc id → arc
+        self.current_id = 0      # 节点 id 高水位（数组有效长度）
+        self.current_arc_id = 0  # 边 id 高水位
+        self.unused_ids: List[int] = []      # 已删除、可回收的节点 id（小根堆）
+        self.unused_arc_ids: List[int] = []  # 已删除、可回收的边 id（小根堆）
         self.sink_node: Optional[FlowGraphNode] = None
+        
+        # 数组存储（按倍数扩容；已删除的 id 对应 node_live / arc_live 为 False）
+        self.node_type = np.zeros(0, dtype=np.int8)
+        self.node_live = np.zeros(0, dtype=bool)
+        self.arc_src = np.zeros(0, dtype=np.int32)
+        self.arc_dst = np.zeros(0, dtype=np.int32)
+        self.arc_capacity = np.zeros(0, dtype=np.int64)
+        self.arc_cost = np.zeros(0, dtype=np.int64)
+        self.arc_live = np.zeros(0, dtype=bool)
+    
+    @staticmethod
+    def _grown(array: np.ndarray, size: int) -> np.ndarray:
+        out = np.zeros(max(64, 2 * size), dtype=array.dtype)
+        out[:len(array)] = array
+        return out
     
     def add_node(self, node_type: NodeType) -> FlowGraphNode:
         """
-        AddNode() - flow_graph.cc
+        AddNode() - flow_graph.cc（优先复用最小的已删除 id）
         """
-        node_id = self.current_id
-        self.current_id += 1
+        if self.unused_ids:
+            node_id = heapq.heappop(self.unused_ids)
+        else:
+            node_id = self.current_id
+            self.current_id += 1
+            if node_id == len(self.node_type):
+                self.node_type = self._grown(self.node_type, node_id)
+                self.node_live = self._grown(self.node_live, node_id)
+        self.node_type[node_id] = node_type.value
+        self.node_live[node_id] = True
         
         node = FlowGraphNode(id=node_id, type=node_type)
         self.nodes[node_id] = node
@@ -85,19 +117,73 @@ class FlowGraph:
         """
         AddArc() - flow_graph.cc L39-57
         """
+        if self.unused_arc_ids:
+            arc_id = heapq.heappop(self.unused_arc_ids)
+        else:
+            arc_id = self.current_arc_id
+            self.current_arc_id += 1
+            if arc_id == len(self.arc_src):
+                self.arc_src = self._grown(self.arc_src, arc_id)
+                self.arc_dst = self._grown(self.arc_dst, arc_id)
+                self.arc_capacity = self._grown(self.arc_capacity, arc_id)
+                self.arc_cost = self._grown(self.arc_cost, arc_id)
+                self.arc_live = self._grown(self.arc_live, arc_id)
+        self.arc_src[arc_id] = src.id
+        self.arc_dst[arc_id] = dst.id
+        self.arc_capacity[arc_id] = cap_upper
+        self.arc_cost[arc_id] = cost
+        self.arc_live[arc_id] = True
+        
         arc = FlowGraphArc(
             src=src, dst=dst,
             cost=cost,
             cap_lower=cap_lower,
-            cap_upper=cap_upper
+            cap_upper=cap_upper,
+            id=arc_id
         )
         
-        src.outgoing_arcs.append(arc)
-        dst.incoming_arcs.append(arc)
-        self.arcs.append(arc)
+        src.outgoing_arcs[arc.id] = arc
+        dst.incoming_arcs[arc.id] = arc
+        self.arcs[arc.id] = arc
         
         return arc
     
+    def change_arc(self, arc: FlowGraphArc, cap_lower: int, cap_upper: int, cost: int):
+        """
+        ChangeArc() - flow_graph.cc：原地修改容量与成本（不重建边）
+        """
+        arc.cap_lower = cap_lower
+        arc.cap_upper = cap_upper
+        arc.cost = cost
+        self.arc_capacity[arc.id] = cap_upper
+        self.arc_cost[arc.id] = cost
+    
+    def delete_arc(self, arc: FlowGraphArc):
+        """
+        DeleteArc() - flow_graph.cc
+        """
+        del self.arcs[arc.id]
+        del arc.src.outgoing_arcs[arc.id]
+        del arc.dst.incoming_arcs[arc.id]
+        self.arc_live[arc.id] = False
+        heapq.heappush(self.unused_arc_ids, arc.id)
+    
+    def delete_node(self, node: FlowGraphNode):
+        """
+        DeleteNode() - flow_graph.cc：连同所有入边 / 出边一起删除
+        """
+        for arc in list(node.outgoing_arcs.values()) + list(node.incoming_arcs.values()):
+            self.delete_arc(arc)
+        del self.nodes[node.id]
+        self.node_live[node.id] = False
+        heapq.heappush(self.unused_ids, node.id)
+        if node is self.sink_node:
+            self.sink_node = None
+    
+    def live_arc_ids(self) -> np.ndarray:
+        """当前所有边的 id（升序）"""
+        return np.flatnonzero(self.arc_live[:self.current_arc_id])
+    
     def num_nodes(self) -> int:
         return len(self.nodes)
     
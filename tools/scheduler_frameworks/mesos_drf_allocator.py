@@ -8,10 +8,14 @@ Apache Mesos DRF Allocator 完整实现
 2. HierarchicalAllocatorProcess: 主分配逻辑
 """
 
+import time
 from typing import Dict, List, Tuple
-from collections import defaultdict
+from collections import defaultdict, deque
+from bisect import bisect_left, insort
 from dataclasses import dataclass
 
+from .cluster_state import CapacityIndex
+
 def predict_violation_risk(util_after: float) -> float:
     """
     预测违约风险（尾延迟与利用率的非线性关系）
@@ -64,6 +68,11 @@ class DRFSorter:
     """
     DRF Sorter 完整实现
     源码: baselines/mesos/src/master/allocator/mesos/sorter/drf/sorter.cpp
+
+    排序结果增量维护：有序表 _order 存 (share, 注册序号, client_id)，
+    allocated / unallocated / set_weight 只重算一个客户端的 share，O(log F) 定位后插入；
+    只有总资源变化（add_slave）或批量改权重时才整体重排。
+    顺序与 "按 share 稳定排序（并列按注册顺序）" 完全相同。
     """
     
     def __init__(self):
@@ -72,13 +81,17 @@ class DRFSorter:
         self.total_mem = 0.0
         self.dirty = True
         self.sorted_clients: List[str] = []
+        self._seq: Dict[str, int] = {}  # client_id → 注册序号（并列时的次序）
+        self._keys: Dict[str, Tuple[float, int]] = {}  # client_id → (share, 注册序号)
+        self._order: List[Tuple[float, int, str]] = []
     
     def add_client(self, client_id: str, weight: float = 1.0):
         """
         add() - sorter.cpp L73-170
         """
         self.clients[client_id] = Client(id=client_id, weight=weight)
-        self.dirty = True
+        self._seq.setdefault(client_id, len(self._seq))
+        self._rekey(client_id)
     
     def add_slave(self, slave_id: int, cpu: float, mem: float):
         """
@@ -86,7 +99,7 @@ class DRFSorter:
         """
         self.total_cpu += cpu
         self.total_mem += mem
-        self.dirty = True
+        self._rebuild()
     
     def allocated(self, client_id: str, cpu: float, mem: float):
         """
@@ -96,7 +109,7 @@ class DRFSorter:
         if client_id in self.clients:
             self.clients[client_id].cpu_allocated += cpu
             self.clients[client_id].mem_allocated += mem
-            self.dirty = True
+            self._rekey(client_id)
     
     def unallocated(self, client_id: str, cpu: float, mem: float):
         """
@@ -111,7 +124,38 @@ class DRFSorter:
             # 确保不为负数
             self.clients[client_id].cpu_allocated = max(0, self.clients[client_id].cpu_allocated)
             self.clients[client_id].mem_allocated = max(0, self.clients[client_id].mem_allocated)
-            self.dirty = True
+            self._rekey(client_id)
+    
+    def unallocated_batch(self, client_ids: List[str], cpus: List[float], mems: List[float]):
+        """批量 unallocated()：按顺序逐个扣减（结果与逐个调用相同），每个涉及的客户端只重排一次"""
+        clients = self.clients
+        touched = set()
+        for client_id, cpu, mem in zip(client_ids, cpus, mems):
+            client = clients.get(client_id)
+            if client is not None:
+                client.cpu_allocated = max(0, client.cpu_allocated - cpu)
+                client.mem_allocated = max(0, client.mem_allocated - mem)
+                touched.add(client_id)
+        for client_id in touched:
+            self._rekey(client_id)
+    
+    def set_weight(self, client_id: str, weight: float):
+        """修改一个客户端的权重（updateWeight）"""
+        client = self.clients[client_id]
+        if client.weight != weight:
+            client.weight = weight
+            self._rekey(client_id)
+    
+    def set_weights(self, weights: Dict[str, float]):
+        """批量修改权重：逐个重排与整体重排取代价小的一种"""
+        changed = [(cid, w) for cid, w in weights.items() if self.clients[cid].weight != w]
+        if len(changed) * 8 < len(self.clients):
+            for client_id, weight in changed:
+                self.set_weight(client_id, weight)
+            return
+        for client_id, weight in changed:
+            self.clients[client_id].weight = weight
+        self._rebuild()
     
     def calculate_share(self, client: Client) -> float:
         """
@@ -133,6 +177,24 @@ class DRFSorter:
         # 除以权重 (L593)
         return dominant_share / client.weight
     
+    def _rekey(self, client_id: str):
+        """重算一个客户端的 share 并移动到有序表中的新位置"""
+        key = (self.calculate_share(self.clients[client_id]), self._seq[client_id])
+        old = self._keys.get(client_id)
+        if old == key:
+            return
+        if old is not None:
+            j = bisect_left(self._order, old + (client_id,))
+            del self._order[j]
+        insort(self._order, key + (client_id,))
+        self._keys[client_id] = key
+        self.dirty = True
+    
+    def _rebuild(self):
+        self._keys = {cid: (self.calculate_share(c), self._seq[cid]) for cid, c in self.clients.items()}
+        self._order = sorted(key + (cid,) for cid, key in self._keys.items())
+        self.dirty = True
+    
     def sort(self) -> List[str]:
         """
         sort() - sorter.cpp L481-552
@@ -140,19 +202,17 @@ class DRFSorter:
         返回按 dominant share 排序的客户端列表
         """
         if self.dirty:
-            # 计算所有客户端的 share (L498)
-            client_shares = []
-            for client_id, client in self.clients.items():
-                share = self.calculate_share(client)
-                client_shares.append((client_id, share))
-            
-            # 排序 (L502-504)
-            client_shares.sort(key=lambda x: x[1])
-            self.sorted_clients = [c[0] for c in client_shares]
-            
+            self.sorted_clients = [c[2] for c in self._order]
             self.dirty = False
         
         return self.sorted_clients
+    
+    def ordered(self, client_ids) -> List[str]:
+        """client_ids（集合）按 sort() 中的先后顺序排列；只涉及少数客户端时不物化全表"""
+        if len(client_ids) * 8 < len(self._order):
+            keys = self._keys
+            return sorted(client_ids, key=keys.__getitem__)
+        return [c[2] for c in self._order if c[2] in client_ids]
 
 class HierarchicalAllocator:
     """
@@ -164,6 +224,12 @@ class HierarchicalAllocator:
         self.agents = {a.id: a for a in agents}
         self.sorter = DRFSorter()
 
+        # 按剩余资源排序的 agent 索引（行号即 self.agents 的迭代顺序）
+        self._agent_list = list(self.agents.values())
+        self._agent_row = {a.id: row for row, a in enumerate(self._agent_list)}
+        self.agent_index = CapacityIndex([a.cpu_available for a in self._agent_list],
+                                         [a.mem_available for a in self._agent_list])
+
         # 注册所有 agent
         for agent in agents:
             self.sorter.add_slave(agent.id, agent.cpu_total, agent.mem_total)
@@ -174,6 +240,14 @@ class HierarchicalAllocator:
         self.global_risk_ema: float = 0.02
         self.alpha: float = 0.2   # EMA 学习率
         self.beta: float = 2.0    # 风险对权重指数的影响放大系数
+        self.gamma_step: float = 0.05  # γ 的量化步长（0 表示不量化）
+
+        # 权重增量维护：γ 变化时全部重算，否则只重算信用变化过 / 新注册的客户端
+        self._weight_gamma = None
+        self._weight_dirty = set()
+
+        # allocate_offers() 每个分配周期的耗时（秒）
+        self.cycle_latencies: List[float] = []
     
     def _credit_to_weight(self, credit: float) -> float:
         """
@@ -187,17 +261,35 @@ class HierarchicalAllocator:
         """
         根据全局风险调整权重指数 γ ∈ [1.0, 2.0]
         风险越高，γ 越大 ⇒ 权重差异更显著 ⇒ 提高公平性权重的影响力
+
+        global_risk_ema 每次分配后都会变，γ 按 gamma_step 取整：
+        只有跨过一个台阶时才需要全部重算权重（见 _update_client_weights）
         """
         excess = max(0.0, self.global_risk_ema - 0.02)
         gamma = 1.0 + min(1.0, self.beta * excess)  # 上限 2.0
+        if self.gamma_step > 0:
+            gamma = 1.0 + round((gamma - 1.0) / self.gamma_step) * self.gamma_step
         return gamma
 
+    def _client_weight(self, client_id: str, gamma: float) -> float:
+        credit = self.tenant_credits[client_id] if isinstance(self.tenant_credits, dict) else 1.0
+        base_w = self._credit_to_weight(credit)
+        return max(0.25, min(2.0, base_w ** gamma))
+
     def _update_client_weights(self):
+        """
+        weight = clamp(credit_weight ** γ)。只有 γ（由 global_risk_ema 决定）变化时才需要全部重算；
+        否则只重算本轮信用变化过的客户端（信用只在 allocate 内修改，见 _weight_dirty）
+        """
         gamma = self._compute_gamma()
-        for client_id, client in self.sorter.clients.items():
-            credit = self.tenant_credits[client_id] if isinstance(self.tenant_credits, dict) else 1.0
-            base_w = self._credit_to_weight(credit)
-            client.weight = max(0.25, min(2.0, base_w ** gamma))
+        if gamma != self._weight_gamma:
+            self._weight_gamma = gamma
+            self._weight_dirty.clear()
+            self.sorter.set_weights({cid: self._client_weight(cid, gamma) for cid in self.sorter.clients})
+            return
+        for client_id in self._weight_dirty:
+            self.sorter.set_weight(client_id, self._client_weight(client_id, gamma))
+        self._weight_dirty.clear()
 
     def _update_risk_after_allocation(self, agent_id: int):
         # 以 agent 的当前利用率估计违约风险，并更新 EMA（机器与全局）
@@ -215,6 +307,7 @@ class HierarchicalAllocator:
         addFramework() - hierarchical.cpp
         """
         self.sorter.add_client(framework_id)
+        self._weight_dirty.add(framework_id)
     
     def recover_resources(self, framework_id: str, agent_id: int, cpu: float, mem: float):
         """
@@ -236,10 +329,47 @@ class HierarchicalAllocator:
             # 确保不超过总容量
             agent.cpu_available = min(agent.cpu_available, agent.cpu_total)
             agent.mem_available = min(agent.mem_available, agent.mem_total)
+            self.agent_index.update(self._agent_row[agent_id], agent.cpu_available, agent.mem_available)
         
         # 2. 从 sorter 中减少已分配资源
         self.sorter.unallocated(framework_id, cpu, mem)
     
+    def recover_resources_batch(self, framework_ids: List[str], agent_ids: List[int],
+                                cpus: List[float], mems: List[float]):
+        """
+        批量 recoverResources()：一个调度轮次内完成的全部任务（事件引擎批量释放时调用）
+        与逐个调用 recover_resources 的结果相同
+        """
+        agents = self.agents
+        for agent_id, cpu, mem in zip(agent_ids, cpus, mems):
+            agent = agents.get(agent_id)
+            if agent is not None:
+                agent.cpu_available = min(agent.cpu_available + cpu, agent.cpu_total)
+                agent.mem_available = min(agent.mem_available + mem, agent.mem_total)
+                self.agent_index.update(self._agent_row[agent_id], agent.cpu_available, agent.mem_available)
+        self.sorter.unallocated_batch(framework_ids, cpus, mems)
+    
+    def _commit_allocation(self, fw_id: str, task: Task, row: int) -> int:
+        """把 task 记到第 row 个 agent 上：扣减资源、更新 sorter / 风险 / 信用，返回 agent id（agent_index 由调用方更新）"""
+        agent = self._agent_list[row]
+        agent.cpu_available -= task.cpu
+        agent.mem_available -= task.mem
+        
+        # 记录到 sorter
+        self.sorter.allocated(fw_id, task.cpu, task.mem)
+
+        # 风险与信用更新：基于分配后该 agent 的利用率
+        self._update_risk_after_allocation(agent.id)
+        util_after = max(1.0 - agent.cpu_available / max(agent.cpu_total, 1e-6),
+                         1.0 - agent.mem_available / max(agent.mem_total, 1e-6))
+        credit = self.tenant_credits.get(fw_id, 1.0)
+        if util_after > 0.85:
+            self.tenant_credits[fw_id] = max(0.3, credit - 0.01)
+        elif util_after < 0.70:
+            self.tenant_credits[fw_id] = min(1.0, credit + 0.01)
+        self._weight_dirty.add(fw_id)
+        return agent.id
+    
     def allocate(self, tasks_by_framework: Dict[str, List[Task]]) -> List[Tuple[int, int]]:
         """
         主分配循环
@@ -257,84 +387,115 @@ class HierarchicalAllocator:
             if fw_id not in self.sorter.clients:
                 self.add_framework(fw_id)
         
-        # 准备任务队列
+        # 准备任务队列（deque：队首取出/放回都是 O(1)）
         pending_tasks = {}
         for fw_id, tasks in tasks_by_framework.items():
-            pending_tasks[fw_id] = list(tasks)
+            pending_tasks[fw_id] = deque(tasks)
+        active = {fw_id for fw_id, tasks in pending_tasks.items() if tasks}
         
         iteration = 0
-        failed_rounds = 0  # 记录连续失败轮数
-        max_failed_rounds = len(tasks_by_framework) * 2  # 允许的最大连续失败
         
-        while True:
+        while active:
             if iteration % 1000 == 0:
                 remaining = sum(len(ts) for ts in pending_tasks.values())
-                if remaining == 0:
-                    break
                 print(f"  Mesos DRF 已分配 {len(placements)}, 剩余 {remaining}...", end='\r')
             iteration += 1
             
             # 在排序前根据最新风险/信用更新权重
             self._update_client_weights()
 
-            # 1. 按 dominant share 排序 (调用 sorter.sort())
-            sorted_frameworks = self.sorter.sort()
+            # 1. 按 dominant share 排序（sorter 增量维护顺序，这里只取还有任务的 framework）
+            sorted_frameworks = self.sorter.ordered(active)
             
             # 2. 为 share 最小的 framework 分配
-            allocated_this_round = False
             for fw_id in sorted_frameworks:
-                if not pending_tasks.get(fw_id):
-                    continue
-                
-                task = pending_tasks[fw_id].pop(0)
+                queue = pending_tasks[fw_id]
+                task = queue[0]
                 
                 # 查找可用的 agent (generateOffers 逻辑)
-                best_agent = None
-                for agent in self.agents.values():
-                    if (agent.cpu_available >= task.cpu and
-                        agent.mem_available >= task.mem):
-                        # 选择剩余资源最多的 agent
-                        if best_agent is None:
-                            best_agent = agent
-                        else:
-                            if ((agent.cpu_available + agent.mem_available) >
-                                (best_agent.cpu_available + best_agent.mem_available)):
-                                best_agent = agent
+                # 选择剩余资源（cpu + mem）最多的可行 agent，并列取先注册的（索引查询，不再线性扫描；
+                # 超过最大空闲 cpu/mem 的任务由索引直接拒绝）
+                best_row = self.agent_index.most_free(task.cpu, task.mem)
                 
-                if best_agent:
-                    # 分配
-                    best_agent.cpu_available -= task.cpu
-                    best_agent.mem_available -= task.mem
-                    
-                    # 记录到 sorter
-                    self.sorter.allocated(fw_id, task.cpu, task.mem)
-                    
-                    placements.append((task.id, best_agent.id))
-                    allocated_this_round = True
-                    failed_rounds = 0  # 重置失败计数
-
-                    # 风险与信用更新：基于分配后该 agent 的利用率
-                    self._update_risk_after_allocation(best_agent.id)
-                    util_after = max(1.0 - best_agent.cpu_available / max(best_agent.cpu_total, 1e-6),
-                                     1.0 - best_agent.mem_available / max(best_agent.mem_total, 1e-6))
-                    credit = self.tenant_credits.get(fw_id, 1.0)
-                    if util_after > 0.85:
-                        self.tenant_credits[fw_id] = max(0.3, credit - 0.01)
-                    elif util_after < 0.70:
-                        self.tenant_credits[fw_id] = min(1.0, credit + 0.01)
+                if best_row is not None:
+                    queue.popleft()
+                    placements.append((task.id, self._commit_allocation(fw_id, task, best_row)))
+                    best_agent = self._agent_list[best_row]
+                    self.agent_index.update(best_row, best_agent.cpu_available, best_agent.mem_available)
+                    if not queue:
+                        active.discard(fw_id)
                     break  # 每轮只分配一个任务
                 else:
-                    # 无法分配：放回队列
-                    pending_tasks[fw_id].insert(0, task)
+                    # ⭐ 无法分配：本次 allocate 内 agent 空闲资源只减不增，队首任务之后也不会放得下，
+                    # 该 framework 直接退出本次分配（以前要空转 max_failed_rounds 轮才放弃）
+                    active.discard(fw_id)
                     # 不 break，尝试下一个 framework
+        
+        print()
+        return placements
+    
+    def allocate_offers(self, tasks_by_framework: Dict[str, List[Task]],
+                        batch_size: int = 0) -> List[Tuple[int, int]]:
+        """
+        ⭐ offer 周期模式（对应 hierarchical.cpp::generateOffers 的一次分配周期）
+        
+        逐个 agent 把其剩余资源按 DRF 顺序 offer 给各 framework，framework 从队首起
+        接受能放下的任务，直到 offer 用完、队首放不下或已接受 batch_size 个（<=0 不限）。
+        每个 agent 只排序一次，迭代次数约为 agent 数而不是任务数；batch_size 越小越接近
+        allocate() 的逐任务公平性。真实 Mesos 会打乱 agent 顺序，这里按注册顺序保证可复现。
+        每个周期的耗时追加到 self.cycle_latencies（秒）。
+        """
+        start = time.perf_counter()
+        placements = []
+        
+        for fw_id in tasks_by_framework.keys():
+            if fw_id not in self.sorter.clients:
+                self.add_framework(fw_id)
+        
+        pending_tasks = {fw_id: deque(tasks) for fw_id, tasks in tasks_by_framework.items()}
+        active = {fw_id for fw_id, tasks in pending_tasks.items() if tasks}
+        limit = batch_size if batch_size > 0 else float('inf')
+        
+        def drop_blocked():
+            # ⭐ 队首超过所有 agent 最大剩余 cpu / mem 的 framework 本周期不可能再接受 offer，
+            # 直接退出（否则会在每个 agent 上被 offer 一次再拒绝）
+            max_cpu, max_mem = self.agent_index.largest()
+            for fw_id in [f for f in active
+                          if pending_tasks[f][0].cpu > max_cpu or pending_tasks[f][0].mem > max_mem]:
+                active.discard(fw_id)
+        
+        drop_blocked()
+        
+        # 权重在周期开始时更新一次（周期内的信用变化下个周期生效）；share 随分配实时更新
+        self._update_client_weights()
+        for row, agent in enumerate(self._agent_list):
+            if not active:
+                break
+            if agent.cpu_available <= 0 or agent.mem_available <= 0:
+                continue
             
-            # 如果本轮没分配任何任务，累计失败
-            if not allocated_this_round:
-                failed_rounds += 1
-                if failed_rounds >= max_failed_rounds:
-                    # 连续多轮失败，说明剩余任务都无法分配
+            # 每个 agent 的 offer 按当前 share 排序一次（generateOffers 中的 frameworkSorter->sort()）
+            offered = False
+            for fw_id in self.sorter.ordered(active):
+                queue = pending_tasks[fw_id]
+                accepted = 0
+                while queue and accepted < limit:
+                    task = queue[0]
+                    if task.cpu > agent.cpu_available or task.mem > agent.mem_available:
+                        break  # 队首放不下：拒绝 offer 的剩余部分
+                    queue.popleft()
+                    placements.append((task.id, self._commit_allocation(fw_id, task, row)))
+                    accepted += 1
+                if accepted:
+                    offered = True
+                if not queue:
+                    active.discard(fw_id)
+                if agent.cpu_available <= 0 or agent.mem_available <= 0:
                     break
+            if offered:
+                self.agent_index.update(row, agent.cpu_available, agent.mem_available)
+                drop_blocked()
         
-        print()
+        self.cycle_latencies.append(time.perf_counter() - start)
         return placements
 
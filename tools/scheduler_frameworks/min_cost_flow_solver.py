@@ -9,69 +9,58 @@ Firmament 调用流程:
     → 外部 solver (cs2/relaxiv)
 """
 
+import numpy as np
 from ortools.graph.python import min_cost_flow
-from typing import List, Tuple, Dict
-from .flow_graph import FlowGraph, FlowGraphArc, NodeType
+from .flow_graph import FlowGraph, NodeType
 
 class MinCostFlowSolver:
     """
     最小成本流求解器
-    使用 OR-Tools 的 SimpleMinCostFlow
+    使用 OR-Tools 的 SimpleMinCostFlow（边与供给通过批量接口一次性传入）
     """
     
     def __init__(self):
         self.smcf = min_cost_flow.SimpleMinCostFlow()
     
-    def solve(self, graph: FlowGraph) -> Dict[FlowGraphArc, int]:
+    def solve(self, graph: FlowGraph) -> np.ndarray:
         """
         求解 min-cost max-flow
         
-        返回: {arc → flow} 映射
+        OR-Tools 的节点编号为存活节点按 id 升序的紧凑编号（已删除 id 留下的空洞不传给求解器，
+        否则孤立节点会改变等成本解之间的选择），边按 id 升序批量加入。
+        
+        返回: 按边 id 索引的流量数组（长度 graph.current_arc_id，已删除 / 无流的边为 0）
         """
-        # 构建 OR-Tools 输入
-        node_to_index = {node_id: idx for idx, node_id in enumerate(graph.nodes.keys())}
+        arc_ids = graph.live_arc_ids()
+        flows = np.zeros(graph.current_arc_id, dtype=np.int64)
+        
+        num_nodes = graph.current_id
+        live = graph.node_live[:num_nodes]
+        node_index = np.cumsum(live) - 1  # node id → 紧凑编号
         
         # 添加所有边
-        for arc in graph.arcs:
-            src_idx = node_to_index[arc.src.id]
-            dst_idx = node_to_index[arc.dst.id]
-            
-            self.smcf.add_arc_with_capacity_and_unit_cost(
-                src_idx, dst_idx,
-                arc.cap_upper,  # capacity
-                arc.cost         # unit cost
-            )
+        self.smcf.add_arcs_with_capacity_and_unit_cost(
+            node_index[graph.arc_src[arc_ids]], node_index[graph.arc_dst[arc_ids]],
+            graph.arc_capacity[arc_ids],  # capacity
+            graph.arc_cost[arc_ids]       # unit cost
+        )
         
         # 设置 supply/demand
         # Task 节点供应 1，Sink 需求等于任务数，其他节点守恒（supply=0）
-        task_nodes = [n for n in graph.nodes.values() if n.type == NodeType.TASK]
-        sink_demand = len(task_nodes)
-        
-        for node_id, node in graph.nodes.items():
-            idx = node_to_index[node_id]
-            if node.type == NodeType.TASK:
-                self.smcf.set_node_supply(idx, 1)
-            elif node.type == NodeType.SINK:
-                self.smcf.set_node_supply(idx, -sink_demand)
-            else:
-                # 中间节点（EC, Machine, PU 等）守恒
-                self.smcf.set_node_supply(idx, 0)
+        node_type = graph.node_type[:num_nodes][live]
+        is_task = node_type == NodeType.TASK.value
+        supplies = is_task.astype(np.int64)
+        if graph.sink_node is not None:
+            supplies[node_index[graph.sink_node.id]] = -int(is_task.sum())
+        self.smcf.set_nodes_supplies(np.arange(len(supplies)), supplies)
         
         # 求解
         status = self.smcf.solve()
         
         if status != self.smcf.OPTIMAL:
             print(f"  Solver 状态: {status} (非最优)")
-            return {}
+            return flows
         
-        # 提取流量结果
-        flow_result = {}
-        arc_list = list(graph.arcs)
-        
-        for i in range(self.smcf.num_arcs()):
-            if self.smcf.flow(i) > 0:
-                arc = arc_list[i]
-                flow_result[arc] = self.smcf.flow(i)
-        
-        return flow_result
-
+        # 提取流量结果（一次读回整个数组）
+        flows[arc_ids] = self.smcf.flows(np.arange(len(arc_ids)))
+        return flows
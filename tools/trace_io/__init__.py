@@ -0,0 +1,43 @@
+"""Alibaba 2018 trace ingestion: compiled columnar cache, loaders, TaskTable, streaming reader, sampling and synthetic traces."""
+
+from .compile import (
+    compile_trace,
+    cache_status,
+    load_instances,
+    load_task_maps,
+    filter_instance_chunk,
+    CompiledTrace,
+    write_compiled,
+)
+from .ingest import iter_csv_blocks, parallel_read_csv, split_byte_ranges
+from .table import TaskTable, TaskView
+from .stream import iter_tasks
+from .sample import SAMPLE_MODES, StratifiedSampler, sample_cached, sample_csv
+from .synth import TraceProfile, synth_tasks, write_synthetic_trace
+from .usage import UsageAggregator, aggregate_usage, load_usage
+
+__all__ = [
+    "compile_trace",
+    "cache_status",
+    "load_instances",
+    "load_task_maps",
+    "filter_instance_chunk",
+    "CompiledTrace",
+    "write_compiled",
+    "iter_csv_blocks",
+    "parallel_read_csv",
+    "split_byte_ranges",
+    "TaskTable",
+    "TaskView",
+    "iter_tasks",
+    "SAMPLE_MODES",
+    "StratifiedSampler",
+    "sample_cached",
+    "sample_csv",
+    "TraceProfile",
+    "synth_tasks",
+    "write_synthetic_trace",
+    "UsageAggregator",
+    "aggregate_usage",
+    "load_usage",
+]
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Trace 工具命令行入口
+
+用法:
+  python -m tools.trace_io compile <trace_dir> [--out DIR] [--workers N]
+  python -m tools.trace_io status <trace_dir>
+  python -m tools.trace_io profile <trace_dir> --out profile.npz
+  python -m tools.trace_io synth <out_dir> -n 1000000 [--profile profile.npz] [--seed 0]
+"""
+import argparse
+
+from .compile import compile_trace, cache_status, cache_dir
+from .synth import TraceProfile, write_synthetic_trace
+
+
+def parse_args():
+    p = argparse.ArgumentParser(prog="python -m tools.trace_io", description="Alibaba 2018 trace 工具")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    c = sub.add_parser("compile", help="把原始 CSV 编译为列式缓存")
+    c.add_argument("trace_dir", help="包含 batch_instance.csv / batch_task.csv 的目录")
+    c.add_argument("--out", default=None, help="缓存目录（默认 <trace_dir>/compiled；自定义时加载端需设置 TRACE_CACHE_DIR）")
+    c.add_argument("--workers", type=int, default=None, help="并行解析进程数（默认 TRACE_INGEST_WORKERS 或 CPU 核数）")
+
+    s = sub.add_parser("status", help="查看编译缓存状态")
+    s.add_argument("trace_dir")
+
+    f = sub.add_parser("profile", help="从编译缓存拟合合成 trace 的经验分布")
+    f.add_argument("trace_dir")
+    f.add_argument("--out", required=True, help="输出 profile（.npz）")
+    f.add_argument("--seed", type=int, default=0)
+
+    g = sub.add_parser("synth", help="生成合成 trace（编译缓存格式）")
+    g.add_argument("out_dir", help="输出 trace 目录（缓存写在 <out_dir>/compiled）")
+    g.add_argument("-n", "--tasks", type=int, required=True, help="任务数")
+    g.add_argument("--profile", default=None, help="profile .npz（默认使用内置参数化分布）")
+    g.add_argument("--fit", default=None, help="直接从该 trace 目录的编译缓存拟合")
+    g.add_argument("--seed", type=int, default=0)
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.cmd == "compile":
+        compile_trace(args.trace_dir, out_dir=args.out, workers=args.workers)
+    elif args.cmd == "status":
+        print(f"{cache_dir(args.trace_dir)}: {cache_status(args.trace_dir)}")
+    elif args.cmd == "profile":
+        TraceProfile.fit(args.trace_dir, seed=args.seed).save(args.out)
+        print(f"✓ profile 已保存: {args.out}")
+    elif args.cmd == "synth":
+        if args.profile:
+            profile = TraceProfile.load(args.profile)
+        elif args.fit:
+            profile = TraceProfile.fit(args.fit, seed=args.seed)
+        else:
+            profile = TraceProfile.default(seed=args.seed)
+        write_synthetic_trace(profile, args.tasks, args.out_dir, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
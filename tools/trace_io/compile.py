@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Alibaba 2018 trace 编译缓存（列式、按列 memmap）
+
+`batch_instance.csv` 有几十 GB，每次实验都用 pd.read_csv 重新解析会占据大部分运行时间。
+这里把原始 CSV 一次性编译成按列存储的二进制格式：
+  - 已经应用 Terminated + 有效资源（cpu/mem > 0）过滤
+  - 已经 join 好 batch_task.csv 的 task_type / task_priority
+  - 数值列: 原始小端二进制，加载时 np.memmap，几乎零拷贝
+  - 类别列 (tenant, machine_id): int32 编码 + 词表
+  - 字符串列 (instance_id): '\\n' 拼接的字节块 + int64 偏移
+
+缓存目录布局（默认 <trace_dir>/compiled/）:
+  meta.json               schema / 行数 / 源文件 (size, mtime_ns)
+  <col>.bin               数值列或类别编码
+  <col>.vocab             类别词表（每行一个）
+  <col>.offsets / .blob   变长字符串列
+  start_order.bin         按 start_time 稳定排序的行号（int64），供按时间顺序流式回放
+  start_sorted.bin        排序后的 start_time（int64），即时间索引：二分查找时间窗口
+
+源文件的 size 或 mtime 变化即视为过期，加载端自动回退到 CSV。
+CSV 扫描（编译与回退路径）都由 ingest.iter_csv_blocks 多进程并行完成。
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .ingest import iter_csv_blocks, ingest_workers
+
+CACHE_VERSION = 3
+CACHE_DIRNAME = "compiled"
+
+# 编译后的列（与 filter_instance_chunk 输出一致）
+NUMERIC_COLUMNS: Dict[str, str] = {
+    "start_time": "<i8",
+    "end_time": "<i8",
+    "cpu": "<f8",        # 列 12（plan_cpu）
+    "mem": "<f8",        # 列 13（plan_mem）
+    "cpu_avg": "<f8",    # 列 10
+    "cpu_max": "<f8",    # 列 11
+    "task_type": "i1",
+    "task_priority": "i1",
+}
+CATEGORY_COLUMNS = ("tenant", "machine_id")
+STRING_COLUMNS = ("instance_id",)
+SOURCE_FILES = ("batch_instance.csv", "batch_task.csv")
+# filter_instance_chunk 用到的 batch_instance.csv 列（其余列不解析）
+INSTANCE_USECOLS = [0, 1, 2, 4, 5, 6, 7, 10, 11, 12, 13]
+
+
+def cache_dir(trace_dir: str) -> str:
+    """编译缓存所在目录（可用 TRACE_CACHE_DIR 覆盖）"""
+    return os.getenv("TRACE_CACHE_DIR") or os.path.join(trace_dir, CACHE_DIRNAME)
+
+
+def _source_signature(trace_dir: str) -> Dict[str, List[int]]:
+    sig = {}
+    for name in SOURCE_FILES:
+        path = os.path.join(trace_dir, name)
+        if os.path.exists(path):
+            st = os.stat(path)
+            sig[name] = [st.st_size, st.st_mtime_ns]
+    return sig
+
+
+def load_task_maps(trace_dir: str) -> Tuple[pd.Series, pd.Series]:
+    """读取 batch_task.csv，返回 task_id → task_type / task_priority 映射"""
+    task_path = os.path.join(trace_dir, "batch_task.csv")
+    if not os.path.exists(task_path):
+        raise FileNotFoundError(f"缺少 batch_task.csv: {task_path}")
+
+    task_df = pd.read_csv(task_path, header=None, usecols=[0, 3, 4])
+    task_df = task_df.rename(columns={0: "task_id", 3: "task_type", 4: "task_priority"})
+    task_df["task_id"] = task_df["task_id"].astype(str).str.strip()
+    task_df["task_type"] = pd.to_numeric(task_df["task_type"], errors="coerce").fillna(0).astype("Int8")
+    task_df["task_priority"] = pd.to_numeric(task_df["task_priority"], errors="coerce").fillna(0).astype("Int8")
+    task_df = task_df.drop_duplicates(subset="task_id", keep="last")
+    indexed = task_df.set_index("task_id")
+    return indexed["task_type"], indexed["task_priority"]
+
+
+def filter_instance_chunk(chunk: pd.DataFrame, task_type_map: pd.Series,
+                          task_pri_map: pd.Series) -> pd.DataFrame:
+    """
+    对 batch_instance.csv 的一个原始分块做过滤与规范化
+    - 仅保留 Terminated（只有它们带有资源数据）
+    - cpu/mem（列 12, 13）必须为正数
+    - join task_type / task_priority（按列 1 task_id）
+    """
+    terminated = chunk[chunk[4] == 'Terminated']
+    cpu = pd.to_numeric(terminated[12], errors='coerce')
+    mem = pd.to_numeric(terminated[13], errors='coerce')
+    valid = cpu.notna() & mem.notna() & (cpu > 0) & (mem > 0)
+    rows = terminated[valid]
+
+    task_id = rows[1].astype(str).str.strip()
+    return pd.DataFrame({
+        "instance_id": rows[0].astype(str),
+        "tenant": rows[2].astype(str),
+        "start_time": pd.to_numeric(rows[5], errors='coerce').fillna(0).astype(np.int64),
+        "end_time": pd.to_numeric(rows[6], errors='coerce').fillna(0).astype(np.int64),
+        "machine_id": rows[7].astype(str).str.strip(),
+        "cpu": cpu[valid].astype(np.float64),
+        "mem": mem[valid].astype(np.float64),
+        "cpu_avg": pd.to_numeric(rows[10], errors='coerce').fillna(0).astype(np.float64),
+        "cpu_max": pd.to_numeric(rows[11], errors='coerce').fillna(0).astype(np.float64),
+        "task_type": task_id.map(task_type_map).fillna(0).astype(np.int8),
+        "task_priority": task_id.map(task_pri_map).fillna(0).astype(np.int8),
+    }).reset_index(drop=True)
+
+
+def _filter_block(chunk: pd.DataFrame, task_type_map: pd.Series,
+                  task_pri_map: pd.Series) -> Tuple[int, pd.DataFrame]:
+    """ingest worker 内执行：返回 (扫描行数, 过滤后的分块)"""
+    return len(chunk), filter_instance_chunk(chunk, task_type_map, task_pri_map)
+
+
+def iter_instance_blocks(trace_dir: str, task_type_map: pd.Series, task_pri_map: pd.Series,
+                         workers: Optional[int] = None) -> Iterator[Tuple[int, pd.DataFrame]]:
+    """多进程扫描 batch_instance.csv，按文件顺序产出 (扫描行数, 过滤后的分块)"""
+    return iter_csv_blocks(os.path.join(trace_dir, "batch_instance.csv"), _filter_block,
+                           args=(task_type_map, task_pri_map), workers=workers,
+                           usecols=INSTANCE_USECOLS)
+
+
+class _ColumnWriter:
+    """增量写入各列（按分块追加），内存占用只与分块大小有关"""
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        self.rows = 0
+        self._files = {}
+        self._vocab: Dict[str, Dict[str, int]] = {c: {} for c in CATEGORY_COLUMNS}
+        self._str_offset = {c: 0 for c in STRING_COLUMNS}
+        for name in NUMERIC_COLUMNS:
+            self._files[name] = open(os.path.join(out_dir, f"{name}.bin"), "wb")
+        for name in CATEGORY_COLUMNS:
+            self._files[name] = open(os.path.join(out_dir, f"{name}.bin"), "wb")
+        for name in STRING_COLUMNS:
+            self._files[name] = open(os.path.join(out_dir, f"{name}.blob"), "wb")
+            self._files[name + ".offsets"] = open(os.path.join(out_dir, f"{name}.offsets"), "wb")
+            np.zeros(1, dtype="<i8").tofile(self._files[name + ".offsets"])
+
+    def append(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        for name, dtype in NUMERIC_COLUMNS.items():
+            df[name].to_numpy(dtype=dtype).tofile(self._files[name])
+        for name in CATEGORY_COLUMNS:
+            codes, uniques = pd.factorize(df[name], sort=False)
+            vocab = self._vocab[name]
+            remap = np.empty(len(uniques), dtype=np.int32)
+            for i, value in enumerate(uniques):
+                code = vocab.get(value)
+                if code is None:
+                    code = vocab[value] = len(vocab)
+                remap[i] = code
+            remap[codes].astype("<i4").tofile(self._files[name])
+        for name in STRING_COLUMNS:
+            values = df[name].tolist()
+            encoded = [v.encode("utf-8") + b"\n" for v in values]
+            lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+            offsets = self._str_offset[name] + np.cumsum(lengths)
+            self._files[name].write(b"".join(encoded))
+            offsets.astype("<i8").tofile(self._files[name + ".offsets"])
+            self._str_offset[name] = int(offsets[-1])
+        self.rows += len(df)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        for name, vocab in self._vocab.items():
+            with open(os.path.join(self.out_dir, f"{name}.vocab"), "w", encoding="utf-8") as f:
+                f.write("\n".join(vocab))
+
+
+def _write_start_order(out_dir: str, rows: int):
+    """
+    写入时间索引：按 start_time 稳定排序后的行号 + 排序后的 start_time
+    （各 8 字节/行；流式回放按行号顺序读取，时间窗口查询在排序键上二分）
+    """
+    order_path = os.path.join(out_dir, "start_order.bin")
+    sorted_path = os.path.join(out_dir, "start_sorted.bin")
+    if rows == 0:
+        open(order_path, "wb").close()
+        open(sorted_path, "wb").close()
+        return
+    start = np.memmap(os.path.join(out_dir, "start_time.bin"), dtype="<i8", mode="r", shape=(rows,))
+    order = np.argsort(start, kind="stable")
+    order.astype("<i8").tofile(order_path)
+    np.asarray(start[order], dtype="<i8").tofile(sorted_path)
+
+
+def _prepare_cache_dir(out_dir: str) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    meta_path = os.path.join(out_dir, "meta.json")
+    if os.path.exists(meta_path):
+        # 先删掉 meta，编译中途失败时缓存会被视为缺失而不是"新鲜"
+        os.remove(meta_path)
+    return out_dir
+
+
+def _finish_cache_dir(out_dir: str, rows: int, sources: Dict[str, List[int]], **extra):
+    """写时间索引，最后原子地写入 meta.json（之后缓存才会被视为可用）"""
+    _write_start_order(out_dir, rows)
+    meta = {
+        "version": CACHE_VERSION,
+        "rows": rows,
+        "sources": sources,
+        "numeric": NUMERIC_COLUMNS,
+        "category": list(CATEGORY_COLUMNS),
+        "string": list(STRING_COLUMNS),
+        **extra,
+    }
+    meta_path = os.path.join(out_dir, "meta.json")
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, meta_path)
+
+
+def write_compiled(frames: Iterable[pd.DataFrame], out_dir: str, **extra) -> int:
+    """
+    把规范化 DataFrame 分块（filter_instance_chunk 的列）直接写成编译缓存，返回行数
+    没有源 CSV（sources 为空），缓存始终视为新鲜；用于合成 trace 等
+    """
+    _prepare_cache_dir(out_dir)
+    writer = _ColumnWriter(out_dir)
+    try:
+        for df in frames:
+            writer.append(df)
+    finally:
+        writer.close()
+    _finish_cache_dir(out_dir, writer.rows, sources={}, **extra)
+    return writer.rows
+
+
+def compile_trace(trace_dir: str, out_dir: Optional[str] = None,
+                  workers: Optional[int] = None) -> str:
+    """
+    把 batch_instance.csv (+ batch_task.csv) 编译为列式缓存，返回缓存目录
+
+    用法: python -m tools.trace_io compile ./data [--workers N]
+    """
+    out_dir = _prepare_cache_dir(out_dir or cache_dir(trace_dir))
+
+    signature = _source_signature(trace_dir)
+    task_type_map, task_pri_map = load_task_maps(trace_dir)
+
+    workers = ingest_workers() if workers is None else workers
+    print(f"━━━ 编译 Alibaba trace → {out_dir}（{workers} 进程） ━━━")
+    writer = _ColumnWriter(out_dir)
+    total_scanned = 0
+    try:
+        for scanned, valid_rows in iter_instance_blocks(trace_dir, task_type_map, task_pri_map, workers):
+            total_scanned += scanned
+            writer.append(valid_rows)
+            print(f"  已扫描 {total_scanned / 1e6:.1f}M 行，保留 {writer.rows} 条有效记录...", end='\r')
+    finally:
+        writer.close()
+    print()
+    _finish_cache_dir(out_dir, writer.rows, sources=signature, scanned=total_scanned)
+
+    print(f"✓ 编译完成: {writer.rows} 条有效记录（扫描 {total_scanned / 1e6:.1f}M 行）")
+    return out_dir
+
+
+def cache_status(trace_dir: str) -> str:
+    """返回 'fresh' / 'missing' / 'stale'"""
+    meta_path = os.path.join(cache_dir(trace_dir), "meta.json")
+    if not os.path.exists(meta_path):
+        return "missing"
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get("version") != CACHE_VERSION:
+        return "stale"
+    current = _source_signature(trace_dir)
+    for name, recorded in meta.get("sources", {}).items():
+        # 源文件不存在时（只分发了缓存）仍认为缓存可用
+        if name in current and current[name] != recorded:
+            return "stale"
+    return "fresh"
+
+
+class CompiledTrace:
+    """只读访问编译缓存；数值列按需 memmap，不会一次性读入内存"""
+
+    def __init__(self, trace_dir: str):
+        self.path = cache_dir(trace_dir)
+        with open(os.path.join(self.path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.rows: int = self.meta["rows"]
+        self._vocab_cache: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def numeric(self, name: str) -> np.ndarray:
+        dtype = np.dtype(self.meta["numeric"][name])
+        if self.rows == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, f"{name}.bin"), dtype=dtype, mode="r", shape=(self.rows,))
+
+    def codes(self, name: str) -> np.ndarray:
+        if self.rows == 0:
+            return np.zeros(0, dtype=np.int32)
+        return np.memmap(os.path.join(self.path, f"{name}.bin"), dtype="<i4", mode="r", shape=(self.rows,))
+
+    def vocab(self, name: str) -> np.ndarray:
+        if name not in self._vocab_cache:
+            with open(os.path.join(self.path, f"{name}.vocab"), encoding="utf-8") as f:
+                text = f.read()
+            self._vocab_cache[name] = np.array(text.split("\n") if text else [], dtype=object)
+        return self._vocab_cache[name]
+
+    def strings(self, name: str, start: int, stop: int) -> List[str]:
+        """读取变长字符串列的 [start, stop) 行"""
+        if stop <= start:
+            return []
+        offsets = np.memmap(os.path.join(self.path, f"{name}.offsets"), dtype="<i8", mode="r",
+                            shape=(self.rows + 1,))
+        lo, hi = int(offsets[start]), int(offsets[stop])
+        with open(os.path.join(self.path, f"{name}.blob"), "rb") as f:
+            f.seek(lo)
+            data = f.read(hi - lo)
+        return data[:-1].decode("utf-8").split("\n")
+
+    def strings_at(self, name: str, rows: np.ndarray) -> List[str]:
+        """按任意行号读取变长字符串列"""
+        if len(rows) == 0:
+            return []
+        offsets = np.memmap(os.path.join(self.path, f"{name}.offsets"), dtype="<i8", mode="r",
+                            shape=(self.rows + 1,))
+        blob = np.memmap(os.path.join(self.path, f"{name}.blob"), dtype=np.uint8, mode="r")
+        lo = offsets[rows].tolist()
+        hi = offsets[rows + 1].tolist()
+        return [blob[a:b - 1].tobytes().decode("utf-8") for a, b in zip(lo, hi)]
+
+    def start_order(self) -> np.ndarray:
+        """按 start_time 排序的行号（memmap）"""
+        if self.rows == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.memmap(os.path.join(self.path, "start_order.bin"), dtype="<i8", mode="r", shape=(self.rows,))
+
+    def start_sorted(self) -> np.ndarray:
+        """排序后的 start_time（memmap），与 start_order 一一对应"""
+        if self.rows == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.memmap(os.path.join(self.path, "start_sorted.bin"), dtype="<i8", mode="r", shape=(self.rows,))
+
+    def window_positions(self, t_start: Optional[int] = None, t_end: Optional[int] = None) -> Tuple[int, int]:
+        """
+        时间窗口 [t_start, t_end) 在 start_order 中对应的区间 [lo, hi)
+
+        start_sorted.bin 以 memmap 打开，二分查找只触及 O(log n) 个页面。
+        """
+        if self.rows == 0:
+            return 0, 0
+        keys = self.start_sorted()
+        lo = 0 if t_start is None else int(np.searchsorted(keys, t_start, side="left"))
+        hi = self.rows if t_end is None else int(np.searchsorted(keys, t_end, side="left"))
+        return lo, max(lo, hi)
+
+    def window_rows(self, t_start: Optional[int] = None, t_end: Optional[int] = None) -> np.ndarray:
+        """start_time 落在 [t_start, t_end) 内的行号（按文件顺序）"""
+        lo, hi = self.window_positions(t_start, t_end)
+        return np.sort(np.asarray(self.start_order()[lo:hi]))
+
+    def take(self, rows: np.ndarray) -> pd.DataFrame:
+        """按行号数组取行（顺序保持），列与 frame() 相同"""
+        rows = np.asarray(rows, dtype=np.int64)
+        data = {}
+        for name in STRING_COLUMNS:
+            data[name] = self.strings_at(name, rows)
+        for name in CATEGORY_COLUMNS:
+            data[name] = pd.Categorical.from_codes(np.asarray(self.codes(name)[rows]), categories=self.vocab(name))
+        for name in NUMERIC_COLUMNS:
+            data[name] = np.asarray(self.numeric(name)[rows])
+        return pd.DataFrame(data)
+
+    def frame(self, start: int = 0, stop: Optional[int] = None) -> pd.DataFrame:
+        """把 [start, stop) 行组装为与 filter_instance_chunk 相同列的 DataFrame"""
+        stop = self.rows if stop is None else min(stop, self.rows)
+        start = min(start, stop)
+        data = {}
+        for name in STRING_COLUMNS:
+            data[name] = self.strings(name, start, stop)
+        for name in CATEGORY_COLUMNS:
+            data[name] = pd.Categorical.from_codes(np.asarray(self.codes(name)[start:stop]),
+                                                   categories=self.vocab(name))
+        for name in NUMERIC_COLUMNS:
+            data[name] = np.array(self.numeric(name)[start:stop])
+        return pd.DataFrame(data)
+
+
+def _in_window(start: pd.Series, t_start: Optional[int], t_end: Optional[int]) -> pd.Series:
+    mask = pd.Series(True, index=start.index)
+    if t_start is not None:
+        mask &= start >= t_start
+    if t_end is not None:
+        mask &= start < t_end
+    return mask
+
+
+def load_instances(trace_dir: str, max_inst: Optional[int] = None,
+                   t_start: Optional[int] = None, t_end: Optional[int] = None,
+                   sample: str = "head", seed: int = 0) -> pd.DataFrame:
+    """
+    读取按文件顺序的前 max_inst 条有效实例（规范化列）
+    编译缓存新鲜时直接读缓存；缺失或过期时回退到 CSV 分块扫描
+
+    t_start / t_end: 只保留 start_time 落在 [t_start, t_end) 内的实例。
+                     有编译缓存时通过时间索引只读取窗口内的行。
+    sample: max_inst 条如何选取（见 trace_io/sample.py）：
+            head（默认，文件前 max_inst 条）/ reservoir / tenant / priority / time；
+            同一 seed 在缓存与 CSV 两条路径上选出相同的实例（按文件顺序返回）
+    """
+    from .sample import SAMPLE_MODES, sample_cached, sample_csv
+
+    if sample not in SAMPLE_MODES:
+        raise ValueError(f"未知的抽样模式: {sample}（可选: {', '.join(SAMPLE_MODES)}）")
+    windowed = t_start is not None or t_end is not None
+    status = cache_status(trace_dir)
+    sampled = sample != "head" and max_inst is not None
+
+    if sampled:
+        if status == "fresh":
+            compiled = CompiledTrace(trace_dir)
+            rows = sample_cached(compiled, max_inst, sample, seed, t_start, t_end)
+            if len(rows) == 0:
+                raise ValueError("未找到有效数据")
+            df = compiled.take(rows)
+            print(f"✓ 从编译缓存按 {sample} 抽样 {len(df)} 条有效记录（seed={seed}，缓存共 {compiled.rows} 条）")
+            return df
+        if status == "stale":
+            print("⚠ 编译缓存已过期（源文件有变化），回退到 CSV 扫描")
+        print(f"  按 {sample} 抽样需要扫描整个 CSV；编译缓存后抽样只需读取一列")
+        df = sample_csv(trace_dir, max_inst, sample, seed, t_start, t_end)
+        print(f"✓ 按 {sample} 抽样 {len(df)} 条有效记录（seed={seed}）")
+        return df
+
+    if status == "fresh":
+        compiled = CompiledTrace(trace_dir)
+        if windowed:
+            rows = compiled.window_rows(t_start, t_end)
+            if len(rows) == 0:
+                raise ValueError(f"时间窗口 [{t_start}, {t_end}) 内没有有效数据")
+            df = compiled.take(rows[:max_inst])
+            print(f"✓ 从编译缓存加载时间窗口 [{t_start}, {t_end}) 内 {len(df)} 条有效记录"
+                  f"（窗口共 {len(rows)} 条，缓存共 {compiled.rows} 条）")
+            return df
+        df = compiled.frame(0, max_inst)
+        print(f"✓ 从编译缓存加载 {len(df)} 条有效记录（缓存共 {compiled.rows} 条）")
+        return df
+
+    if status == "stale":
+        print("⚠ 编译缓存已过期（源文件有变化），回退到 CSV 扫描")
+    print("  提示：运行 python -m tools.trace_io compile <trace_dir> 可编译缓存，后续加载只需数秒")
+
+    task_type_map, task_pri_map = load_task_maps(trace_dir)
+    all_valid_rows = []
+    collected = 0
+    total_scanned = 0
+    for chunk_idx, (scanned, valid_rows) in enumerate(iter_instance_blocks(trace_dir, task_type_map,
+                                                                           task_pri_map)):
+        total_scanned += scanned
+        if windowed:
+            valid_rows = valid_rows[_in_window(valid_rows["start_time"], t_start, t_end)]
+        if len(valid_rows) > 0:
+            all_valid_rows.append(valid_rows)
+            collected += len(valid_rows)
+
+        if chunk_idx % 10 == 0:
+            print(f"  已扫描 {total_scanned / 1e6:.1f}M 行，收集 {collected} 条有效记录...", end='\r')
+
+        # 达到上限即停止（节省内存和时间）
+        if max_inst is not None and collected >= max_inst:
+            break
+    print(f"  已扫描 {total_scanned / 1e6:.1f}M 行，收集 {collected} 条有效记录...")
+
+    if not all_valid_rows:
+        raise ValueError("未找到有效数据")
+    df = pd.concat(all_valid_rows, ignore_index=True)
+    return df.head(max_inst) if max_inst is not None else df
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+多进程 CSV 读取（按字节区间切分）
+
+Alibaba trace 的 CSV 没有表头、每行一条记录，因此可以把文件按字节切成若干块，
+每块的边界对齐到换行符，交给进程池各自 pd.read_csv + 过滤/聚合，
+再按文件顺序依次产出结果。全量扫描时基本随核数线性加速。
+
+  - transform(df, *args) 在 worker 内执行（必须是模块顶层函数，便于 pickle），
+    只把过滤/聚合后的小结果传回主进程
+  - 同时在途的块数有上限（workers * 2），内存与文件大小无关
+  - workers <= 1 时在当前进程内顺序执行（与并行路径结果完全一致）
+
+worker 数量由 TRACE_INGEST_WORKERS 控制，默认等于 CPU 核数。
+"""
+from __future__ import annotations
+
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+INGEST_BLOCK_BYTES = 64 << 20  # 每块约 64MB（batch_instance.csv 约 60 万行）
+
+# worker 进程内的状态（由 _init_worker 设置，避免每个块都 pickle 一次 transform 参数）
+_WORKER: Dict[str, Any] = {}
+
+
+def ingest_workers() -> int:
+    """并行读取的进程数（TRACE_INGEST_WORKERS，默认 CPU 核数）"""
+    return max(1, int(os.getenv("TRACE_INGEST_WORKERS", str(os.cpu_count() or 1))))
+
+
+def split_byte_ranges(path: str, block_bytes: int = INGEST_BLOCK_BYTES) -> List[Tuple[int, int]]:
+    """把文件切成 [start, end) 字节区间，每个区间都以完整的行结束"""
+    size = os.path.getsize(path)
+    ranges = []
+    start = 0
+    with open(path, "rb") as f:
+        while start < size:
+            end = min(start + block_bytes, size)
+            if end < size:
+                # 跳到当前行末尾，保证不会把一行切成两半
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def read_byte_range(path: str, start: int, end: int, **read_kwargs) -> pd.DataFrame:
+    """解析 [start, end) 区间（无表头）"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    if not data.strip():
+        return pd.DataFrame(columns=read_kwargs.get("usecols") or [])
+    return pd.read_csv(io.BytesIO(data), header=None, **read_kwargs)
+
+
+def _init_worker(transform: Optional[Callable], args: tuple, read_kwargs: dict):
+    _WORKER["transform"] = transform
+    _WORKER["args"] = args
+    _WORKER["read_kwargs"] = read_kwargs
+
+
+def _run_block(path: str, start: int, end: int):
+    df = read_byte_range(path, start, end, **_WORKER["read_kwargs"])
+    transform = _WORKER["transform"]
+    return transform(df, *_WORKER["args"]) if transform is not None else df
+
+
+def iter_csv_blocks(path: str, transform: Optional[Callable] = None, args: tuple = (),
+                    workers: Optional[int] = None, block_bytes: int = INGEST_BLOCK_BYTES,
+                    **read_kwargs) -> Iterator[Any]:
+    """
+    按文件顺序产出每个字节块的 transform(df, *args) 结果（transform 为 None 时产出 DataFrame）
+
+    调用方可以提前 break（例如已收集够 max_inst 条），尚未开始的块会被取消。
+    """
+    workers = ingest_workers() if workers is None else max(1, workers)
+    ranges = split_byte_ranges(path, block_bytes)
+
+    if workers == 1 or len(ranges) <= 1:
+        _init_worker(transform, args, read_kwargs)
+        for start, end in ranges:
+            yield _run_block(path, start, end)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(transform, args, read_kwargs))
+    try:
+        window = deque()
+        todo = iter(ranges)
+        for start, end in todo:
+            window.append(executor.submit(_run_block, path, start, end))
+            if len(window) >= workers * 2:
+                break
+        while window:
+            result = window.popleft().result()
+            nxt = next(todo, None)
+            if nxt is not None:
+                window.append(executor.submit(_run_block, path, *nxt))
+            yield result
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def parallel_read_csv(path: str, transform: Optional[Callable] = None, args: tuple = (),
+                      workers: Optional[int] = None, block_bytes: int = INGEST_BLOCK_BYTES,
+                      **read_kwargs) -> pd.DataFrame:
+    """并行读取整个文件并按原顺序拼接（transform 需返回 DataFrame）"""
+    frames = [df for df in iter_csv_blocks(path, transform, args, workers, block_bytes, **read_kwargs)
+              if len(df) > 0]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+加载时的抽样模式（代替"取文件前 max_inst 行"）
+
+  head       按文件顺序取前 k 行（旧行为，偏向 trace 最早的几分钟和少数租户）
+  reservoir  全文件均匀抽样
+  tenant     按租户（job）分层，比例分配
+  priority   按 task_priority 分层，比例分配
+  time       按 start_time 分桶（SAMPLE_TIME_BUCKET 秒）分层，比例分配
+
+实现: bottom-k 随机键。每行分配一个 U(0,1) 键（按文件顺序从 seed 生成，与分块方式无关），
+每个层保留键最小的 quota 行；逐块合并后立即截断，内存只与样本大小和块大小有关。
+分层模式的比例分配需要各层的行数：有编译缓存时按行块切片 memmap 扫描一列（codes / start_time），
+不物化任何行；CSV 回退路径需要额外一遍计数扫描。
+层按标签值（租户名 / 优先级 / 绝对时间桶）排序后参与配额的并列裁决，
+因此同一 seed 在缓存与 CSV 两条路径上选出相同的实例。
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from .compile import CompiledTrace, iter_instance_blocks, load_task_maps, _in_window
+
+SAMPLE_MODES = ("head", "reservoir", "tenant", "priority", "time")
+SAMPLE_TIME_BUCKET = 3600
+SAMPLE_BLOCK_ROWS = 1_000_000
+
+
+def allocate(counts: np.ndarray, k: int, rank: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    比例分配（最大余数法）：sum = min(k, N)，且每层不超过该层行数
+    余数相同的层按 rank（各层标签值的排序位置）先后裁决，缺省按层号
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    if total <= k:
+        return counts.copy()
+    exact = counts * (k / total)
+    quota = np.floor(exact).astype(np.int64)
+    remainder = k - int(quota.sum())
+    if remainder > 0:
+        if rank is None:
+            order = np.argsort(-(exact - quota), kind="stable")
+        else:
+            order = np.lexsort((rank, -(exact - quota)))
+        quota[order[:remainder]] += 1
+    return np.minimum(quota, counts)
+
+
+def _label_rank(values) -> np.ndarray:
+    """各层标签值在排序后的位置"""
+    order = np.argsort(np.asarray(values, dtype=object), kind="stable")
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return rank
+
+
+class StratifiedSampler:
+    """按层的 bottom-k：每层保留随机键最小的 quota[s] 行"""
+
+    def __init__(self, quota: np.ndarray):
+        self.quota = np.asarray(quota, dtype=np.int64)
+        self.strata = np.zeros(0, dtype=np.int64)
+        self.keys = np.zeros(0, dtype=np.float64)
+        self.payload = None
+
+    def feed(self, strata: np.ndarray, keys: np.ndarray, payload):
+        """payload: 与 strata 等长的行号数组或 DataFrame"""
+        if len(keys) == 0:
+            return
+        strata = np.asarray(strata, dtype=np.int64)
+        if self.payload is None:
+            merged_payload = payload
+        elif isinstance(payload, pd.DataFrame):
+            merged_payload = pd.concat([self.payload, payload], ignore_index=True)
+        else:
+            merged_payload = np.concatenate([self.payload, payload])
+        merged_strata = np.concatenate([self.strata, strata])
+        merged_keys = np.concatenate([self.keys, keys])
+
+        order = np.lexsort((merged_keys, merged_strata))
+        s_sorted = merged_strata[order]
+        first = np.searchsorted(s_sorted, s_sorted, side="left")
+        rank = np.arange(len(order)) - first
+        keep = np.sort(order[rank < self.quota[s_sorted]])
+
+        self.strata = merged_strata[keep]
+        self.keys = merged_keys[keep]
+        if isinstance(merged_payload, pd.DataFrame):
+            self.payload = merged_payload.iloc[keep].reset_index(drop=True)
+        else:
+            self.payload = merged_payload[keep]
+
+
+def _add_counts(counts: np.ndarray, strata: np.ndarray) -> np.ndarray:
+    c = np.bincount(strata)
+    if len(c) > len(counts):
+        c[:len(counts)] += counts
+        return c
+    counts[:len(c)] += c
+    return counts
+
+
+def _strata_cached(compiled: CompiledTrace, index, n: int, mode: str, base_bucket: int,
+                   bucket_seconds: int) -> np.ndarray:
+    """
+    一块 n 个候选行的层号：优先级 + 128 / 租户编码 / 绝对时间桶 - base_bucket
+    index 为行块切片或行号数组，只读取 memmap 的对应部分
+    """
+    if mode == "reservoir":
+        return np.zeros(n, dtype=np.int64)
+    if mode == "tenant":
+        return np.asarray(compiled.codes("tenant")[index], dtype=np.int64)
+    if mode == "priority":
+        return np.asarray(compiled.numeric("task_priority")[index], dtype=np.int64) + 128
+    return np.asarray(compiled.numeric("start_time")[index]) // bucket_seconds - base_bucket
+
+
+def _candidate_blocks(compiled: CompiledTrace, t_start: Optional[int], t_end: Optional[int]) -> Iterator:
+    """
+    按文件顺序逐块给出候选行：整块为 slice，否则为块内落在时间窗口中的行号数组。
+    窗口不大于一个块时直接用时间索引取行，否则逐块切片 start_time 过滤（内存 O(块大小)）
+    """
+    windowed = t_start is not None or t_end is not None
+    if windowed:
+        lo, hi = compiled.window_positions(t_start, t_end)
+        if hi - lo <= SAMPLE_BLOCK_ROWS:
+            if hi > lo:
+                yield np.sort(np.asarray(compiled.start_order()[lo:hi]))
+            return
+    start = compiled.numeric("start_time")
+    for lo in range(0, compiled.rows, SAMPLE_BLOCK_ROWS):
+        hi = min(lo + SAMPLE_BLOCK_ROWS, compiled.rows)
+        if not windowed:
+            yield slice(lo, hi)
+            continue
+        block = np.asarray(start[lo:hi])
+        mask = np.ones(hi - lo, dtype=bool)
+        if t_start is not None:
+            mask &= block >= t_start
+        if t_end is not None:
+            mask &= block < t_end
+        if mask.any():
+            yield lo + np.flatnonzero(mask)
+
+
+def sample_cached(compiled: CompiledTrace, k: int, mode: str, seed: int = 0,
+                  t_start: Optional[int] = None, t_end: Optional[int] = None,
+                  bucket_seconds: int = SAMPLE_TIME_BUCKET) -> np.ndarray:
+    """在编译缓存上抽样，返回选中的行号（文件顺序）；内存与样本大小和块大小有关，与 trace 行数无关"""
+    lo, hi = compiled.window_positions(t_start, t_end)
+    if hi <= lo:
+        return np.zeros(0, dtype=np.int64)
+    # 时间桶按绝对时间对齐（与 CSV 路径的分层一致），减去窗口内首个桶（取自时间索引）只是为了让 bincount 从 0 开始
+    base_bucket = int(compiled.start_sorted()[lo]) // bucket_seconds if mode == "time" else 0
+
+    counts = np.zeros(1, dtype=np.int64)
+    for index in _candidate_blocks(compiled, t_start, t_end):
+        n = index.stop - index.start if isinstance(index, slice) else len(index)
+        counts = _add_counts(counts, _strata_cached(compiled, index, n, mode, base_bucket, bucket_seconds))
+
+    # 租户编码是编译时的首次出现顺序，按租户名裁决并列（优先级 / 时间桶的层号本身就是标签顺序）
+    rank = _label_rank(compiled.vocab("tenant")[:len(counts)].tolist()) if mode == "tenant" else None
+    sampler = StratifiedSampler(allocate(counts, k, rank))
+    rng = np.random.default_rng(seed)
+    for index in _candidate_blocks(compiled, t_start, t_end):
+        rows = np.arange(index.start, index.stop, dtype=np.int64) if isinstance(index, slice) else index
+        sampler.feed(_strata_cached(compiled, index, len(rows), mode, base_bucket, bucket_seconds),
+                     rng.random(len(rows)), rows)
+    return np.sort(sampler.payload)
+
+
+def _strata_frame(df: pd.DataFrame, mode: str, labels: Dict, bucket_seconds: int) -> np.ndarray:
+    """CSV 路径：层标签（租户名 / 优先级 / 绝对时间桶）按首次出现编号，配额并列时再按标签值排序"""
+    if mode == "reservoir":
+        return np.zeros(len(df), dtype=np.int64)
+    if mode == "time":
+        values = (df["start_time"].to_numpy() // bucket_seconds).tolist()
+    elif mode == "priority":
+        values = df["task_priority"].astype(np.int64).tolist()
+    else:
+        values = df["tenant"].tolist()
+    return np.fromiter((labels.setdefault(v, len(labels)) for v in values), dtype=np.int64, count=len(df))
+
+
+def sample_csv(trace_dir: str, k: int, mode: str, seed: int = 0,
+               t_start: Optional[int] = None, t_end: Optional[int] = None,
+               bucket_seconds: int = SAMPLE_TIME_BUCKET) -> pd.DataFrame:
+    """没有编译缓存时在 CSV 上抽样（分层模式多一遍计数扫描）"""
+    task_type_map, task_pri_map = load_task_maps(trace_dir)
+    windowed = t_start is not None or t_end is not None
+
+    def frames() -> Iterator[pd.DataFrame]:
+        for _, valid_rows in iter_instance_blocks(trace_dir, task_type_map, task_pri_map):
+            if windowed:
+                valid_rows = valid_rows[_in_window(valid_rows["start_time"], t_start, t_end)]
+            yield valid_rows.reset_index(drop=True)
+
+    labels: Dict = {}
+    if mode == "reservoir":
+        quota = np.array([k])
+    else:
+        counts = np.zeros(1, dtype=np.int64)
+        for df in frames():
+            counts = _add_counts(counts, _strata_frame(df, mode, labels, bucket_seconds))
+        quota = allocate(counts, k, _label_rank(list(labels)))
+
+    sampler = StratifiedSampler(quota)
+    rng = np.random.default_rng(seed)
+    for df in frames():
+        sampler.feed(_strata_frame(df, mode, labels, bucket_seconds), rng.random(len(df)), df)
+    if sampler.payload is None:
+        raise ValueError("未找到有效数据")
+    return sampler.payload
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+合成 trace 生成器（没有 Alibaba 数据集时也能做可复现的规模化基准）
+
+TraceProfile 描述一份 trace 的经验分布：
+  - 任务形状: 从真实 trace 中均匀抽取的行池（cpu, mem, duration, cpu_avg, cpu_max,
+    task_type, task_priority），生成时整行自助抽样（bootstrap），保留各维度间的相关性
+  - 租户倾斜: 各租户的经验频率（降序）
+  - 到达突发性: 按 bucket_seconds 分桶的到达数，拟合负二项（Gamma-Poisson）过程的
+    均值与形状参数；桶内到达时间均匀分布
+  - 机器数: 用于生成 machine_id（亲和性统计）
+
+用法:
+  python -m tools.trace_io profile ./data --out alibaba_profile.npz    # 从编译缓存拟合
+  python -m tools.trace_io synth ./synth_1m -n 1000000 --profile alibaba_profile.npz --seed 0
+  python tools/run_complete_comparison.py ./synth_1m 1000000            # 与真实 trace 相同的入口
+
+代码中:
+  tasks = synth_tasks(TraceProfile.fit("./data"), 100_000, seed=0)     # 直接得到 TaskTable
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Iterator
+
+import numpy as np
+import pandas as pd
+
+from .compile import CompiledTrace, cache_dir, write_compiled
+from .table import TaskTable
+
+SYNTH_CHUNK_ROWS = 1_000_000
+PROFILE_POOL_ROWS = 200_000
+POOL_COLUMNS = ("cpu", "mem", "duration", "cpu_avg", "cpu_max", "task_type", "task_priority")
+
+
+@dataclass
+class TraceProfile:
+    """合成 trace 的经验分布（可 save/load 为 npz，脱离原始数据集分发）"""
+    pool: Dict[str, np.ndarray]      # POOL_COLUMNS → 行池
+    tenant_weights: np.ndarray       # 各租户到达概率（降序）
+    bucket_seconds: int = 60
+    rate_mean: float = 50.0          # 每桶平均到达数
+    rate_shape: float = np.inf       # Gamma 形状参数；inf = 纯 Poisson（无突发）
+    num_machines: int = 1000
+    t0: int = 0                      # 第一个到达时间
+
+    @classmethod
+    def fit(cls, trace_dir: str, pool_rows: int = PROFILE_POOL_ROWS, bucket_seconds: int = 60,
+            seed: int = 0) -> "TraceProfile":
+        """从编译缓存拟合（python -m tools.trace_io compile 之后）"""
+        compiled = CompiledTrace(trace_dir)
+        if compiled.rows == 0:
+            raise ValueError("编译缓存为空，无法拟合分布")
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(compiled.rows, size=min(pool_rows, compiled.rows), replace=False))
+
+        start = np.asarray(compiled.numeric("start_time"))
+        end = np.asarray(compiled.numeric("end_time")[rows])
+        pool = {
+            "cpu": np.asarray(compiled.numeric("cpu")[rows]),
+            "mem": np.asarray(compiled.numeric("mem")[rows]),
+            "duration": np.maximum(end - start[rows], 0),
+            "cpu_avg": np.asarray(compiled.numeric("cpu_avg")[rows]),
+            "cpu_max": np.asarray(compiled.numeric("cpu_max")[rows]),
+            "task_type": np.asarray(compiled.numeric("task_type")[rows]),
+            "task_priority": np.asarray(compiled.numeric("task_priority")[rows]),
+        }
+
+        counts = np.bincount(np.asarray(compiled.codes("tenant")))
+        counts = np.sort(counts[counts > 0])[::-1]
+
+        # 到达过程：每桶到达数的均值 / 方差 → 负二项参数（方差 = m + m²/k）
+        t0 = int(start.min())
+        per_bucket = np.bincount((start - t0) // bucket_seconds)
+        mean = float(per_bucket.mean())
+        var = float(per_bucket.var())
+        shape = mean * mean / (var - mean) if var > mean else np.inf
+
+        return cls(pool=pool, tenant_weights=counts / counts.sum(), bucket_seconds=bucket_seconds,
+                   rate_mean=mean, rate_shape=shape, num_machines=max(1, len(compiled.vocab("machine_id"))),
+                   t0=t0)
+
+    @classmethod
+    def default(cls, seed: int = 0) -> "TraceProfile":
+        """
+        没有任何 trace 时的参数化默认分布（量级与编译后的 Alibaba trace 相近，仅用于规模测试）
+        对数正态的 cpu/mem（相关）、对数正态时长、Zipf 租户、中等突发的到达
+        """
+        rng = np.random.default_rng(seed)
+        n = PROFILE_POOL_ROWS
+        z = rng.multivariate_normal([0.0, 0.0], [[1.0, 0.5], [0.5, 1.0]], size=n)
+        cpu = np.clip(np.exp(np.log(0.5) + 0.6 * z[:, 0]), 0.05, 4.0)
+        mem = np.clip(np.exp(np.log(0.4) + 0.6 * z[:, 1]), 0.02, 4.0)
+        cpu_avg = cpu * 100 * rng.uniform(0.2, 0.8, size=n)
+        pool = {
+            "cpu": np.round(cpu, 2),
+            "mem": np.round(mem, 3),
+            "duration": np.maximum(1, rng.lognormal(np.log(60), 1.5, size=n)).astype(np.int64),
+            "cpu_avg": cpu_avg,
+            "cpu_max": cpu_avg * rng.uniform(1.0, 2.0, size=n),
+            "task_type": rng.choice(np.array([1, 12], dtype=np.int8), size=n, p=[0.3, 0.7]),
+            "task_priority": rng.choice(np.array([0, 1, 2], dtype=np.int8), size=n, p=[0.6, 0.3, 0.1]),
+        }
+        ranks = np.arange(1, 301)
+        weights = ranks ** -1.2
+        return cls(pool=pool, tenant_weights=weights / weights.sum(), bucket_seconds=60,
+                   rate_mean=50.0, rate_shape=2.0, num_machines=1000, t0=0)
+
+    def save(self, path: str):
+        np.savez(path, tenant_weights=self.tenant_weights,
+                 params=np.array([self.bucket_seconds, self.rate_mean, self.rate_shape,
+                                  self.num_machines, self.t0], dtype=np.float64),
+                 **{f"pool_{k}": v for k, v in self.pool.items()})
+
+    @classmethod
+    def load(cls, path: str) -> "TraceProfile":
+        with np.load(path) as z:
+            bucket, mean, shape, machines, t0 = z["params"].tolist()
+            return cls(pool={k: z[f"pool_{k}"] for k in POOL_COLUMNS},
+                       tenant_weights=z["tenant_weights"], bucket_seconds=int(bucket),
+                       rate_mean=float(mean), rate_shape=float(shape),
+                       num_machines=int(machines), t0=int(t0))
+
+    def arrivals(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        """n 个非递减的到达时间（Gamma-Poisson 分桶 + 桶内均匀）"""
+        counts = []
+        total = 0
+        while total < n:
+            k = max(1024, int((n - total) / max(self.rate_mean, 1e-9) * 1.2) + 1)
+            if np.isfinite(self.rate_shape):
+                rates = rng.gamma(self.rate_shape, self.rate_mean / self.rate_shape, size=k)
+            else:
+                rates = np.full(k, self.rate_mean)
+            c = rng.poisson(rates)
+            counts.append(c)
+            total += int(c.sum())
+        per_bucket = np.concatenate(counts)
+        bucket = np.repeat(np.arange(len(per_bucket), dtype=np.int64), per_bucket)[:n]
+        offset = rng.integers(0, self.bucket_seconds, size=n)
+        return np.sort(self.t0 + bucket * self.bucket_seconds + offset)
+
+
+def iter_synthetic_frames(profile: TraceProfile, n: int, seed: int = 0,
+                          chunk_rows: int = SYNTH_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """按到达时间顺序分块产出规范化 DataFrame（列与 trace_io.load_instances 一致）"""
+    rng = np.random.default_rng(seed)
+    arrivals = profile.arrivals(n, rng)
+    pool_size = len(profile.pool["cpu"])
+    num_tenants = len(profile.tenant_weights)
+    tenant_names = np.array([f"j_{t}" for t in range(num_tenants)], dtype=object)
+    machine_names = np.array([f"m_{k}" for k in range(profile.num_machines)], dtype=object)
+    for lo in range(0, n, chunk_rows):
+        hi = min(lo + chunk_rows, n)
+        m = hi - lo
+        pick = rng.integers(0, pool_size, size=m)
+        start = arrivals[lo:hi]
+        tenant = rng.choice(num_tenants, size=m, p=profile.tenant_weights)
+        machine = rng.integers(0, profile.num_machines, size=m)
+        yield pd.DataFrame({
+            "instance_id": [f"syn_{i}" for i in range(lo, hi)],
+            "tenant": tenant_names[tenant],
+            "start_time": start,
+            "end_time": start + profile.pool["duration"][pick].astype(np.int64),
+            "machine_id": machine_names[machine],
+            "cpu": profile.pool["cpu"][pick].astype(np.float64),
+            "mem": profile.pool["mem"][pick].astype(np.float64),
+            "cpu_avg": profile.pool["cpu_avg"][pick].astype(np.float64),
+            "cpu_max": profile.pool["cpu_max"][pick].astype(np.float64),
+            "task_type": profile.pool["task_type"][pick].astype(np.int8),
+            "task_priority": profile.pool["task_priority"][pick].astype(np.int8),
+        })
+
+
+def synth_tasks(profile: TraceProfile, n: int, seed: int = 0) -> TaskTable:
+    """在内存中直接生成 n 个任务的 TaskTable（真实用量按请求量的 50% 估计）"""
+    frames = list(iter_synthetic_frames(profile, n, seed))
+    return TaskTable.from_frame(pd.concat(frames, ignore_index=True), sort=False)
+
+
+def write_synthetic_trace(profile: TraceProfile, n: int, trace_dir: str, seed: int = 0,
+                          chunk_rows: int = SYNTH_CHUNK_ROWS) -> str:
+    """
+    生成 n 个任务并写成编译缓存格式（<trace_dir>/compiled/），返回缓存目录
+
+    该目录没有原始 CSV，但 load_alibaba_trace / iter_tasks 等入口都可以直接使用。
+    """
+    out_dir = cache_dir(trace_dir)
+    print(f"━━━ 生成合成 trace: {n} 个任务 → {out_dir}（seed={seed}） ━━━")
+    rows = write_compiled(iter_synthetic_frames(profile, n, seed, chunk_rows), out_dir,
+                          synthetic={"seed": seed, "tasks": n})
+    print(f"✓ 合成完成: {rows} 条记录")
+    return out_dir
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+TaskTable: 任务的列式（struct-of-arrays）表示
+
+load_alibaba_trace 以前对每个实例 iterrows() 构造一个 Task dataclass，
+50 万~500 万实例时既慢又占内存。TaskTable 用 NumPy 列保存全部字段，
+全部由向量化的 pandas/NumPy 操作构建；仍按 Task 属性访问的旧代码
+通过 TaskView（按需取值并缓存的轻量行视图）读取。
+"""
+from __future__ import annotations
+
+from typing import Iterator, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+class _Field:
+    """
+    TaskView 的列字段（非数据描述符）
+
+    首次读取时从列中取值并写入视图的 __dict__，之后的读取直接命中实例属性，
+    与普通 dataclass 一样快（调度器内层循环会反复读取同一任务的 cpu/mem/real_cpu）。
+    """
+
+    __slots__ = ("column", "getter")
+
+    def __init__(self, column: str, getter=None):
+        self.column = column
+        self.getter = getter
+
+    @classmethod
+    def computed(cls, getter) -> "_Field":
+        """由词表等派生的字段（id / tenant / machine_id ...），同样只计算一次"""
+        return cls(getter.__name__, getter)
+
+    def __get__(self, view, owner=None):
+        if view is None:
+            return self
+        if self.getter is None:
+            value = getattr(view._t, self.column).item(view._i)
+        else:
+            value = self.getter(view)
+        view.__dict__[self.column] = value
+        return value
+
+
+class TaskView:
+    """TaskTable 的单行视图，属性与 run_complete_comparison.Task 一致"""
+
+    __slots__ = ("_t", "_i", "__dict__")
+
+    cpu = _Field("cpu")
+    mem = _Field("mem")
+    arrival = _Field("arrival")
+    priority = _Field("priority")
+    start_time = _Field("start_time")
+    end_time = _Field("end_time")
+    cpu_avg = _Field("cpu_avg")
+    cpu_max = _Field("cpu_max")
+    duration = _Field("duration")
+    real_cpu = _Field("real_cpu")
+    real_mem = _Field("real_mem")
+
+    def __init__(self, table: "TaskTable", index: int):
+        self._t = table
+        self._i = index
+
+    @_Field.computed
+    def id(self) -> str:
+        return self._t.ids[self._i]
+
+    @_Field.computed
+    def tenant(self) -> str:
+        return self._t.tenants[self._t.tenant_id.item(self._i)]
+
+    @_Field.computed
+    def slo_sensitive(self) -> str:
+        return 'high' if self._t.slo_high.item(self._i) else 'low'
+
+    @_Field.computed
+    def machine_id(self) -> str:
+        return self._t.machines[self._t.machine_code.item(self._i)]
+
+    # trace 中没有的维度，与 Task 的默认值保持一致
+    mem_bandwidth = 0.0
+    net_in = 0.0
+    net_out = 0.0
+    disk_io = 0.0
+
+    def __eq__(self, other):
+        return isinstance(other, TaskView) and other._t is self._t and other._i == self._i
+
+    def __hash__(self):
+        return hash((id(self._t), self._i))
+
+    def __repr__(self):
+        return (f"TaskView(id={self.id!r}, cpu={self.cpu}, mem={self.mem}, tenant={self.tenant!r}, "
+                f"arrival={self.arrival}, duration={self.duration})")
+
+
+class TaskTable:
+    """
+    任务表（每个字段一列 NumPy 数组）
+
+    列:
+      ids (object), cpu, mem, real_cpu, real_mem, cpu_avg, cpu_max (float64)
+      arrival, start_time, end_time, duration (int64)
+      tenant_id (int32, 指向 tenants 词表), machine_code (int32, 指向 machines 词表)
+      priority (int8), slo_high (bool, task_type == 1)
+    """
+
+    NUMERIC = ("cpu", "mem", "real_cpu", "real_mem", "cpu_avg", "cpu_max",
+               "arrival", "start_time", "end_time", "duration",
+               "tenant_id", "machine_code", "priority", "slo_high")
+
+    def __init__(self, ids: np.ndarray, tenants: np.ndarray, machines: np.ndarray, **columns: np.ndarray):
+        self.ids = ids
+        self.tenants = tenants
+        self.machines = machines
+        for name in self.NUMERIC:
+            setattr(self, name, columns[name])
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, usage: Optional[pd.DataFrame] = None,
+                   sort: bool = True) -> "TaskTable":
+        """
+        由 trace_io.load_instances 的规范化 DataFrame 构建（全部向量化）
+
+        usage: 以 instance_id 为索引、包含 cpu_used / mem_used 的真实用量表；
+               未命中的实例按请求量的 50% 估计
+        sort:  按 start_time 排序（与旧的 df.sort_values(5) 顺序一致）
+        """
+        if sort:
+            df = df.sort_values("start_time")
+
+        ids = df["instance_id"].astype(str).to_numpy(dtype=object)
+        cpu = df["cpu"].to_numpy(dtype=np.float64)
+        mem = df["mem"].to_numpy(dtype=np.float64)
+        start = df["start_time"].to_numpy(dtype=np.int64)
+        end = df["end_time"].to_numpy(dtype=np.int64)
+
+        real_cpu = cpu * 0.5
+        real_mem = mem * 0.5
+        if usage is not None and len(usage) > 0:
+            pos = usage.index.get_indexer(ids)
+            hit = pos >= 0
+            real_cpu[hit] = usage["cpu_used"].to_numpy(dtype=np.float64)[pos[hit]]
+            real_mem[hit] = usage["mem_used"].to_numpy(dtype=np.float64)[pos[hit]]
+
+        tenant_id, tenants = pd.factorize(df["tenant"].astype(str))
+        machine_code, machines = pd.factorize(df["machine_id"].astype(str))
+
+        return cls(
+            ids=ids,
+            tenants=np.asarray(tenants, dtype=object),
+            machines=np.asarray(machines, dtype=object),
+            cpu=cpu,
+            mem=mem,
+            real_cpu=real_cpu,
+            real_mem=real_mem,
+            cpu_avg=df["cpu_avg"].to_numpy(dtype=np.float64),
+            cpu_max=df["cpu_max"].to_numpy(dtype=np.float64),
+            arrival=start.copy(),
+            start_time=start,
+            end_time=end,
+            duration=np.where(end > start, end - start, 0),
+            tenant_id=tenant_id.astype(np.int32),
+            machine_code=machine_code.astype(np.int32),
+            priority=df["task_priority"].to_numpy(dtype=np.int8),
+            slo_high=df["task_type"].to_numpy() == 1,
+        )
+
+    def take(self, indices) -> "TaskTable":
+        """按行号（或布尔掩码）取子表，词表共享"""
+        return TaskTable(self.ids[indices], self.tenants, self.machines,
+                         **{name: getattr(self, name)[indices] for name in self.NUMERIC})
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, key: Union[int, slice]):
+        if isinstance(key, slice):
+            return self.take(key)
+        n = len(self.ids)
+        if key < 0:
+            key += n
+        if not 0 <= key < n:
+            raise IndexError("TaskTable index out of range")
+        return TaskView(self, key)
+
+    def __iter__(self) -> Iterator[TaskView]:
+        for i in range(len(self.ids)):
+            yield TaskView(self, i)
+
+    @property
+    def tenant(self) -> np.ndarray:
+        """每行的租户名（object 数组）"""
+        return self.tenants[self.tenant_id]
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+container_usage.csv 的按实例聚合（单遍扫描、内存有界、可并行）
+
+UsageAggregator 为每个实例维护紧凑数组中的一行：
+  sum / count / max（cpu、mem 各一份） + 定宽直方图（估计 p95）
+实例 id 只在词表中保存一次（interned），内存只与实例数有关，与文件大小无关。
+各个字节块在 worker 内各自聚合，主进程按顺序 merge，结果与切分方式无关。
+
+二进制输出（usage_agg.npz）由 load_alibaba_trace 直接读取:
+  ids       '\\n' 拼接的实例 id（utf-8 字节）
+  cpu_sum, cpu_n, cpu_max, cpu_hist, mem_sum, mem_n, mem_max, mem_hist
+"""
+from __future__ import annotations
+
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .ingest import iter_csv_blocks
+
+USAGE_USECOLS = [2, 3, 4]  # instance_id, cpu_used, mem_used
+USAGE_AGG_FILE = "usage_agg.npz"
+HIST_BINS = 50           # 直方图覆盖 [0, 100]（利用率百分比），每格 2%
+RESOURCES = ("cpu", "mem")
+
+
+class UsageAggregator:
+    """按实例累计 sum / count / max / 直方图；两个聚合器可以 merge"""
+
+    def __init__(self, hist_bins: int = HIST_BINS):
+        self.hist_bins = hist_bins
+        self.index: Dict[str, int] = {}
+        self.size = 0
+        self._alloc(1024)
+
+    def _alloc(self, capacity: int):
+        self.sum = {r: np.zeros(capacity, dtype=np.float64) for r in RESOURCES}
+        self.n = {r: np.zeros(capacity, dtype=np.int64) for r in RESOURCES}
+        self.max = {r: np.full(capacity, -np.inf, dtype=np.float64) for r in RESOURCES}
+        self.hist = {r: np.zeros((capacity, self.hist_bins), dtype=np.uint32) for r in RESOURCES}
+
+    def _grow(self, needed: int):
+        capacity = len(self.sum["cpu"])
+        if needed <= capacity:
+            return
+        new_cap = max(needed, capacity * 2)
+        old = (self.sum, self.n, self.max, self.hist)
+        self._alloc(new_cap)
+        for new, prev in zip((self.sum, self.n, self.max, self.hist), old):
+            for r in RESOURCES:
+                new[r][:capacity] = prev[r]
+
+    def _intern(self, ids) -> np.ndarray:
+        """把实例 id 映射为行号（新 id 追加在末尾）"""
+        rows = np.empty(len(ids), dtype=np.int64)
+        index = self.index
+        for i, key in enumerate(ids):
+            row = index.get(key)
+            if row is None:
+                row = index[key] = len(index)
+            rows[i] = row
+        self._grow(len(index))
+        self.size = len(index)
+        return rows
+
+    def add_chunk(self, chunk: pd.DataFrame):
+        """累计 container_usage.csv 的一个原始分块（列 2/3/4）"""
+        if len(chunk) == 0:
+            return
+        codes, uniques = pd.factorize(chunk[2].astype(str), sort=False)
+        rows = self._intern(uniques.tolist())
+        k = len(uniques)
+        for r, col in zip(RESOURCES, (3, 4)):
+            values = pd.to_numeric(chunk[col], errors="coerce").to_numpy(dtype=np.float64)
+            ok = ~np.isnan(values)
+            c, v = codes[ok], values[ok]
+            self.sum[r][rows] += np.bincount(c, weights=v, minlength=k)
+            self.n[r][rows] += np.bincount(c, minlength=k)
+            local_max = np.full(k, -np.inf)
+            np.maximum.at(local_max, c, v)
+            np.maximum(self.max[r][rows], local_max, out=local_max)
+            self.max[r][rows] = local_max
+            bins = np.clip((v * (self.hist_bins / 100.0)).astype(np.int64), 0, self.hist_bins - 1)
+            counts = np.bincount(c * self.hist_bins + bins, minlength=k * self.hist_bins)
+            self.hist[r][rows] += counts.reshape(k, self.hist_bins).astype(np.uint32)
+
+    def merge(self, other: "UsageAggregator") -> "UsageAggregator":
+        """合并另一个聚合器（例如另一个文件分片的结果）"""
+        if other.hist_bins != self.hist_bins:
+            raise ValueError("直方图分箱数不一致，无法合并")
+        if other.size == 0:
+            return self
+        rows = self._intern(list(other.index))
+        m = other.size
+        for r in RESOURCES:
+            self.sum[r][rows] += other.sum[r][:m]
+            self.n[r][rows] += other.n[r][:m]
+            self.max[r][rows] = np.maximum(self.max[r][rows], other.max[r][:m])
+            self.hist[r][rows] += other.hist[r][:m]
+        return self
+
+    def percentile(self, resource: str, q: float = 95.0) -> np.ndarray:
+        """由直方图估计分位数（取所在分箱的上沿，偏保守）"""
+        hist = self.hist[resource][:self.size]
+        cum = np.cumsum(hist, axis=1, dtype=np.int64)
+        target = np.ceil(self.n[resource][:self.size] * (q / 100.0))
+        b = (cum < target[:, None]).sum(axis=1)
+        out = (np.minimum(b, self.hist_bins - 1) + 1) * (100.0 / self.hist_bins)
+        out[self.n[resource][:self.size] == 0] = np.nan
+        return out
+
+    def result(self) -> pd.DataFrame:
+        """以 instance_id 为索引：cpu_used / mem_used（均值）、*_max、*_p95"""
+        m = self.size
+        data = {}
+        for r in RESOURCES:
+            n = self.n[r][:m]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                data[f"{r}_used"] = np.where(n > 0, self.sum[r][:m] / n, np.nan)
+            data[f"{r}_max"] = np.where(n > 0, self.max[r][:m], np.nan)
+            data[f"{r}_p95"] = self.percentile(r)
+        df = pd.DataFrame(data, index=pd.Index(list(self.index), name="instance_id"))
+        return df[["cpu_used", "mem_used", "cpu_max", "mem_max", "cpu_p95", "mem_p95"]]
+
+    def save(self, path: str):
+        m = self.size
+        arrays = {"ids": np.frombuffer("\n".join(self.index).encode("utf-8"), dtype=np.uint8),
+                  "hist_bins": np.array(self.hist_bins)}
+        for r in RESOURCES:
+            arrays[f"{r}_sum"] = self.sum[r][:m]
+            arrays[f"{r}_n"] = self.n[r][:m]
+            arrays[f"{r}_max"] = self.max[r][:m]
+            arrays[f"{r}_hist"] = self.hist[r][:m]
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "UsageAggregator":
+        with np.load(path) as z:
+            agg = cls(hist_bins=int(z["hist_bins"]))
+            text = z["ids"].tobytes().decode("utf-8")
+            ids = text.split("\n") if text else []
+            agg.index = {key: i for i, key in enumerate(ids)}
+            agg.size = len(ids)
+            agg._alloc(max(agg.size, 1))
+            for r in RESOURCES:
+                agg.sum[r][:agg.size] = z[f"{r}_sum"]
+                agg.n[r][:agg.size] = z[f"{r}_n"]
+                agg.max[r][:agg.size] = z[f"{r}_max"]
+                agg.hist[r][:agg.size] = z[f"{r}_hist"]
+        return agg
+
+
+def aggregate_block(chunk: pd.DataFrame) -> UsageAggregator:
+    """ingest worker 内执行：聚合单个字节块"""
+    agg = UsageAggregator()
+    agg.add_chunk(chunk)
+    return agg
+
+
+def aggregate_usage(trace_dir: str, workers: Optional[int] = None,
+                    max_rows: Optional[int] = None) -> UsageAggregator:
+    """
+    扫描 container_usage.csv 得到按实例的聚合结果
+
+    max_rows: 只读前 N 行（采样模式，顺序读取）；None 时多进程扫描整个文件
+    """
+    path = os.path.join(trace_dir, "container_usage.csv")
+    total = UsageAggregator()
+    if max_rows:
+        for chunk in pd.read_csv(path, header=None, usecols=USAGE_USECOLS, nrows=max_rows,
+                                 chunksize=1_000_000):
+            total.add_chunk(chunk)
+        return total
+    for part in iter_csv_blocks(path, aggregate_block, workers=workers, usecols=USAGE_USECOLS):
+        total.merge(part)
+    return total
+
+
+def load_usage(trace_dir: str) -> Optional[pd.DataFrame]:
+    """
+    读取真实用量表（以 instance_id 为索引，至少包含 cpu_used / mem_used）
+    优先读取二进制的 usage_agg.npz，其次兼容旧的 usage_avg.csv；都不存在时返回 None
+    """
+    agg_path = os.path.join(trace_dir, USAGE_AGG_FILE)
+    if os.path.exists(agg_path):
+        return UsageAggregator.load(agg_path).result()
+    csv_path = os.path.join(trace_dir, "usage_avg.csv")
+    if os.path.exists(csv_path):
+        return pd.read_csv(csv_path).set_index("instance_id")[["cpu_used", "mem_used"]]
+    return None